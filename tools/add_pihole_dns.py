@@ -3,11 +3,19 @@ import argparse
 import json
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import urllib.parse
 import os
 import requests
 import configparser
+import tofu_outputs
+from pihole_reconcile import RecordIndex, ZoneTrie, compute_changeset
+
+# Ownership tag for Pi-hole records this script manages (see pihole_reconcile.py)
+RECORD_OWNER = "add_pihole_dns"
 
 def get_sops_decoded_secrets(secrets_file_path):
     """Decrypts the SOPS file and returns the data."""
@@ -31,350 +39,646 @@ def get_sops_decoded_secrets(secrets_file_path):
         print(f"An unexpected error occurred while handling SOPS file: {e}", file=sys.stderr)
         sys.exit(1)
 
-def authenticate_pihole(pihole_ip, web_password):
-    """Authenticates to Pi-hole and returns session ID (SID) and CSRF token."""
-    auth_url = f"http://{pihole_ip}/api/auth"
-    payload = {"password": web_password}
-    headers = {"Content-Type": "application/json"} # Add Content-Type header
-    print(f"Attempting to authenticate to Pi-hole at {pihole_ip} with JSON payload.")
-    try:
-        # Send payload as JSON
-        response = requests.post(auth_url, data=json.dumps(payload), headers=headers, timeout=10)
-        response.raise_for_status() # Raise an exception for bad status codes
-
-        data = response.json()
-        if data.get("session") and data["session"].get("valid") is True:
-            sid = data["session"].get("sid")
-            csrf_token = data["session"].get("csrf")
-            if sid and csrf_token:
-                print("Authentication successful. SID and CSRF token obtained.")
-                return {"sid": sid, "csrf": csrf_token}
-            else:
-                print(f"Authentication succeeded but SID or CSRF token missing in response: {data}")
-                return None
-        else:
-            print(f"Authentication failed. Response: {data}")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error during Pi-hole authentication: {e}")
-        # If the error is an HTTPError, print the response content for more details
-        if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
-            print(f"Pi-hole auth error response: {e.response.status_code} - {e.response.text}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from Pi-hole authentication response: {e}. Response text: {response.text}")
-        return None
+def default_session_cache_path():
+    """Returns $XDG_CACHE_HOME/pihole-dns-session.json (~/.cache by default)."""
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_dir, "pihole-dns-session.json")
 
-def get_dns_records(pihole_ip, sid, csrf_token, debug=False):
-    """Get all custom DNS records from Pi-hole.
+class SessionCache:
+    """On-disk cache of Pi-hole sessions and discovered record endpoints, keyed by Pi-hole host.
 
-    Tries multiple API endpoints that might exist in different Pi-hole versions.
+    The file holds live session IDs, so it is written with mode 0600. A
+    session is reused only while it was last used less than ttl seconds ago
+    (Pi-hole extends a session on every request, 30 minutes by default). A
+    discovered endpoint is kept for ENDPOINT_TTL seconds.
     """
-    # Use same endpoints as the add/delete operations
-    # And also try some other common endpoints for different Pi-hole versions
-    api_endpoints = [
-        "/api/config/dns/hosts",
-        "/api/dns/customdns",
-        "/admin/api.php?customdns",
-        "/api/customdns"
-    ]
-
-    print(f"Fetching current DNS records from Pi-hole...")
-
-    for endpoint in api_endpoints:
-        api_url = f"http://{pihole_ip}{endpoint}"
-
-        command_parts = [
-            'curl', '-s',
-            '-H', "Content-Type: application/json",
-            '-H', f"X-CSRF-Token: {csrf_token}",
-            '--cookie', f"SID={sid}",
-            api_url
-        ]
 
-        if debug:
-            print(f"DEBUG: Trying Pi-hole API endpoint: {endpoint}")
-            print(f"DEBUG_COMMAND: {' '.join(command_parts)}")
+    ENDPOINT_TTL = 7 * 24 * 3600
 
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.dirty = False
+        self.lock = threading.Lock() # Shared by the clients of concurrently synced Pi-hole instances
+        self.entries = {}
         try:
-            result = subprocess.run(command_parts, capture_output=True, text=True, check=False)
-            response_text = result.stdout.strip()
-
-            if debug:
-                print(f"DEBUG: Pi-hole endpoint {endpoint} response: '{response_text[:100]}...' (Return code: {result.returncode})")
-
-            if result.returncode == 0 and response_text:
-                try:
-                    response_json = json.loads(response_text)
-
-                    # Different Pi-hole API versions might return data in different formats
-                    # Let's handle various known response formats:
-
-                    # Case 1: Direct list of records
-                    if isinstance(response_json, list):
-                        print(f"Successfully retrieved {len(response_json)} DNS records from Pi-hole using endpoint {endpoint}.")
-                        return response_json
-
-                    # Case 2: Data in a "data" field
-                    elif isinstance(response_json, dict) and "data" in response_json and isinstance(response_json["data"], list):
-                        print(f"Successfully retrieved {len(response_json['data'])} DNS records from Pi-hole using endpoint {endpoint}.")
-                        return response_json["data"]
-
-                    # Case 3: Specific format with "customdns" field (some Pi-hole versions)
-                    elif isinstance(response_json, dict) and "customdns" in response_json and isinstance(response_json["customdns"], list):
-                        print(f"Successfully retrieved {len(response_json['customdns'])} DNS records from Pi-hole using endpoint {endpoint}.")
-                        return response_json["customdns"]
-
-                    # Case 4: Data in a nested structure (config -> dns -> hosts)
-                    elif isinstance(response_json, dict) and "config" in response_json and isinstance(response_json["config"], dict) and \
-                         "dns" in response_json["config"] and isinstance(response_json["config"]["dns"], dict) and \
-                         "hosts" in response_json["config"]["dns"]:
-                        hosts = response_json["config"]["dns"]["hosts"]
-                        if isinstance(hosts, list):
-                            # Parse entries like "<EXAMPLE-IP-187> pi.alert" into structured records
-                            records = []
-                            for entry in hosts:
-                                if isinstance(entry, str) and " " in entry:
-                                    parts = entry.split(" ", 1)
-                                    if len(parts) == 2:
-                                        ip = parts[0].strip()
-                                        domain = parts[1].strip()
-                                        records.append({"domain": domain, "ip": ip})
-                            print(f"Successfully retrieved {len(records)} DNS records from Pi-hole using endpoint {endpoint}.")
-                            return records
-
-                    # Case 5: Empty but valid response (no custom records)
-                    elif isinstance(response_json, dict) and ("success" in response_json or "took" in response_json):
-                        print(f"Pi-hole responded successfully, but no custom DNS records found (endpoint {endpoint}).")
-                        return []
-
-                    elif debug:
-                        print(f"DEBUG: Endpoint {endpoint} returned unexpected format: {json.dumps(response_json, indent=2)[:200]}...")
-
-                except json.JSONDecodeError:
-                    if debug:
-                        print(f"DEBUG: Failed to parse response from endpoint {endpoint} as JSON: {response_text[:100]}...")
-
-            # Continue to the next endpoint if this one didn't work
-
-        except Exception as e:
-            if debug:
-                print(f"DEBUG: Error trying endpoint {endpoint}: {e}")
-
-    # If we reach here, we couldn't get records from any endpoint
-    print("Warning: Unable to retrieve custom DNS records from any Pi-hole API endpoint.")
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+            if isinstance(data, dict):
+                self.entries = data
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable Pi-hole session cache {path}: {e}", file=sys.stderr)
+
+    def _entry(self, host):
+        return self.entries.setdefault(host, {})
+
+    def get_session(self, host):
+        with self.lock:
+            session = self.entries.get(host, {}).get("session")
+            if session and time.time() - session.get("last_used", 0) < self.ttl:
+                return dict(session)
+        return None
 
-    # As a last resort, try to get custom.list directly via SSH
-    print("Attempting to check if there are entries in custom.list file on Pi-hole...")
+    def set_session(self, host, sid, csrf_token):
+        with self.lock:
+            self._entry(host)["session"] = {"sid": sid, "csrf": csrf_token, "last_used": time.time()}
+            self.dirty = True
+
+    def touch_session(self, host):
+        with self.lock:
+            session = self.entries.get(host, {}).get("session")
+            if session:
+                session["last_used"] = time.time()
+                self.dirty = True
+
+    def forget_session(self, host):
+        with self.lock:
+            if self.entries.get(host, {}).pop("session", None):
+                self.dirty = True
+
+    def get_endpoint(self, host):
+        with self.lock:
+            endpoint = self.entries.get(host, {}).get("endpoint")
+            if endpoint and time.time() - endpoint.get("discovered", 0) < self.ENDPOINT_TTL:
+                return dict(endpoint)
+        return None
 
-    # Just tell the user there might be records we can't retrieve
-    print("Note: There might be DNS records in Pi-hole that we couldn't retrieve via the API.")
-    return []
+    def set_endpoint(self, host, endpoint, record_format):
+        with self.lock:
+            self._entry(host)["endpoint"] = {"endpoint": endpoint, "format": record_format, "discovered": time.time()}
+            self.dirty = True
+
+    def forget_endpoint(self, host):
+        with self.lock:
+            if self.entries.get(host, {}).pop("endpoint", None):
+                self.dirty = True
+
+    def save(self):
+        """Writes the cache atomically with mode 0600 if anything changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+                fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                    json.dump(self.entries, handle, indent=2)
+                os.replace(temporary, self.path)
+                self.dirty = False
+            except OSError as e:
+                print(f"Warning: Could not write Pi-hole session cache {self.path}: {e}", file=sys.stderr)
+
+class PiholeClient:
+    """Talks to the Pi-hole API over one keep-alive HTTP session.
+
+    The session carries the SID cookie and CSRF header once authenticated, so
+    every record reuses the same pooled TCP connection instead of starting a
+    new curl process. With a SessionCache the SID/CSRF pair and the record
+    endpoint are reused across runs.
+    """
 
-    try:
-        result = subprocess.run(command_parts, capture_output=True, text=True, check=False)
-        response_text = result.stdout.strip()
+    def __init__(self, pihole_ip, timeout=10, debug=False, cache=None):
+        self.pihole_ip = pihole_ip
+        self.base_url = f"http://{pihole_ip}"
+        self.timeout = timeout
+        self.debug = debug
+        self.cache = cache
+        self.web_password = None
+        self.sid = None
+        self.parent = None # Set on clones; their expired sessions are replaced through the parent
+        self.auth_lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.save()
+
+    def login(self, web_password):
+        """Reuses a cached session if there is one, otherwise authenticates.
+
+        The password is kept so that a cached session rejected with 401 can
+        be replaced transparently by request().
+        """
+        self.web_password = web_password
+        cached = self.cache.get_session(self.pihole_ip) if self.cache else None
+        if cached:
+            print(f"Reusing cached Pi-hole session for {self.pihole_ip}.")
+            self.set_auth(cached["sid"], cached["csrf"])
+            return cached
+        return self.authenticate(web_password)
+
+    def authenticate(self, web_password):
+        """Logs in and stores the session ID (SID) and CSRF token on the session.
+
+        Returns a dict with the SID and CSRF token, or None on failure.
+        """
+        auth_url = f"{self.base_url}/api/auth"
+        payload = {"password": web_password}
+        print(f"Attempting to authenticate to Pi-hole at {self.pihole_ip} with JSON payload.")
+        try:
+            # Send payload as JSON
+            response = self.session.post(auth_url, data=json.dumps(payload), timeout=self.timeout)
+            response.raise_for_status() # Raise an exception for bad status codes
+
+            data = response.json()
+            if data.get("session") and data["session"].get("valid") is True:
+                sid = data["session"].get("sid")
+                csrf_token = data["session"].get("csrf")
+                if sid and csrf_token:
+                    print("Authentication successful. SID and CSRF token obtained.")
+                    self.set_auth(sid, csrf_token)
+                    if self.cache:
+                        self.cache.set_session(self.pihole_ip, sid, csrf_token)
+                    return {"sid": sid, "csrf": csrf_token}
+                else:
+                    print(f"Authentication succeeded but SID or CSRF token missing in response: {data}")
+                    return None
+            else:
+                print(f"Authentication failed. Response: {data}")
+                return None
+        except requests.exceptions.RequestException as e:
+            print(f"Error during Pi-hole authentication: {e}")
+            # If the error is an HTTPError, print the response content for more details
+            if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+                print(f"Pi-hole auth error response: {e.response.status_code} - {e.response.text}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON from Pi-hole authentication response: {e}. Response text: {response.text}")
+            return None
 
-        if debug:
-            print(f"Pi-hole DNS API raw response: '{response_text}' (Return code: {result.returncode})")
+    def set_auth(self, sid, csrf_token):
+        """Attaches an existing SID/CSRF pair to every following request."""
+        self.sid = sid
+        self.session.cookies.set("SID", sid)
+        self.session.headers["X-CSRF-Token"] = csrf_token
+
+    def reauthenticate(self, rejected_sid):
+        """Replaces a session Pi-hole rejected with 401; returns the new SID/CSRF dict, or None.
+
+        Clones ask their parent, which logs in at most once per expired
+        session: workers that hit the same 401 concurrently all adopt the
+        session of the first one.
+        """
+        if self.parent is not None:
+            auth = self.parent.reauthenticate(rejected_sid)
+            if auth:
+                self.set_auth(auth["sid"], auth["csrf"])
+            return auth
+        with self.auth_lock:
+            if self.sid and self.sid != rejected_sid:
+                return {"sid": self.sid, "csrf": self.session.headers.get("X-CSRF-Token")}
+            if self.cache:
+                self.cache.forget_session(self.pihole_ip)
+            if not self.web_password:
+                return None
+            # Sessions expire while a watch runs, so this may happen many times per client,
+            # but at most once per request
+            print("Pi-hole session is no longer valid (HTTP 401); logging in again.")
+            return self.authenticate(self.web_password)
+
+    def request(self, method, path, body=None):
+        """Sends one API request and returns (status_code, parsed_json, response_text).
+
+        body, if given, is sent as JSON. parsed_json is None for an empty or
+        non-JSON body. Transport errors (connection refused, timeouts) are
+        raised as requests exceptions. A 401 drops the cached session and, if
+        login() was used (on this client or the one it was cloned from), logs
+        in again and repeats the request once.
+        """
+        url = f"{self.base_url}{path}"
+        if self.debug:
+            print(f"DEBUG_REQUEST: {method} {url}")
+        data = json.dumps(body) if body is not None else None
+        sent_sid = self.sid
+        response = self.session.request(method, url, data=data, timeout=self.timeout)
+        if response.status_code == 401:
+            if self.reauthenticate(sent_sid):
+                response = self.session.request(method, url, data=data, timeout=self.timeout)
+        elif self.cache:
+            self.cache.touch_session(self.pihole_ip)
+        response_text = response.text.strip()
+        try:
+            response_json = json.loads(response_text) if response_text else None
+        except json.JSONDecodeError:
+            response_json = None
+        return response.status_code, response_json, response_text
+
+    def ensure_session(self):
+        """Checks the session with one GET /api/auth and logs in again if Pi-hole no longer accepts it.
+
+        Returns True if the client holds a valid session afterwards. Called
+        before clone(), so that the workers start from a live session instead
+        of all running into the same 401.
+        """
+        try:
+            status, response_json, response_text = self.request("GET", "/api/auth")
+        except requests.exceptions.RequestException as e:
+            print(f"Error checking the Pi-hole session: {e}", file=sys.stderr)
+            return False
+        session = response_json.get("session") if isinstance(response_json, dict) else None
+        if status < 400 and isinstance(session, dict) and session.get("valid") is False:
+            return self.reauthenticate(self.sid) is not None
+        if status >= 400 and self.debug:
+            print(f"DEBUG: /api/auth response: '{response_text[:100]}...' (HTTP status: {status})")
+        return status < 400
+
+    def get_dns_records(self):
+        """Get all custom DNS records from Pi-hole.
+
+        Tries multiple API endpoints that might exist in different Pi-hole
+        versions. The endpoint and response format that worked are cached per
+        host, so later runs need a single request; a cached endpoint that
+        fails or answers in another format is forgotten and discovery runs
+        again.
+        """
+        # Use same endpoints as the add/delete operations
+        # And also try some other common endpoints for different Pi-hole versions
+        api_endpoints = [
+            "/api/config/dns/hosts",
+            "/api/dns/customdns",
+            "/admin/api.php?customdns",
+            "/api/customdns"
+        ]
 
-        if result.returncode == 0:
-            try:
-                response_json = json.loads(response_text)
-                if isinstance(response_json, list):
-                    print(f"Successfully retrieved {len(response_json)} DNS records from Pi-hole.")
-                    return response_json
-                else:
-                    print(f"Retrieved data is not a list: {response_json}")
-                    return []
-            except json.JSONDecodeError:
-                print(f"Failed to parse Pi-hole response as JSON: {response_text}")
-                return []
-        else:
-            print(f"Failed to get DNS records. curl command failed. Status: {result.returncode}", file=sys.stderr)
-            print(f"Curl Stdout: {result.stdout.strip()}", file=sys.stderr)
-            print(f"Curl Stderr: {result.stderr.strip()}", file=sys.stderr)
-            return []
-    except Exception as e:
-        print(f"An unexpected error occurred during Pi-hole DNS API call: {e}", file=sys.stderr)
+        print(f"Fetching current DNS records from Pi-hole...")
+
+        cached = self.cache.get_endpoint(self.pihole_ip) if self.cache else None
+        if cached:
+            record_format, records = self._fetch_dns_records(cached["endpoint"])
+            if records is not None and record_format == cached["format"]:
+                return records
+            print(f"INFO: Cached Pi-hole endpoint {cached['endpoint']} ({cached['format']}) no longer matches; rediscovering.")
+            self.cache.forget_endpoint(self.pihole_ip)
+
+        for endpoint in api_endpoints:
+            record_format, records = self._fetch_dns_records(endpoint)
+            if records is not None:
+                if self.cache:
+                    self.cache.set_endpoint(self.pihole_ip, endpoint, record_format)
+                return records
+
+        # If we reach here, we couldn't get records from any endpoint
+        print("Warning: Unable to retrieve custom DNS records from any Pi-hole API endpoint.")
+        # Just tell the user there might be records we can't retrieve
+        print("Note: There might be DNS records in Pi-hole that we couldn't retrieve via the API.")
         return []
 
-def add_dns_record(pihole_ip, sid, csrf_token, domain, ip_address, debug=False):
-    """Adds a DNS record to Pi-hole via its API using PUT /api/config/dns/hosts/."""
+    def _fetch_dns_records(self, endpoint):
+        """Reads records from one endpoint; returns (format, records), or (None, None) if it did not work."""
+        if self.debug:
+            print(f"DEBUG: Trying Pi-hole API endpoint: {endpoint}")
 
-    encoded_entry = urllib.parse.quote(f"{ip_address} {domain}")
-    api_url = f"http://{pihole_ip}/api/config/dns/hosts/{encoded_entry}"
+        try:
+            status, response_json, response_text = self.request("GET", endpoint)
+        except requests.exceptions.RequestException as e:
+            if self.debug:
+                print(f"DEBUG: Error trying endpoint {endpoint}: {e}")
+            return None, None
 
-    command_parts = [
-        'curl', '-s', '-X', 'PUT',
-        '-H', "Content-Type: application/json",
-        '-H', f"X-CSRF-Token: {csrf_token}",
-        '--cookie', f"SID={sid}",
-        api_url
-    ]
+        if self.debug:
+            print(f"DEBUG: Pi-hole endpoint {endpoint} response: '{response_text[:100]}...' (HTTP status: {status})")
 
-    if debug:
-        print(f"DEBUG_COMMAND: {' '.join(command_parts)}")
+        if status >= 400:
+            return None, None
+        if response_json is None:
+            if self.debug and response_text:
+                print(f"DEBUG: Failed to parse response from endpoint {endpoint} as JSON: {response_text[:100]}...")
+            return None, None
 
-    print(f"Attempting to add/update DNS record: {domain} -> {ip_address}")
+        record_format, records = parse_dns_records(response_json)
+        if records is None:
+            if self.debug:
+                print(f"DEBUG: Endpoint {endpoint} returned unexpected format: {json.dumps(response_json, indent=2)[:200]}...")
+            return None, None
 
-    try:
-        result = subprocess.run(command_parts, capture_output=True, text=True, check=False)
-        response_text = result.stdout.strip()
-        print(f"Pi-hole DNS API raw response: '{response_text}' (Return code: {result.returncode})")
+        if records:
+            print(f"Successfully retrieved {len(records)} DNS records from Pi-hole using endpoint {endpoint}.")
+        else:
+            print(f"Pi-hole responded successfully, but no custom DNS records found (endpoint {endpoint}).")
+        return record_format, records
 
-        if result.returncode == 0: # curl command executed successfully
-            if not response_text: # Truly empty response
-                print(f"Successfully added/updated DNS record for {domain} -> {ip_address} (empty response interpreted as success)")
-                return True
+    def get_hosts_config(self):
+        """Returns the raw dns.hosts entries ("<ip> <name> [<name>...]"), or None if the config API is unavailable."""
+        try:
+            status, response_json, response_text = self.request("GET", "/api/config/dns/hosts")
+        except requests.exceptions.RequestException as e:
+            print(f"Error reading dns.hosts from Pi-hole: {e}", file=sys.stderr)
+            return None
+        if status >= 400 or not isinstance(response_json, dict):
+            if self.debug:
+                print(f"DEBUG: /api/config/dns/hosts response: '{response_text[:100]}...' (HTTP status: {status})")
+            return None
+        hosts = response_json.get("config", {}).get("dns", {}).get("hosts")
+        if not isinstance(hosts, list):
+            return None
+        return [entry for entry in hosts if isinstance(entry, str)]
 
-            try:
-                response_json = json.loads(response_text)
-                if not isinstance(response_json, dict):
-                    # If it's JSON but not a dictionary, it's unexpected.
-                    print(f"Failed to add DNS record for {domain}. Unexpected JSON type (expected dict, got {type(response_json).__name__}): {response_text}", file=sys.stderr)
-                    return False
-
-                # Now we know response_json is a dictionary
-                if response_json.get("success") is True:
-                    message = response_json.get("message", "Action successful.") # Provide a default message
-                    print(f"Successfully added/updated DNS record for {domain} -> {ip_address}. Pi-hole message: {message}")
-                    return True
-                elif "error" in response_json:
-                    error_details = response_json.get("error", {})
-                    error_message = error_details.get("message", "Unknown error")
-                    if isinstance(error_details, dict):
-                         hint = error_details.get("hint", "")
-                         key = error_details.get("key", "N/A")
-                         error_message = f"{key}: {error_message}. Hint: {hint}"
-                    print(f"Failed to add DNS record for {domain}. Pi-hole API error: {error_message}", file=sys.stderr)
-                    return False
-                elif "took" in response_json: # This is the observed success case from user logs
-                    print(f"Successfully added/updated DNS record for {domain} -> {ip_address} (API reported 'took': {response_json.get('took')}, interpreted as success)")
-                    return True
-                elif response_text == "{}": # Empty JSON object, sometimes used for success
-                    print(f"Successfully added/updated DNS record for {domain} -> {ip_address} (empty JSON object '{{}}' interpreted as success)")
-                    return True
-                else:
-                    # JSON dictionary, but not matching known success/error patterns
-                    print(f"Failed to add DNS record for {domain}. Unexpected JSON dictionary content: {response_text}", file=sys.stderr)
-                    return False
-
-            except json.JSONDecodeError:
-                # Non-JSON response (and not empty, as that's handled above)
-                print(f"Failed to add DNS record for {domain}. Non-JSON response from Pi-hole: {response_text}", file=sys.stderr)
-                return False
-        else: # curl command itself failed
-            print(f"Failed to add DNS record for {domain}. curl command failed. Status: {result.returncode}", file=sys.stderr)
-            print(f"Curl Stdout: {result.stdout.strip()}", file=sys.stderr)
-            print(f"Curl Stderr: {result.stderr.strip()}", file=sys.stderr)
+    def set_hosts_config(self, hosts):
+        """Replaces the whole dns.hosts array with one config PATCH; returns True on success."""
+        try:
+            status, response_json, response_text = self.request(
+                "PATCH", "/api/config", {"config": {"dns": {"hosts": hosts}}}
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to write dns.hosts to Pi-hole: {e}", file=sys.stderr)
             return False
-    except Exception as e:
-        print(f"An unexpected error occurred during Pi-hole DNS API call: {e}", file=sys.stderr)
-        return False
+        if status >= 400 or (isinstance(response_json, dict) and "error" in response_json):
+            print(f"Failed to write dns.hosts to Pi-hole. HTTP status {status}: {response_text}", file=sys.stderr)
+            return False
+        return True
+
+    def add_dns_record(self, domain, ip_address):
+        """Adds a DNS record to Pi-hole via its API using PUT /api/config/dns/hosts/."""
+        print(f"Attempting to add/update DNS record: {domain} -> {ip_address}")
+        return self.change_dns_record("PUT", domain, ip_address)[0]
+
+    def delete_dns_record(self, domain, ip_address):
+        """Deletes a DNS record from Pi-hole via its API using DELETE /api/config/dns/hosts/."""
+        print(f"Attempting to delete DNS record: {domain} -> {ip_address}")
+        return self.change_dns_record("DELETE", domain, ip_address)[0]
+
+    def clone(self):
+        """Returns a new client with its own session but the same SID/CSRF, for use from another thread.
+
+        A 401 on the clone is handled by this client's reauthenticate(), so
+        the clone logs in again with this client's password and session cache.
+        """
+        other = PiholeClient(self.pihole_ip, timeout=self.timeout, debug=self.debug)
+        other.parent = self.parent or self
+        other.session.cookies.update(self.session.cookies)
+        other.sid = self.sid
+        if "X-CSRF-Token" in self.session.headers:
+            other.session.headers["X-CSRF-Token"] = self.session.headers["X-CSRF-Token"]
+        return other
+
+    def change_dns_record(self, method, domain, ip_address):
+        """Sends one PUT/DELETE for a hosts entry and interprets the response.
+
+        Returns (success, retryable); retryable is True for timeouts,
+        connection errors and 5xx responses.
+        """
+        verb = "add" if method == "PUT" else "delete"
+        done = "added/updated" if method == "PUT" else "deleted"
+        encoded_entry = urllib.parse.quote(f"{ip_address} {domain}")
 
-def delete_dns_record(pihole_ip, sid, csrf_token, domain, ip_address, debug=False):
-    """Deletes a DNS record from Pi-hole via its API using DELETE /api/config/dns/hosts/."""
+        try:
+            status, response_json, response_text = self.request(method, f"/api/config/dns/hosts/{encoded_entry}")
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to {verb} DNS record for {domain}. Request to Pi-hole failed: {e}", file=sys.stderr)
+            return False, isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+        print(f"Pi-hole DNS API raw response ({verb}): '{response_text}' (HTTP status: {status})")
+
+        if isinstance(response_json, dict) and "error" in response_json:
+            error_details = response_json.get("error", {})
+            error_message = error_details
+            if isinstance(error_details, dict):
+                hint = error_details.get("hint", "")
+                key = error_details.get("key", "N/A")
+                error_message = f"{key}: {error_details.get('message', 'Unknown error')}. Hint: {hint}"
+            print(f"Failed to {verb} DNS record for {domain}. Pi-hole API error: {error_message}", file=sys.stderr)
+            return False, status >= 500
+        if status >= 400:
+            print(f"Failed to {verb} DNS record for {domain}. HTTP status {status}: {response_text}", file=sys.stderr)
+            return False, status >= 500
+
+        if not response_text: # Empty body (e.g. 204 No Content)
+            print(f"Successfully {done} DNS record for {domain} -> {ip_address} (empty response interpreted as success)")
+            return True, False
+        if response_json is None:
+            print(f"Failed to {verb} DNS record for {domain}. Non-JSON response from Pi-hole: {response_text}", file=sys.stderr)
+            return False, False
+        if not isinstance(response_json, dict):
+            # If it's JSON but not a dictionary, it's unexpected.
+            print(f"Failed to {verb} DNS record for {domain}. Unexpected JSON type (expected dict, got {type(response_json).__name__}): {response_text}", file=sys.stderr)
+            return False, False
+
+        if response_json.get("success") is True:
+            message = response_json.get("message", "Action successful.") # Provide a default message
+            print(f"Successfully {done} DNS record for {domain} -> {ip_address}. Pi-hole message: {message}")
+            return True, False
+        if "took" in response_json: # This is the observed success case from user logs
+            print(f"Successfully {done} DNS record for {domain} -> {ip_address} (API reported 'took': {response_json.get('took')}, interpreted as success)")
+            return True, False
+        if not response_json: # Empty JSON object, sometimes used for success
+            print(f"Successfully {done} DNS record for {domain} -> {ip_address} (empty JSON object '{{}}' interpreted as success)")
+            return True, False
+        if method == "DELETE":
+            # Pi-hole might return something like {"message": "Deleted ..."} without a success flag.
+            # A 2xx status with no error is taken as success for delete.
+            print(f"Deleted DNS record for {domain} -> {ip_address} (response interpreted as informational, assuming success if no error: {response_text})")
+            return True, False
+        # JSON dictionary, but not matching known success/error patterns
+        print(f"Failed to add DNS record for {domain}. Unexpected JSON dictionary content: {response_text}", file=sys.stderr)
+        return False, False
+
+def parse_dns_records(response_json):
+    """Extracts [{"domain": ..., "ip": ...}] from the response formats of different Pi-hole API versions.
+
+    Returns (format, records), where format names the matched case, or
+    (None, None) when the response matches none of the known formats.
+    """
+    # Case 1: Direct list of records
+    if isinstance(response_json, list):
+        return "list", response_json
 
-    encoded_entry = urllib.parse.quote(f"{ip_address} {domain}")
-    api_url = f"http://{pihole_ip}/api/config/dns/hosts/{encoded_entry}"
+    if not isinstance(response_json, dict):
+        return None, None
 
-    command_parts = [
-        'curl', '-s', '-X', 'DELETE',
-        '-H', "Content-Type: application/json", # Though not strictly needed for DELETE with no body
-        '-H', f"X-CSRF-Token: {csrf_token}",
-        '--cookie', f"SID={sid}",
-        api_url
-    ]
+    # Case 2: Data in a "data" field
+    if isinstance(response_json.get("data"), list):
+        return "data", response_json["data"]
+
+    # Case 3: Specific format with "customdns" field (some Pi-hole versions)
+    if isinstance(response_json.get("customdns"), list):
+        return "customdns", response_json["customdns"]
+
+    # Case 4: Data in a nested structure (config -> dns -> hosts)
+    config = response_json.get("config")
+    if isinstance(config, dict) and isinstance(config.get("dns"), dict) and "hosts" in config["dns"]:
+        hosts = config["dns"]["hosts"]
+        if isinstance(hosts, list):
+            # Parse entries like "<EXAMPLE-IP-187> pi.alert" into structured records
+            records = []
+            for entry in hosts:
+                if isinstance(entry, str) and " " in entry:
+                    ip, domain = entry.split(" ", 1)
+                    records.append({"domain": domain.strip(), "ip": ip.strip()})
+            return "config", records
+
+    # Case 5: Empty but valid response (no custom records)
+    if "success" in response_json or "took" in response_json:
+        return "empty", []
+
+    return None, None
+
+def build_hosts_config(current_hosts, records, action):
+    """Computes the complete dns.hosts array after applying records with the given action.
+
+    Names in records are managed: their existing entries are dropped and, for
+    'add', replaced by one "<ip> <domain>" entry each. Every other entry (and
+    every other name on a multi-name entry) is kept as it is, in its original
+    order.
+    """
+    managed = {record["domain"].lower() for record in records}
+    hosts = []
+    for entry in current_hosts:
+        fields = entry.split()
+        if len(fields) < 2:
+            hosts.append(entry)
+            continue
+        names = [name for name in fields[1:] if name.lower() not in managed]
+        if len(names) == len(fields) - 1:
+            hosts.append(entry)
+        elif names:
+            hosts.append(" ".join([fields[0]] + names))
+    if action == "add":
+        added = set()
+        for record in records:
+            entry = f"{record['ip']} {record['domain']}"
+            if entry not in added:
+                added.add(entry)
+                hosts.append(entry)
+    return hosts
+
+def normalize_hosts(hosts):
+    """Returns dns.hosts entries as a set of (ip, lowercased name) pairs, the way Pi-hole resolves them.
+
+    Case, extra whitespace, duplicates and how names are grouped per entry
+    do not change the result; malformed entries are kept whitespace-collapsed.
+    """
+    pairs = set()
+    for entry in hosts:
+        fields = entry.split()
+        if len(fields) < 2:
+            pairs.add(" ".join(fields))
+            continue
+        pairs.update((fields[0], name.lower()) for name in fields[1:])
+    return pairs
+
+def apply_hosts_bulk(client, records, action):
+    """Applies all records with one dns.hosts PATCH and verifies it with one read.
+
+    Returns True or False, or None when the Pi-hole has no config API, in
+    which case the caller falls back to per-record requests.
+    """
+    current_hosts = client.get_hosts_config()
+    if current_hosts is None:
+        print("INFO: Pi-hole config API (/api/config/dns/hosts) not available; falling back to per-record requests.")
+        return None
 
-    if debug:
-        print(f"DEBUG_COMMAND: {' '.join(command_parts)}")
+    desired_hosts = build_hosts_config(current_hosts, records, action)
+    if normalize_hosts(desired_hosts) == normalize_hosts(current_hosts):
+        print("INFO: dns.hosts already matches the desired state; nothing to write.")
+        return True
 
-    print(f"Attempting to delete DNS record: {domain} -> {ip_address}")
-    # print(f"Executing command: {' '.join(command_parts)}") # Avoid printing tokens/sid
+    removed = len(set(current_hosts) - set(desired_hosts))
+    added = len(set(desired_hosts) - set(current_hosts))
+    print(f"INFO: Writing dns.hosts in one request: {len(desired_hosts)} entries ({added} new, {removed} removed).")
+    if not client.set_hosts_config(desired_hosts):
+        return False
 
-    try:
-        result = subprocess.run(command_parts, capture_output=True, text=True, check=False)
-        response_text = result.stdout.strip()
-        print(f"Pi-hole DNS API raw response (delete): '{response_text}' (Return code: {result.returncode})")
+    applied_hosts = client.get_hosts_config()
+    # Pi-hole may store entries normalised (case, whitespace, duplicates), so compare what they resolve to
+    applied, desired = normalize_hosts(applied_hosts or []), normalize_hosts(desired_hosts)
+    if applied_hosts is None or applied != desired:
+        missing = sorted(map(str, desired - applied))
+        unexpected = sorted(map(str, applied - desired))
+        print(f"Error: dns.hosts verification failed. Missing: {missing} Unexpected: {unexpected}", file=sys.stderr)
+        return False
+    print(f"Successfully applied and verified {len(records)} DNS records with action '{action}'.")
+    return True
 
-        if result.returncode == 0: # curl command executed successfully
-            if not response_text: # Empty response is often success for DELETE
-                print(f"Successfully deleted DNS record for {domain} -> {ip_address} (empty response interpreted as success)")
-                return True
+def apply_records_concurrently(client, records, action, workers=4, retries=3, backoff=0.5):
+    """Applies records one request each from a bounded pool of workers.
 
-            try:
-                response_json = json.loads(response_text)
-                if not isinstance(response_json, dict):
-                    print(f"Failed to delete DNS record for {domain}. Unexpected JSON type (expected dict, got {type(response_json).__name__}): {response_text}", file=sys.stderr)
-                    return False
-
-                if response_json.get("success") is True:
-                    message = response_json.get("message", "Action successful.")
-                    print(f"Successfully deleted DNS record for {domain} -> {ip_address}. Pi-hole message: {message}")
-                    return True
-                elif "error" in response_json:
-                    error_details = response_json.get("error", {})
-                    error_message = error_details.get("message", "Unknown error")
-                    if isinstance(error_details, dict):
-                         hint = error_details.get("hint", "")
-                         key = error_details.get("key", "N/A")
-                         error_message = f"{key}: {error_message}. Hint: {hint}"
-                    print(f"Failed to delete DNS record for {domain}. Pi-hole API error: {error_message}", file=sys.stderr)
-                    return False
-                # Pi-hole might return something like {"message": "Deleted ..."} without a top-level "success" key
-                # or just {"took": ...} as observed for add. For delete, an empty response is common.
-                # Let's assume if no error and it's a dict, it might be a custom success message.
-                # The primary check for delete is often an empty body and 200/204 status.
-                # Since curl -s hides status, we rely on returncode 0 and parseable/empty response.
-                elif response_text == "{}": # Empty JSON object
-                    print(f"Successfully deleted DNS record for {domain} -> {ip_address} (empty JSON object '{{}}' interpreted as success)")
-                    return True
-                else:
-                    # If it's a dict but doesn't match known patterns, treat as unexpected for now.
-                    # It could be a success message like {"message": "Record deleted"} without a success flag.
-                    # For now, being conservative. If Pi-hole returns such a message, this can be refined.
-                    print(f"Deleted DNS record for {domain} -> {ip_address} (response interpreted as informational, assuming success if no error: {response_text})")
-                    return True # Assuming if no error and some JSON, it might be okay for delete.
-
-            except json.JSONDecodeError:
-                print(f"Failed to delete DNS record for {domain}. Non-JSON response from Pi-hole: {response_text}", file=sys.stderr)
-                return False
-        else: # curl command itself failed
-            print(f"Failed to delete DNS record for {domain}. curl command failed. Status: {result.returncode}", file=sys.stderr)
-            print(f"Curl Stdout: {result.stdout.strip()}", file=sys.stderr)
-            print(f"Curl Stderr: {result.stderr.strip()}", file=sys.stderr)
-            return False
-    except Exception as e:
-        print(f"An unexpected error occurred during Pi-hole DNS API call (delete): {e}", file=sys.stderr)
-        return False
+    Each worker thread gets its own clone of client (a requests.Session is
+    not meant to be shared between threads). Timeouts, connection errors and
+    5xx responses are retried with exponential backoff (backoff, 2*backoff,
+    ...). Prints a summary and returns the number of records that failed.
+    """
+    method = "PUT" if action == "add" else "DELETE"
+    local = threading.local()
+    clients = []
+    clients_lock = threading.Lock()
+
+    def worker_client():
+        if workers == 1:
+            return client
+        if not hasattr(local, "client"):
+            local.client = client.clone()
+            with clients_lock:
+                clients.append(local.client)
+        return local.client
+
+    # Inside a multi-instance run, keep this instance's output prefix on the worker threads
+    output_prefix = sys.stdout.prefix() if isinstance(sys.stdout, InstanceOutput) else None
+
+    def process(record):
+        if output_prefix is not None and sys.stdout.prefix() is None:
+            sys.stdout.set_prefix(output_prefix)
+            sys.stderr.set_prefix(output_prefix)
+        worker = worker_client()
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            ok, retryable = worker.change_dns_record(method, record["domain"], record["ip"])
+            if ok or not retryable or attempt > retries:
+                break
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"Retrying {record['domain']} -> {record['ip']} in {delay:.2f}s (attempt {attempt + 1} of {retries + 1})")
+            time.sleep(delay)
+        return {"record": record, "ok": ok, "attempts": attempt, "seconds": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process, records))
+    finally:
+        for worker in clients:
+            worker.close()
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if not result["ok"]]
+    print(f"\nSummary ({action}, {workers} workers):")
+    for result in results:
+        status = "ok    " if result["ok"] else "FAILED"
+        record = result["record"]
+        print(f"  {status} {record['domain']} -> {record['ip']}  {result['seconds']:.3f}s ({result['attempts']} attempt(s))")
+    if results:
+        per_record = [result["seconds"] for result in results]
+        print(
+            f"{len(results) - len(failed)} succeeded, {len(failed)} failed in {elapsed:.2f}s "
+            f"(per record: avg {sum(per_record) / len(per_record):.3f}s, max {max(per_record):.3f}s)"
+        )
+    return len(failed)
 
-def get_terraform_outputs(tf_dir):
+def get_terraform_outputs(tf_dir, debug=False, cached_only=False):
     """
-    Executes 'tofu output -json' in the specified directory to retrieve VM details
-    by parsing the 'ansible_inventory_data' output.
+    Returns VM IPs and names by parsing the 'ansible_inventory_data' output of tf_dir.
+    Reads the .cache/tofu-outputs.json written by iac-wrapper.sh when it is fresh,
+    otherwise runs 'tofu output -json' (see tofu_outputs.py). With cached_only the
+    cache is always read and OpenTofu is never started.
     """
     try:
-        # Выполняем 'tofu output -json'
-        result = subprocess.run(
-            ["tofu", "output", "-json"],
-            cwd=tf_dir,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8' # Явно указываем кодировку
-        )
-        terraform_output_json = json.loads(result.stdout)
+        if cached_only:
+            terraform_output_json = tofu_outputs.read_cached_outputs()
+        else:
+            terraform_output_json = tofu_outputs.load_outputs(tf_dir, debug=debug)
 
-        # Ищем 'ansible_inventory_data'
-        inventory_data_str = terraform_output_json.get("ansible_inventory_data", {}).get("value")
+        # Ищем и десериализуем вложенный JSON 'ansible_inventory_data'
+        inventory_data = tofu_outputs.inventory_from_outputs(terraform_output_json)
 
-        if not inventory_data_str:
+        if not inventory_data:
             print("Error: 'ansible_inventory_data' output is empty or not found in Terraform output.", file=sys.stderr)
             return None, None
 
-        # Десериализуем вложенный JSON
-        inventory_data = json.loads(inventory_data_str)
         hostvars = inventory_data.get("_meta", {}).get("hostvars")
 
         if not hostvars:
@@ -401,7 +705,7 @@ def get_terraform_outputs(tf_dir):
         return None, None
     except json.JSONDecodeError as e:
         print(f"Failed to parse JSON from Terraform output: {e}", file=sys.stderr)
-        print(f"Raw output: {result.stdout[:200]}...", file=sys.stderr)
+        print(f"Raw output: {e.doc[:200]}...", file=sys.stderr)
         return None, None
     except KeyError as e:
         print(f"Failed to find expected key in Terraform output: {e}", file=sys.stderr)
@@ -550,116 +854,8 @@ def prompt_for_selection(records, action_description):
             except ValueError:
                 print("Invalid input. Please enter a number, 'a' for all, or 'q' to quit.")
 
-def main():
-    parser = argparse.ArgumentParser(description="Manage Pi-hole DNS records based on Terraform outputs.")
-    parser.add_argument(
-        "--action",
-        choices=['list', 'add', 'unregister-dns', 'interactive-add', 'interactive-unregister'],
-        required=True,
-        help="Action to perform: 'list' to show records, 'add' or 'unregister-dns' for DNS records, 'interactive-add' or 'interactive-unregister' for interactive mode."
-    )
-    parser.add_argument(
-        "--tf-dir",
-        required=True,
-        help="Path to the Terraform directory containing outputs.tf and potentially .tfvars files."
-    )
-    parser.add_argument(
-        "--secrets-file",
-        help="Path to the SOPS-encrypted secrets YAML file. Defaults to ../terraform/secrets.sops.yaml relative to this script."
-    )
-    parser.add_argument(
-        "--domain-suffix",
-        help="Filter DNS records by this domain suffix (e.g., '<your-domain>.com'). Used to identify cluster records."
-    )
-    parser.add_argument(
-        "--proxy-fqdn-for-short-hosts",
-        action="store_true",
-        help="Also register <short-host>.<domain> records pointing to the nginx proxy IP."
-    )
-    parser.add_argument(
-        "--proxy-ip",
-        help="Proxy IP for --proxy-fqdn-for-short-hosts. Defaults to pihole.proxy_ip, nginx_proxy.ip_address, or config/inventory/static.ini [nginx_proxies]."
-    )
-    parser.add_argument(
-        "--fqdn-domain",
-        help="Domain for --proxy-fqdn-for-short-hosts. Defaults to platform_domains.primary, primary_domain, server_domain, domain, mailserver_domain, or mailserver.domain from secrets."
-    )
-    parser.add_argument(
-        "--debug",
-        action="store_true",
-        help="Enable debug mode (prints curl commands and other debug info)."
-    )
-
-    args = parser.parse_args()
-
-    if args.debug:
-        print(f"DEBUG: Script arguments: {args}")
-
-    # Load secrets
-    secrets = load_sops_secrets(args.secrets_file, debug=args.debug) # Pass debug flag
-    if not secrets:
-        sys.exit(1)
-
-    # Correctly access nested Pi-hole credentials
-    pihole_data = secrets.get('pihole')
-    if not pihole_data and 'default' in secrets:
-        pihole_data = secrets.get('default', {}).get('pihole')
-
-    if not pihole_data:
-        print("Error: 'pihole' key not found in secrets file, neither at the root nor under 'default'.", file=sys.stderr)
-        if args.debug:
-            print(f"DEBUG: Loaded secrets structure: {secrets}")
-        sys.exit(1)
-
-    pihole_ip = pihole_data.get('ip_address')
-    pihole_web_password = pihole_data.get('web_password')
-
-    if not pihole_ip or not pihole_web_password:
-        print("Error: Pi-hole IP address or web password not found within the 'pihole' configuration block.", file=sys.stderr)
-        if args.debug: # Conditional print
-            print(f"DEBUG: Loaded pihole data: {pihole_data}")
-        sys.exit(1)
-
-    # Authenticate to Pi-hole
-    auth_details = authenticate_pihole(pihole_ip, pihole_web_password)
-    if not auth_details:
-        print("Failed to authenticate with Pi-hole. Exiting.", file=sys.stderr)
-        sys.exit(1)
-
-    sid = auth_details["sid"]
-    csrf_token = auth_details["csrf"]
-
-    # Get current DNS records from Pi-hole
-    current_records = get_dns_records(pihole_ip, sid, csrf_token, debug=args.debug)
-
-    if args.action == "list":
-        # Just print the current DNS records and exit
-        if current_records:
-            print("\nCurrent DNS records in Pi-hole:")
-            for i, record in enumerate(current_records, 1):
-                ip = record.get("ip", "N/A")
-                domain = record.get("domain", "N/A")
-                print(f"{i}. {domain} -> {ip}")
-        else:
-            print("No custom DNS records found in Pi-hole.")
-        sys.exit(0)
-
-    # Get Terraform outputs
-# Get Terraform outputs
-    vm_ipv4_addresses_output, vm_fqdns_output = get_terraform_outputs(args.tf_dir)
-
-    if vm_ipv4_addresses_output is None or vm_fqdns_output is None:
-       # Error message is already printed inside the function
-       sys.exit(1)
-
-    if args.debug:
-        print(f"DEBUG: Extracted vm_ipv4_addresses_output: {vm_ipv4_addresses_output} (type: {type(vm_ipv4_addresses_output)})")
-        print(f"DEBUG: Extracted vm_fqdns_output: {vm_fqdns_output} (type: {type(vm_fqdns_output)})")
-
-    if not vm_ipv4_addresses_output or not vm_fqdns_output:
-        print("Error: vm_ipv4_addresses_output or vm_fqdns_output is empty after extracting from Terraform output.")
-        sys.exit(1)
-
+def build_terraform_records(vm_ipv4_addresses_output, vm_fqdns_output, args, secrets):
+    """Returns the desired [{"domain", "ip"}] records for the VMs, or None on a configuration error."""
     # Handle both list and dict types for outputs
     # If they are dicts, we assume keys match between FQDNs and IPs
 
@@ -673,10 +869,10 @@ def main():
 
         if not fqdn_domain:
             print("Error: Unable to resolve FQDN domain for proxy DNS records.", file=sys.stderr)
-            sys.exit(1)
+            return None
         if not proxy_ip:
             print("Error: Unable to resolve proxy IP for proxy DNS records.", file=sys.stderr)
-            sys.exit(1)
+            return None
 
         for domain in vm_fqdns_output:
             if "." in domain:
@@ -688,30 +884,167 @@ def main():
     #    print(f"ERROR: vm_fqdns_output (type: {type(vm_fqdns_output)}) and vm_ipv4_addresses_output (type: {type(vm_ipv4_addresses_output)}) are of incompatible or mixed types. Both must be lists or both must be dictionaries.")
     #    sys.exit(1)
 
-    # Compare Terraform records with Pi-hole records
-    if not terraform_records:
-        print("INFO: No DNS records found in Terraform outputs. Nothing to process.")
-        sys.exit(0)
+    return terraform_records
+
+def get_pihole_targets(pihole_data, explicit_ips=None):
+    """Returns [(ip, web_password)] for every Pi-hole instance to manage.
+
+    pihole.ip_address may be one address or a list, and pihole.instances may
+    list {ip_address, web_password} entries for instances with their own
+    password; the others use pihole.web_password. explicit_ips (--pihole)
+    selects instances instead.
+    """
+    default_password = pihole_data.get('web_password')
+    ip_addresses = pihole_data.get('ip_address')
+    if not isinstance(ip_addresses, list):
+        ip_addresses = [ip_addresses]
+
+    passwords = {ip: default_password for ip in ip_addresses if ip}
+    for instance in pihole_data.get('instances') or []:
+        if isinstance(instance, dict) and instance.get('ip_address'):
+            passwords[instance['ip_address']] = instance.get('web_password') or default_password
+
+    if explicit_ips:
+        return [(ip, passwords.get(ip, default_password)) for ip in dict.fromkeys(explicit_ips)]
+    return list(passwords.items())
+
+class InstanceOutput:
+    """Stream wrapper that prefixes each line with the Pi-hole instance of the writing thread.
+
+    Threads that never called set_prefix() write through unchanged.
+    """
 
-    # Convert Pi-hole records to a set for easy comparison
-    pihole_domains = {rec.get("domain"): rec.get("ip") for rec in current_records if rec.get("domain") and rec.get("ip")}
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
 
-    # Determine missing/existing records
-    records_to_add = []
-    for rec in terraform_records:
-        domain = rec["domain"]
-        ip = rec["ip"]
+    def set_prefix(self, prefix):
+        self.local.prefix = prefix
+        self.local.buffer = ""
 
-        if domain not in pihole_domains:
-            # Not in Pi-hole, should be added
-            records_to_add.append(rec)
-        elif pihole_domains[domain] != ip:
-            # In Pi-hole but IP differs, should be updated
-            records_to_add.append(rec)
+    def prefix(self):
+        return getattr(self.local, "prefix", None)
 
-    # Determine records to delete (in Pi-hole but not in Terraform)
-    terraform_domains = {rec["domain"] for rec in terraform_records}
-    records_to_delete = []
+    def write(self, text):
+        prefix = self.prefix()
+        if prefix is None:
+            return self.stream.write(text)
+        lines = (self.local.buffer + text).split("\n")
+        self.local.buffer = lines.pop()
+        if lines:
+            with self.lock:
+                self.stream.write("".join(f"[{prefix}] {line}\n" for line in lines))
+        return len(text)
+
+    def finish(self):
+        if self.prefix() is not None and self.local.buffer:
+            self.write("\n")
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        # encoding, isatty(), fileno() etc. come from the wrapped stream
+        return getattr(self.stream, name)
+
+
+def run_on_instances(targets, function):
+    """Runs function(ip, web_password) for all targets concurrently; returns [(ip, result, seconds)].
+
+    With several targets, stdout/stderr lines are prefixed with the instance IP.
+    """
+    if len(targets) == 1:
+        ip, password = targets[0]
+        start = time.perf_counter()
+        result = function(ip, password)
+        return [(ip, result, time.perf_counter() - start)]
+
+    stdout, stderr = InstanceOutput(sys.stdout), InstanceOutput(sys.stderr)
+
+    def run(target):
+        ip, password = target
+        stdout.set_prefix(ip)
+        stderr.set_prefix(ip)
+        start = time.perf_counter()
+        try:
+            return ip, function(ip, password), time.perf_counter() - start
+        finally:
+            stdout.finish()
+            stderr.finish()
+
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            return list(pool.map(run, targets))
+    finally:
+        sys.stdout, sys.stderr = stdout.stream, stderr.stream
+
+def print_instance_timings(results, describe):
+    """Prints one line per Pi-hole instance with describe(result) and its elapsed time."""
+    print("\nPer-instance results:")
+    for ip, result, seconds in results:
+        print(f"  {ip:<20} {describe(result):<20} {seconds:.2f}s")
+    print(f"Slowest instance: {max(seconds for _, _, seconds in results):.2f}s")
+
+def read_pihole_records(pihole_ip, web_password, args, cache):
+    """Logs in and returns the custom DNS records of one Pi-hole, or None if login failed."""
+    client = PiholeClient(pihole_ip, debug=args.debug, cache=cache)
+    try:
+        if not client.login(web_password):
+            return None
+        return client.get_dns_records()
+    finally:
+        client.close()
+
+def find_drift(records_by_instance, zones=None):
+    """Prints every domain whose IP set differs between Pi-hole instances; returns their number.
+
+    A domain missing on an instance counts as drift. With zones (a ZoneTrie),
+    only domains inside them are compared.
+    """
+    indexes = {ip: RecordIndex.from_records(records) for ip, records in records_by_instance.items()}
+    domains = set()
+    for index in indexes.values():
+        domains.update(index.domains())
+
+    drift = 0
+    for domain in sorted(domains):
+        if zones is not None and not zones.covers(domain, include_apex=True):
+            continue
+        answers = {ip: index.get(domain) for ip, index in indexes.items()}
+        if len({frozenset(ips) for ips in answers.values()}) > 1:
+            drift += 1
+            details = "; ".join(f"{ip}: {', '.join(sorted(ips)) or 'missing'}" for ip, ips in answers.items())
+            print(f"DRIFT {domain}: {details}")
+
+    if drift:
+        print(f"Found {drift} domain(s) that differ between {len(indexes)} Pi-hole instances.")
+    else:
+        print(f"All {len(indexes)} Pi-hole instances serve the same {len(domains)} custom domains.")
+    return drift
+
+def sync_pihole(pihole_ip, web_password, args, terraform_records, cache):
+    """Reconciles one Pi-hole with the Terraform records; returns the exit code (0 or 1)."""
+    # Authenticate to Pi-hole
+    client = PiholeClient(pihole_ip, debug=args.debug, cache=cache)
+    auth_details = client.login(web_password)
+    if not auth_details:
+        print("Failed to authenticate with Pi-hole. Exiting.", file=sys.stderr)
+        return 1
+
+    try:
+        return reconcile_pihole(client, args, terraform_records)
+    finally:
+        client.close()
+
+def reconcile_pihole(client, args, terraform_records):
+    """Computes and applies the changes for args.action on one logged-in Pi-hole; returns the exit code."""
+    # Get current DNS records from Pi-hole
+    current_records = client.get_dns_records()
+    if client.cache:
+        # Persist the session and endpoint now, before a long or interrupted run
+        client.cache.save()
 
     # Get domain suffix from args or use defaults
     domain_suffixes = []
@@ -726,95 +1059,475 @@ def main():
     if args.debug:
         print(f"DEBUG: Using domain suffixes for filtering: {domain_suffixes}")
 
-    for rec in current_records:
-        domain = rec.get("domain")
-        ip = rec.get("ip")
+    # Index both sides (domain -> set of IPs). Pi-hole records inside our zones, and
+    # any name Terraform manages, are owned by this script; the rest are left alone.
+    desired_index = RecordIndex.from_records(terraform_records, owner=RECORD_OWNER)
+    current_index = RecordIndex.from_records(current_records, owner=RECORD_OWNER, zones=ZoneTrie(domain_suffixes))
+    current_index.claim(desired_index.domains(), RECORD_OWNER)
+    changes = compute_changeset(current_index, desired_index, RECORD_OWNER)
+
+    # Missing records, and new IPs of domains whose IP set changed
+    records_to_add = changes.records_to_put()
+    # Old IPs of those domains, removed after the new ones are in place
+    records_to_replace = changes.records_to_remove(include_stale=False)
 
-        if domain and domain not in terraform_domains:
-            # Skip non-cluster records by checking domain suffix
-            if any(domain.endswith(suffix) for suffix in domain_suffixes):
-                records_to_delete.append({"domain": domain, "ip": ip})
+    if args.debug:
+        print(f"DEBUG: Changeset: {changes.summary()}")
+        for domain, ips in sorted(changes.delete.items()):
+            print(f"DEBUG: Stale record in managed zone (not deleted): {domain} -> {', '.join(sorted(ips))}")
 
     # Process according to action
+    records_to_unset = []
     if args.action == "interactive-add":
         # Interactive mode for adding
         if not records_to_add:
             print("INFO: All Terraform records already exist in Pi-hole with correct IPs.")
-            sys.exit(0)
+            return 0
 
         print(f"Found {len(records_to_add)} records to add/update in Pi-hole.")
         selected_records = prompt_for_selection(records_to_add, "addition/update")
 
         if not selected_records:
             print("No records selected for addition. Exiting.")
-            sys.exit(0)
+            return 0
 
         records_to_process = selected_records
+        selected_domains = {record["domain"] for record in selected_records}
+        records_to_unset = [record for record in records_to_replace if record["domain"] in selected_domains]
         action = "add"
 
     elif args.action == "interactive-unregister":
         # Interactive mode for deletion
         # Only show cluster records from current cluster for deletion
-        cluster_records = []
-        for rec in terraform_records:
-            domain = rec["domain"]
-            ip = rec["ip"]
-
-            if domain in pihole_domains:
-                cluster_records.append({"domain": domain, "ip": pihole_domains[domain]})
+        cluster_records = [
+            {"domain": domain, "ip": ip}
+            for domain in desired_index.domains()
+            for ip in sorted(current_index.get(domain))
+        ]
 
         if not cluster_records:
             print("INFO: No cluster records found in Pi-hole to delete.")
-            sys.exit(0)
+            return 0
 
         print(f"Found {len(cluster_records)} cluster records in Pi-hole.")
         selected_records = prompt_for_selection(cluster_records, "deletion")
 
         if not selected_records:
             print("No records selected for deletion. Exiting.")
-            sys.exit(0)
+            return 0
 
         records_to_process = selected_records
         action = "unregister-dns"
 
     elif args.action == "add":
         # Normal add mode
-        if not records_to_add:
+        if not records_to_add and not records_to_replace:
             print("INFO: All Terraform records already exist in Pi-hole with correct IPs.")
-            sys.exit(0)
+            return 0
 
         records_to_process = records_to_add
+        records_to_unset = records_to_replace
         action = "add"
 
     elif args.action == "unregister-dns":
-        # Normal delete mode
-        records_to_process = terraform_records
+        # Normal delete mode: every IP Pi-hole has for our names, plus the Terraform
+        # records themselves in case Pi-hole's records could not be read
+        records_to_process = [
+            {"domain": domain, "ip": ip}
+            for domain in desired_index.domains()
+            for ip in sorted(current_index.get(domain) | desired_index.get(domain))
+        ]
         action = "unregister-dns"
 
-    if not records_to_process:
+    if not records_to_process and not records_to_unset:
         print("INFO: No matching DNS records found to process.")
-        # sys.exit(0) # Allow script to finish normally even if no records
     else:
         if args.debug:
             print(f"DEBUG: Records to process ({action}): {records_to_process}")
+            print(f"DEBUG: Replaced IPs to remove after adding: {records_to_unset}")
             print("DEBUG: Debug mode enabled, showing records and exiting without processing:")
             for record in records_to_process:
                 print(f"  - {record['domain']} -> {record['ip']}")
-            sys.exit(0)
+            for record in records_to_unset:
+                print(f"  - {record['domain']} -x {record['ip']} (replaced)")
+            return 0
         else:
             print(f"INFO: Found {len(records_to_process)} DNS records to process with action '{action}'")
+            if records_to_unset:
+                print(f"INFO: Found {len(records_to_unset)} replaced IP(s) of updated DNS records to remove")
 
-    for record in records_to_process:
-        domain = record["domain"]
-        ip_address = record["ip"]
+    if args.bulk and (records_to_process or records_to_unset):
+        bulk_records = records_to_process
         if action == "add":
-            print(f"Attempting to add DNS record: {domain} -> {ip_address}")
-            add_dns_record(pihole_ip, sid, csrf_token, domain, ip_address, debug=args.debug)
-        elif action == "unregister-dns": # Changed from "delete"
-            print(f"Attempting to unregister DNS record: {domain} (IP: {ip_address})")
-            delete_dns_record(pihole_ip, sid, csrf_token, domain, ip_address, debug=args.debug)
+            # Bulk replaces every entry of a touched name, so pass each name's full desired IP set
+            touched = dict.fromkeys(record["domain"] for record in records_to_process + records_to_unset)
+            bulk_records = [{"domain": d, "ip": ip} for d in touched for ip in sorted(desired_index.get(d))]
+        applied = apply_hosts_bulk(client, bulk_records, action)
+        if applied is not None:
+            if not applied:
+                return 1
+            print(f"INFO: Script finished processing DNS records with action '{action}'.")
+            return 0
+
+    failures = 0
+    if records_to_process:
+        failures = apply_records_concurrently(
+            client, records_to_process, action,
+            workers=args.workers, retries=args.retries, backoff=args.retry_backoff
+        )
+    if records_to_unset:
+        # Only after the new IPs are in place, so the names never go unresolved
+        print(f"INFO: Removing {len(records_to_unset)} replaced IP(s) of updated DNS records.")
+        failures += apply_records_concurrently(
+            client, records_to_unset, "unregister-dns",
+            workers=args.workers, retries=args.retries, backoff=args.retry_backoff
+        )
 
     print(f"INFO: Script finished processing DNS records with action '{action}'.")
+    if failures:
+        print(f"Error: {failures} DNS record(s) could not be processed.", file=sys.stderr)
+        return 1
+    return 0
+
+def load_inventory_records(args, secrets, cached_only=False):
+    """Returns the desired records from the OpenTofu outputs, or None if they cannot be used."""
+    vm_ipv4_addresses_output, vm_fqdns_output = get_terraform_outputs(
+        args.tf_dir, debug=args.debug, cached_only=cached_only
+    )
+    if not vm_ipv4_addresses_output or not vm_fqdns_output:
+        return None
+    return build_terraform_records(vm_ipv4_addresses_output, vm_fqdns_output, args, secrets)
+
+def push_snapshot_changes(client, previous_records, records, args, check_live=False):
+    """Applies only the difference between two inventory snapshots to one Pi-hole; returns the exit code.
+
+    With check_live, the diff is first checked against the records Pi-hole
+    has now, so retrying a partly failed push skips the records that already
+    went through instead of failing on "already present" and 404 forever.
+    """
+    changes = compute_changeset(
+        RecordIndex.from_records(previous_records, owner=RECORD_OWNER),
+        RecordIndex.from_records(records, owner=RECORD_OWNER),
+        RECORD_OWNER,
+    )
+    print(f"INFO: Inventory changed: {changes.summary()}.")
+    if changes and not client.ensure_session():
+        print("Pi-hole session could not be refreshed; keeping the changes for the next attempt.", file=sys.stderr)
+        return 1
+    failures = 0
+    records_to_put = changes.records_to_put()
+    records_to_remove = changes.records_to_remove()
+    if changes and check_live:
+        live = RecordIndex.from_records(client.get_dns_records())
+        records_to_put = [record for record in records_to_put if record["ip"] not in live.get(record["domain"])]
+        records_to_remove = [record for record in records_to_remove if record["ip"] in live.get(record["domain"])]
+    if records_to_put:
+        failures += apply_records_concurrently(
+            client, records_to_put, "add", workers=args.workers, retries=args.retries, backoff=args.retry_backoff
+        )
+    if records_to_remove:
+        # Replaced IPs and VMs gone from the inventory; all were ours in the previous snapshot
+        failures += apply_records_concurrently(
+            client, records_to_remove, "unregister-dns",
+            workers=args.workers, retries=args.retries, backoff=args.retry_backoff
+        )
+    return 1 if failures else 0
+
+def watch_inventory(args, secrets, targets, cache):
+    """Keeps the Pi-hole instances in sync with .cache/tofu-outputs.json until interrupted.
+
+    Each client logs in once and keeps its session and connection for the
+    whole watch. A rewrite of the cache is diffed against the inventory
+    snapshot last applied to each instance and only the changed records are
+    pushed. An instance whose push failed keeps its old snapshot and is
+    retried every --watch-poll seconds, with the diff checked against its
+    live records so the part that went through is not sent again. A full reconcile (as --action add)
+    runs at start and every --full-sync-interval seconds to repair anything
+    changed out of band.
+    """
+    full_sync_args = argparse.Namespace(**{**vars(args), "action": "add"})
+    clients = {}
+    watcher = None
+
+    def sync_instance(ip, latest):
+        previous = snapshots.get(ip)
+        if previous is None: # No baseline to diff against
+            return reconcile_pihole(clients[ip], full_sync_args, latest)
+        return push_snapshot_changes(clients[ip], previous, latest, args, check_live=ip in failed)
+
+    try:
+        for ip, password in targets:
+            clients[ip] = PiholeClient(ip, debug=args.debug, cache=cache)
+            if not clients[ip].login(password):
+                print(f"Failed to authenticate with Pi-hole {ip}. Exiting.", file=sys.stderr)
+                return 1
+
+        watcher = tofu_outputs.OutputsWatcher(poll_interval=args.watch_poll)
+        print(f"INFO: Watching {os.path.realpath(tofu_outputs.CACHE_PATH)} ({watcher.mode}) for {args.tf_dir}.")
+
+        latest = None
+        snapshots = {} # Pi-hole IP -> inventory records last applied there successfully
+        failed = set() # Pi-hole IPs whose last push may have been applied in part
+        next_full_sync = time.monotonic()
+        while True:
+            if time.monotonic() >= next_full_sync:
+                records = load_inventory_records(args, secrets)
+                if records is not None:
+                    print(f"INFO: Full reconcile of {len(records)} records.")
+                    results = run_on_instances(targets, lambda ip, _: reconcile_pihole(clients[ip], full_sync_args, records))
+                    latest = records
+                    snapshots = {ip: records for ip, code, _ in results if code == 0}
+                    failed.difference_update(snapshots)
+                if args.full_sync_interval > 0:
+                    next_full_sync = time.monotonic() + args.full_sync_interval
+                else:
+                    next_full_sync = float("inf")
+
+            pending = [target for target in targets if latest is not None and snapshots.get(target[0]) is not latest]
+            # Wake up at least once a minute so a changed clock or interval cannot stall the loop
+            timeout = min(next_full_sync - time.monotonic(), args.watch_poll if pending else 60)
+            if watcher.wait(timeout):
+                if not tofu_outputs.cache_is_fresh(args.tf_dir):
+                    watcher.accept() # Belongs to another component or is stale
+                else:
+                    records = load_inventory_records(args, secrets, cached_only=True)
+                    if records is None:
+                        # Not accepted, so the watcher reports the change again
+                        print("Warning: Could not read the rewritten outputs cache; trying again.", file=sys.stderr)
+                    else:
+                        watcher.accept()
+                        latest = records
+            if latest is None:
+                continue
+
+            wanted = RecordIndex.from_records(latest).ips
+            pending = []
+            for target in targets:
+                previous = snapshots.get(target[0])
+                if previous is latest:
+                    continue
+                if previous is not None and RecordIndex.from_records(previous).ips == wanted:
+                    snapshots[target[0]] = latest # Rewritten without DNS-relevant changes
+                    continue
+                pending.append(target)
+            if not pending:
+                continue
+            pushed = latest
+            for ip, code, _ in run_on_instances(pending, lambda ip, _: sync_instance(ip, pushed)):
+                if code == 0:
+                    snapshots[ip] = pushed
+                    failed.discard(ip)
+                else:
+                    failed.add(ip)
+                    print(f"Warning: Pi-hole {ip} is not in sync; retrying in {args.watch_poll:g}s.", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\nINFO: Watch stopped.")
+        return 0
+    finally:
+        if watcher:
+            watcher.close()
+        for client in clients.values():
+            client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage Pi-hole DNS records based on Terraform outputs.")
+    parser.add_argument(
+        "--action",
+        choices=['list', 'add', 'unregister-dns', 'interactive-add', 'interactive-unregister', 'check-consistency', 'watch'],
+        required=True,
+        help="Action to perform: 'list' to show records, 'add' or 'unregister-dns' for DNS records, 'interactive-add' or 'interactive-unregister' for interactive mode, 'check-consistency' to report (read-only) records that differ between Pi-hole instances, 'watch' to keep Pi-hole in sync with .cache/tofu-outputs.json until interrupted."
+    )
+    parser.add_argument(
+        "--pihole",
+        action="append",
+        metavar="IP",
+        help="Pi-hole instance to manage; repeat for several. Defaults to pihole.ip_address (one address or a list) and pihole.instances from secrets. Several instances are processed concurrently."
+    )
+    parser.add_argument(
+        "--tf-dir",
+        required=True,
+        help="Path to the Terraform directory containing outputs.tf and potentially .tfvars files."
+    )
+    parser.add_argument(
+        "--secrets-file",
+        help="Path to the SOPS-encrypted secrets YAML file. Defaults to ../terraform/secrets.sops.yaml relative to this script."
+    )
+    parser.add_argument(
+        "--domain-suffix",
+        help="Filter DNS records by this domain suffix (e.g., '<your-domain>.com'). Used to identify cluster records."
+    )
+    parser.add_argument(
+        "--proxy-fqdn-for-short-hosts",
+        action="store_true",
+        help="Also register <short-host>.<domain> records pointing to the nginx proxy IP."
+    )
+    parser.add_argument(
+        "--proxy-ip",
+        help="Proxy IP for --proxy-fqdn-for-short-hosts. Defaults to pihole.proxy_ip, nginx_proxy.ip_address, or config/inventory/static.ini [nginx_proxies]."
+    )
+    parser.add_argument(
+        "--fqdn-domain",
+        help="Domain for --proxy-fqdn-for-short-hosts. Defaults to platform_domains.primary, primary_domain, server_domain, domain, mailserver_domain, or mailserver.domain from secrets."
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Apply all changes with one dns.hosts config write and verify them with one read, instead of one request per record. Falls back to per-record requests on Pi-hole versions without the config API."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of concurrent per-record requests for add/unregister-dns (default: 4)."
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries per record on timeouts, connection errors and HTTP 5xx (default: 3)."
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=0.5,
+        help="Initial retry delay in seconds, doubled on every retry (default: 0.5)."
+    )
+    parser.add_argument(
+        "--session-cache",
+        default=default_session_cache_path(),
+        help="File caching the Pi-hole session and discovered API endpoint per host (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--session-ttl",
+        type=int,
+        default=1200,
+        help="Reuse a cached Pi-hole session only if it was used within this many seconds (default: 1200)."
+    )
+    parser.add_argument(
+        "--no-session-cache",
+        action="store_true",
+        help="Always log in with the password and discover the API endpoint, without reading or writing the cache."
+    )
+    parser.add_argument(
+        "--full-sync-interval",
+        type=float,
+        default=3600,
+        help="For 'watch': seconds between full reconciles; 0 runs only the initial one (default: 3600)."
+    )
+    parser.add_argument(
+        "--watch-poll",
+        type=float,
+        default=5,
+        help="For 'watch': polling interval in seconds where inotify is unavailable (default: 5)."
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Enable debug mode (prints API requests and other debug info). Not available with 'watch'."
+    )
+
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.retries < 0 or args.retry_backoff < 0:
+        parser.error("--workers must be >= 1, --retries and --retry-backoff must be >= 0")
+    if args.full_sync_interval < 0 or args.watch_poll <= 0:
+        parser.error("--full-sync-interval must be >= 0 and --watch-poll > 0")
+    if args.debug and args.action == "watch":
+        # Debug runs only show the changes, so a watch would never get in sync
+        parser.error("--debug cannot be used with --action watch")
+
+    if args.debug:
+        print(f"DEBUG: Script arguments: {args}")
+
+    # Load secrets
+    secrets = load_sops_secrets(args.secrets_file, debug=args.debug) # Pass debug flag
+    if not secrets:
+        sys.exit(1)
+
+    # Correctly access nested Pi-hole credentials
+    pihole_data = secrets.get('pihole')
+    if not pihole_data and 'default' in secrets:
+        pihole_data = secrets.get('default', {}).get('pihole')
+
+    if not pihole_data:
+        print("Error: 'pihole' key not found in secrets file, neither at the root nor under 'default'.", file=sys.stderr)
+        if args.debug:
+            print(f"DEBUG: Loaded secrets structure: {secrets}")
+        sys.exit(1)
+
+    targets = get_pihole_targets(pihole_data, explicit_ips=args.pihole)
+
+    if not targets or not all(password for _, password in targets):
+        print("Error: Pi-hole IP address or web password not found within the 'pihole' configuration block.", file=sys.stderr)
+        if args.debug: # Conditional print
+            print(f"DEBUG: Loaded pihole data: {pihole_data}")
+        sys.exit(1)
+
+    if args.action.startswith("interactive-") and len(targets) > 1:
+        print(f"Error: '{args.action}' works on one Pi-hole; select it with --pihole.", file=sys.stderr)
+        sys.exit(1)
+    if args.action == "check-consistency" and len(targets) < 2:
+        print("Error: 'check-consistency' needs at least two Pi-hole instances.", file=sys.stderr)
+        sys.exit(1)
+
+    cache = None if args.no_session_cache else SessionCache(args.session_cache, args.session_ttl)
+
+    if args.action == "watch":
+        sys.exit(watch_inventory(args, secrets, targets, cache))
+
+    if args.action in ("list", "check-consistency"):
+        results = run_on_instances(targets, lambda ip, password: read_pihole_records(ip, password, args, cache))
+        if any(records is None for _, records, _ in results):
+            print("Failed to authenticate with Pi-hole. Exiting.", file=sys.stderr)
+            sys.exit(1)
+        if args.action == "check-consistency":
+            print_instance_timings(results, lambda records: f"{len(records)} records")
+            zones = ZoneTrie([args.domain_suffix]) if args.domain_suffix else None
+            drift = find_drift({ip: records for ip, records, _ in results}, zones)
+            sys.exit(1 if drift else 0)
+        # Just print the current DNS records and exit
+        for ip, current_records, _ in results:
+            label = f" {ip}" if len(targets) > 1 else ""
+            if current_records:
+                print(f"\nCurrent DNS records in Pi-hole{label}:")
+                for i, record in enumerate(current_records, 1):
+                    record_ip = record.get("ip", "N/A")
+                    domain = record.get("domain", "N/A")
+                    print(f"{i}. {domain} -> {record_ip}")
+            else:
+                print(f"No custom DNS records found in Pi-hole{label}.")
+        sys.exit(0)
+
+    # Get Terraform outputs
+    vm_ipv4_addresses_output, vm_fqdns_output = get_terraform_outputs(args.tf_dir, debug=args.debug)
+
+    if vm_ipv4_addresses_output is None or vm_fqdns_output is None:
+       # Error message is already printed inside the function
+       sys.exit(1)
+
+    if args.debug:
+        print(f"DEBUG: Extracted vm_ipv4_addresses_output: {vm_ipv4_addresses_output} (type: {type(vm_ipv4_addresses_output)})")
+        print(f"DEBUG: Extracted vm_fqdns_output: {vm_fqdns_output} (type: {type(vm_fqdns_output)})")
+
+    if not vm_ipv4_addresses_output or not vm_fqdns_output:
+        print("Error: vm_ipv4_addresses_output or vm_fqdns_output is empty after extracting from Terraform output.")
+        sys.exit(1)
+
+    terraform_records = build_terraform_records(vm_ipv4_addresses_output, vm_fqdns_output, args, secrets)
+    if terraform_records is None:
+        sys.exit(1)
+
+    # Compare Terraform records with Pi-hole records
+    if not terraform_records:
+        print("INFO: No DNS records found in Terraform outputs. Nothing to process.")
+        sys.exit(0)
+
+    results = run_on_instances(
+        targets, lambda ip, password: sync_pihole(ip, password, args, terraform_records, cache)
+    )
+    if len(targets) > 1:
+        print_instance_timings(results, lambda code: "ok" if code == 0 else "FAILED")
+    sys.exit(max(code for _, code, _ in results))
 
 if __name__ == "__main__":
     main()
@@ -27,6 +27,8 @@ STATIC_INVENTORY="${REPO_ROOT}/config/inventory/static.ini"
 ANSIBLE_CONFIG_FILE="${REPO_ROOT}/config/ansible.cfg"
 SSH_KEY="${SSH_KEY:-${REPO_ROOT}/keys/deployment_key}"
 readonly TF_STATE_BUCKET="${TF_STATE_BUCKET:-terraform-state}"
+# 1 = write Pi-hole records with one dns.hosts config PATCH (add_pihole_dns.py --bulk) instead of one request each
+readonly PIHOLE_DNS_BULK="${PIHOLE_DNS_BULK:-0}"
 
 # --- NEW CONSTANTS FOR INVENTORY (Integration) ---
 readonly TOFU_CACHE_DIR="${REPO_ROOT}/.cache"
@@ -239,13 +241,26 @@ tofu_cache_outputs() {
   mkdir -p "$TOFU_CACHE_DIR"
 
   # Output all outputs to JSON cache file. $TOFU_VARS_ARG is needed for state access.
-  if ! tofu output -json $TOFU_VARS_ARG >"${TOFU_CACHE_DIR}/tofu-outputs.json"; then
+  # Written to a temp file and renamed, so readers (add_pihole_dns.py --action watch) never see half a file.
+  if ! tofu output -json $TOFU_VARS_ARG >"${TOFU_CACHE_DIR}/tofu-outputs.json.tmp"; then
+    rm -f "${TOFU_CACHE_DIR}/tofu-outputs.json.tmp"
     log "🚨 Caching error. Check 'tofu apply' state and 'ansible_inventory_data' output."
     return 1
   fi
+  mv -f "${TOFU_CACHE_DIR}/tofu-outputs.json.tmp" "${TOFU_CACHE_DIR}/tofu-outputs.json"
+  # Record which component the cache belongs to (read by tools/tofu_outputs.py)
+  printf '%s\n' "$TERRAFORM_DIR" >"${TOFU_CACHE_DIR}/tofu-outputs.source.tmp"
+  mv -f "${TOFU_CACHE_DIR}/tofu-outputs.source.tmp" "${TOFU_CACHE_DIR}/tofu-outputs.source"
   log "✅ Inventory cache successfully created."
   return 0
 }
+
+# Touches the state-change stamp after apply/refresh/destroy. tools/tofu_outputs.py
+# only trusts tofu-outputs.json when it is newer than this stamp.
+tofu_mark_state_changed() {
+  mkdir -p "$TOFU_CACHE_DIR"
+  touch "${TOFU_CACHE_DIR}/tofu-state-changed"
+}
 # ------------------------------------
 
 # --- REMOVED OLD FUNCTIONS: get_inventory_from_tf_state AND get_inventory_json ---
@@ -295,10 +310,12 @@ deploy)
     -backend-config="endpoint=${MINIO_ENDPOINT}" ${TOFU_VARS_ARG}
 
   tofu apply -auto-approve "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
 
   # --- INTEGRATION: Refresh and Cache ---
   log "Executing 'tofu refresh' to update IP addresses (DHCP)..."
   tofu refresh "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
 
   if ! tofu_cache_outputs "$TERRAFORM_DIR"; then
     log "🚨 Cannot continue: Failed to create inventory cache."
@@ -340,10 +357,12 @@ apply)
   fi
 
   tofu apply -auto-approve "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
 
   # --- INTEGRATION: Refresh and Cache ---
   log "Executing 'tofu refresh' to update IP addresses (DHCP)..."
   tofu refresh "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
 
   if ! tofu_cache_outputs "$TERRAFORM_DIR"; then
     log "🚨 Cannot continue: Failed to create inventory cache."
@@ -363,6 +382,10 @@ apply)
   # Call Python script, passing Tofu dir and Ansible secrets file
   # (as it contains pihole.web_password)
   DNS_ARGS=()
+  if [ "$PIHOLE_DNS_BULK" == "1" ]; then
+    # One Pi-hole config reload for all records (per-record fallback on older Pi-hole)
+    DNS_ARGS+=(--bulk)
+  fi
   if [ "$COMPONENT" == "vault" ]; then
     DNS_ARGS+=(--proxy-fqdn-for-short-hosts)
   fi
@@ -629,6 +652,9 @@ plan | destroy)
     # Call Python script with 'unregister-dns' action
     # It reads Tofu state (via tofu output) to find hosts to delete
     DNS_ARGS=()
+    if [ "$PIHOLE_DNS_BULK" == "1" ]; then
+      DNS_ARGS+=(--bulk)
+    fi
     if [ "$COMPONENT" == "vault" ]; then
       DNS_ARGS+=(--proxy-fqdn-for-short-hosts)
     fi
@@ -643,6 +669,7 @@ plan | destroy)
     # 2. NOW DESTROY VM
     log "Destroying infrastructure (tofu destroy)..."
     tofu destroy -auto-approve "$TOFU_VARS_ARG"
+    tofu_mark_state_changed
   fi
   ;;
 
@@ -674,6 +701,15 @@ start)
   fi
 
   tofu apply -var="vm_started=true" -auto-approve "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
+
+  # --- INTEGRATION: Refresh and Cache ---
+  log "Executing 'tofu refresh' to update IP addresses (DHCP)..."
+  tofu refresh "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
+  if ! tofu_cache_outputs "$TERRAFORM_DIR"; then
+    log "⚠️  Warning: Failed to update inventory cache; tools will fall back to 'tofu output'."
+  fi
   ;;
 
 stop)
@@ -704,6 +740,12 @@ stop)
   fi
 
   tofu apply -var="vm_started=false" -auto-approve "$TOFU_VARS_ARG"
+  tofu_mark_state_changed
+
+  # --- INTEGRATION: Cache ---
+  if ! tofu_cache_outputs "$TERRAFORM_DIR"; then
+    log "⚠️  Warning: Failed to update inventory cache; tools will fall back to 'tofu output'."
+  fi
   ;;
 
 get-inventory)
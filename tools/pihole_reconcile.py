@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# tools/pihole_reconcile.py
+"""Record index and changeset computation for add_pihole_dns.py.
+
+A Pi-hole hosts entry is one (ip, domain) pair, and a domain may have several
+of them (multi-A). RecordIndex keeps domain -> set of IPs together with an
+ownership tag per domain. ZoneTrie answers "is this domain inside one of our
+zones" by walking reversed labels, so the cost depends on the depth of the
+name, not on the number of zones, and "x.mylan" does not match zone "lan".
+
+compute_changeset() compares the desired records (from OpenTofu) with what
+Pi-hole has and returns the minimal set of pair additions and removals:
+
+    add     domains missing from Pi-hole
+    update  domains whose IP set differs (only the differing IPs change)
+    delete  domains we own in Pi-hole that are no longer desired
+
+Only records tagged with our owner are ever updated or deleted; everything
+else on the shared Pi-hole is left alone. See pihole_reconcile_bench.py for
+timings on synthetic configs.
+"""
+
+from dataclasses import dataclass, field
+
+UNMANAGED = None
+
+class ZoneTrie:
+    """Suffix trie over reversed DNS labels ("a.b.lan" is stored as lan -> b -> a)."""
+
+    _END = object()
+
+    def __init__(self, zones=()):
+        self.root = {}
+        for zone in zones:
+            self.add(zone)
+
+    @staticmethod
+    def labels(domain):
+        return domain.lower().strip(".").split(".")[::-1]
+
+    def add(self, zone):
+        node = self.root
+        for label in self.labels(zone):
+            node = node.setdefault(label, {})
+        node[self._END] = True
+
+    def covers(self, domain, include_apex=False):
+        """True if domain is strictly below a zone (or the zone itself with include_apex)."""
+        node = self.root
+        labels = self.labels(domain)
+        for depth, label in enumerate(labels, 1):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self._END in node and (depth < len(labels) or include_apex):
+                return True
+        return False
+
+class RecordIndex:
+    """domain -> set of IPs, plus the owner tag of each domain."""
+
+    def __init__(self):
+        self.ips = {}
+        self.owners = {}
+
+    @classmethod
+    def from_records(cls, records, owner=UNMANAGED, zones=None):
+        """Indexes [{"domain": ..., "ip": ...}] records.
+
+        Domains inside zones (a ZoneTrie) are tagged with owner; the rest get
+        UNMANAGED. Without zones every record is tagged with owner.
+        """
+        index = cls()
+        for record in records:
+            domain, ip = record.get("domain"), record.get("ip")
+            if not domain or not ip:
+                continue
+            tag = owner if zones is None or zones.covers(domain) else UNMANAGED
+            index.add(domain, ip, tag)
+        return index
+
+    def add(self, domain, ip, owner=UNMANAGED):
+        domain = domain.lower()
+        self.ips.setdefault(domain, set()).add(ip)
+        if owner is not UNMANAGED or domain not in self.owners:
+            self.owners[domain] = owner
+
+    def claim(self, domains, owner):
+        """Tags the given domains (where present) with owner, whatever zone they are in."""
+        for domain in domains:
+            domain = domain.lower()
+            if domain in self.ips:
+                self.owners[domain] = owner
+
+    def get(self, domain):
+        return self.ips.get(domain.lower(), set())
+
+    def owner(self, domain):
+        return self.owners.get(domain.lower(), UNMANAGED)
+
+    def domains(self):
+        return self.ips.keys()
+
+    def __contains__(self, domain):
+        return domain.lower() in self.ips
+
+    def __len__(self):
+        return sum(len(ips) for ips in self.ips.values())
+
+    def records(self):
+        return [{"domain": domain, "ip": ip} for domain, ips in self.ips.items() for ip in sorted(ips)]
+
+@dataclass
+class Changeset:
+    """Minimal difference between Pi-hole and the desired records.
+
+    add and delete map a domain to the set of IPs to create or remove; update
+    maps a domain to (ips_to_remove, ips_to_add).
+    """
+
+    add: dict = field(default_factory=dict)
+    update: dict = field(default_factory=dict)
+    delete: dict = field(default_factory=dict)
+
+    def __bool__(self):
+        return bool(self.add or self.update or self.delete)
+
+    def records_to_put(self):
+        """(ip, domain) pairs to create, as add_pihole_dns.py records."""
+        records = [{"domain": d, "ip": ip} for d, ips in self.add.items() for ip in sorted(ips)]
+        records += [{"domain": d, "ip": ip} for d, (_, new) in self.update.items() for ip in sorted(new)]
+        return records
+
+    def records_to_remove(self, include_stale=True):
+        """(ip, domain) pairs to remove: replaced IPs of updated domains, and stale domains if include_stale."""
+        records = [{"domain": d, "ip": ip} for d, (old, _) in self.update.items() for ip in sorted(old)]
+        if include_stale:
+            records += [{"domain": d, "ip": ip} for d, ips in self.delete.items() for ip in sorted(ips)]
+        return records
+
+    def summary(self):
+        return f"{len(self.add)} to add, {len(self.update)} to update, {len(self.delete)} stale"
+
+def compute_changeset(current, desired, owner):
+    """Diffs two RecordIndex objects.
+
+    Domains tagged with another owner (or UNMANAGED) in current are never
+    updated or deleted; a desired domain that exists there unmanaged only
+    gets its missing IPs added.
+    """
+    changes = Changeset()
+    for domain, wanted in desired.ips.items():
+        have = current.ips.get(domain)
+        if not have:
+            changes.add[domain] = set(wanted)
+        elif have != wanted:
+            missing = wanted - have
+            if current.owners.get(domain) == owner:
+                changes.update[domain] = (have - wanted, missing)
+            elif missing:
+                changes.update[domain] = (set(), missing)
+    for domain, have in current.ips.items():
+        if domain not in desired.ips and current.owners.get(domain) == owner:
+            changes.delete[domain] = set(have)
+    return changes
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# tools/pihole_reconcile_bench.py
+"""Benchmark for pihole_reconcile.py on synthetic Pi-hole configs.
+
+Builds a shared Pi-hole of --records hosts entries (a share of them in our
+zones, some multi-A, the rest belonging to other lab users) and a desired
+OpenTofu inventory that moves, drops and adds some of ours. Then it times
+each reconcile step, next to the dict + any(endswith) scan add_pihole_dns.py
+used before:
+
+    tools/pihole_reconcile_bench.py
+    tools/pihole_reconcile_bench.py --records 20000 --zones 200
+"""
+
+import argparse
+import random
+import time
+
+from pihole_reconcile import RecordIndex, ZoneTrie, compute_changeset
+
+OWNER = "bench"
+
+def synthetic_config(records, zones, managed_share, seed):
+    """Returns (pihole_records, desired_records, zone_suffixes)."""
+    rng = random.Random(seed)
+    our_zones = [f"z{i}.lab.lan" for i in range(zones)]
+    other_zones = [f"team{i}.example.org" for i in range(zones)]
+
+    def ip():
+        return f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+
+    pihole, ours = [], []
+    while len(pihole) < records:
+        managed = rng.random() < managed_share
+        domain = f"host{len(pihole)}.{rng.choice(our_zones if managed else other_zones)}"
+        ips = [ip() for _ in range(2 if rng.random() < 0.05 else 1)] # ~5% multi-A
+        pihole += [{"domain": domain, "ip": address} for address in ips]
+        if managed:
+            ours.append((domain, ips))
+
+    desired = []
+    for domain, ips in ours:
+        roll = rng.random()
+        if roll < 0.05:
+            continue # VM destroyed: stale record
+        if roll < 0.15:
+            ips = [ip()] # VM moved
+        desired += [{"domain": domain, "ip": address} for address in ips]
+    for i in range(len(ours) // 20): # new VMs
+        desired.append({"domain": f"new{i}.{rng.choice(our_zones)}", "ip": ip()})
+    return pihole, desired, [f".{zone}" for zone in our_zones]
+
+def legacy_reconcile(pihole, desired, suffixes):
+    """The former add_pihole_dns.py logic: one IP per domain, linear suffix scan."""
+    pihole_domains = {rec["domain"]: rec["ip"] for rec in pihole}
+    records_to_add = [rec for rec in desired if pihole_domains.get(rec["domain"]) != rec["ip"]]
+    desired_domains = {rec["domain"] for rec in desired}
+    records_to_delete = [
+        rec for rec in pihole
+        if rec["domain"] not in desired_domains and any(rec["domain"].endswith(s) for s in suffixes)
+    ]
+    return records_to_add, records_to_delete
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark pihole_reconcile.py on a synthetic Pi-hole config.")
+    parser.add_argument("--records", type=int, default=100000, help="Pi-hole hosts entries (default: %(default)s)")
+    parser.add_argument("--zones", type=int, default=50, help="number of managed zones (default: %(default)s)")
+    parser.add_argument("--managed-share", type=float, default=0.5, help="share in our zones (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: %(default)s)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    pihole, desired, suffixes = synthetic_config(args.records, args.zones, args.managed_share, args.seed)
+    print(f"# records={len(pihole)} desired={len(desired)} zones={len(suffixes)}")
+    print(f"{'step':<28} {'seconds':>10}")
+
+    zones, seconds = timed(ZoneTrie, suffixes)
+    print(f"{'zone_trie':<28} {seconds:>10.4f}")
+    current, seconds = timed(RecordIndex.from_records, pihole, OWNER, zones)
+    print(f"{'index_current':<28} {seconds:>10.4f}")
+    wanted, seconds = timed(RecordIndex.from_records, desired, OWNER)
+    print(f"{'index_desired':<28} {seconds:>10.4f}")
+    _, seconds = timed(current.claim, wanted.domains(), OWNER)
+    print(f"{'claim_desired':<28} {seconds:>10.4f}")
+    changes, seconds = timed(compute_changeset, current, wanted, OWNER)
+    print(f"{'changeset':<28} {seconds:>10.4f}")
+    (legacy_add, legacy_delete), seconds = timed(legacy_reconcile, pihole, desired, suffixes)
+    print(f"{'legacy_dict_endswith':<28} {seconds:>10.4f}")
+
+    print(f"# changeset: {changes.summary()}; {len(changes.records_to_put())} pairs to put, "
+          f"{len(changes.records_to_remove())} to remove")
+    print(f"# legacy: {len(legacy_add)} to add, {len(legacy_delete)} to delete")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,348 @@
+"""asyncio engine for tools/s3_benchmark.py.
+
+The threaded engine needs one OS thread per concurrent request, which stops
+scaling at a few hundred workers. This engine runs every virtual client as a
+coroutine on one event loop and speaks HTTP/1.1 directly over
+`asyncio.open_connection`, so tens of thousands of clients cost a few KiB each.
+A semaphore caps the requests actually in flight (and with it the number of
+open connections); latency is measured from the moment a request holds a slot,
+so queueing for a slot is not counted as service time.
+
+Signing is delegated to the caller's `S3Client.sign`/`encode_path`, so both
+engines send byte-identical SigV4 requests. Results are plain tuples in the
+field order of `s3_benchmark.Sample`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import socket
+import ssl
+import time
+from collections.abc import Callable
+
+# (dns, connect, tls, send, ttfb, transfer) seconds, as s3_benchmark.RequestTiming.
+TimingTuple = tuple[float | None, float | None, float | None, float, float, float]
+SampleTuple = tuple[str, int, int, int, float, str, int, TimingTuple]
+
+# Errors that mean a kept-alive connection was closed by the server while idle.
+STALE_CONNECTION_ERRORS = (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError)
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class HttpError(RuntimeError):
+    def __init__(self, method: str, path: str, status: int, body: bytes) -> None:
+        detail = body[:300].decode("utf-8", errors="replace")
+        super().__init__(f"{method} {path} failed: HTTP {status} {detail}")
+        self.status = status
+
+
+class AsyncConnectionPool:
+    """Idle keep-alive stream pairs; "cold" mode opens one connection per request."""
+
+    def __init__(
+        self, scheme: str, netloc: str, context: ssl.SSLContext | None, keep_alive: bool, timeout: float
+    ) -> None:
+        host, _, port = netloc.rpartition(":")
+        if not host or not port.isdigit():
+            host, port = netloc, "443" if scheme == "https" else "80"
+        self.host = host.strip("[]")
+        self.port = int(port)
+        self.ssl = (context or ssl.create_default_context()) if scheme == "https" else None
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.opened = 0
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def connect(
+        self, phases: dict[str, float] | None = None
+    ) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open a connection, timing DNS lookup, TCP connect and TLS handshake separately into `phases`."""
+        self.opened += 1
+        phases = {} if phases is None else phases
+        loop = asyncio.get_running_loop()
+
+        started = time.perf_counter()
+        addresses = await asyncio.wait_for(
+            loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM), self.timeout
+        )
+        resolved = time.perf_counter()
+        phases["dns"] = resolved - started
+        family, _, _, _, address = addresses[0]
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(address[0], address[1], family=family), self.timeout
+        )
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connected = time.perf_counter()
+        phases["connect"] = connected - resolved
+
+        if self.ssl is not None:
+            try:
+                await asyncio.wait_for(writer.start_tls(self.ssl, server_hostname=self.host), self.timeout)
+            except BaseException:
+                writer.close()
+                raise
+            phases["tls"] = time.perf_counter() - connected
+        return reader, writer
+
+    async def acquire(
+        self, phases: dict[str, float] | None = None
+    ) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        if self.keep_alive and self._idle:
+            return *self._idle.pop(), True
+        return *await self.connect(phases), False
+
+    def release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, reusable: bool) -> None:
+        if self.keep_alive and reusable:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def prewarm(self, count: int) -> None:
+        if not self.keep_alive:
+            return
+        missing = count - len(self._idle)
+        for reader, writer in await asyncio.gather(*(self.connect() for _ in range(missing))):
+            self._idle.append((reader, writer))
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+
+class AsyncS3:
+    """Minimal non-blocking S3 client for PUT/HEAD/GET/DELETE of whole objects."""
+
+    def __init__(self, client, inflight: int) -> None:
+        self.client = client
+        self.pool = AsyncConnectionPool(
+            client.scheme, client.netloc, client.context, client.pool.keep_alive, client.timeout
+        )
+        self.slots = asyncio.Semaphore(inflight)
+        self.read_chunk_size = client.read_chunk_size
+
+    async def request(
+        self, method: str, path: str, body: bytes = b"", payload_hash: str | None = None
+    ) -> tuple[int, TimingTuple]:
+        """Send one signed request; return (body bytes read, phase timing)."""
+        encoded_path = self.client.encode_path(path)
+        started = time.thread_time()
+        if payload_hash is None:
+            payload_hash = hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256
+        headers = self.client.sign(method, encoded_path, "", payload_hash)
+        self.client.signing.add(time.thread_time() - started)
+        if method in {"PUT", "POST"}:
+            headers["Content-Length"] = str(len(body))
+        if not self.pool.keep_alive:
+            headers["Connection"] = "close"
+        head = f"{method} {encoded_path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        data = head.encode("latin-1") + b"\r\n"
+
+        status, nbytes, kept, timing = await asyncio.wait_for(self._send(method, data, body), self.client.timeout)
+        if status >= 300:
+            raise HttpError(method, path, status, kept)
+        return nbytes, timing
+
+    async def _send(self, method: str, head: bytes, body: bytes) -> tuple[int, int, bytes, TimingTuple]:
+        phases: dict[str, float] = {}
+        reader, writer, reused = await self.pool.acquire(phases)
+        try:
+            try:
+                started = time.perf_counter()
+                await self._write(writer, head, body)
+                sent = time.perf_counter()
+                status, headers = await self._read_head(reader)
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection; retry once on a fresh one.
+                writer.close()
+                reader, writer = await self.pool.connect(phases)
+                started = time.perf_counter()
+                await self._write(writer, head, body)
+                sent = time.perf_counter()
+                status, headers = await self._read_head(reader)
+            first_byte = time.perf_counter()
+            nbytes, kept, reusable = await self._read_body(reader, method, status, headers)
+        except BaseException:
+            writer.close()
+            raise
+        self.pool.release(reader, writer, reusable)
+        timing = (
+            phases.get("dns"),
+            phases.get("connect"),
+            phases.get("tls"),
+            sent - started,
+            first_byte - sent,
+            time.perf_counter() - first_byte,
+        )
+        return status, nbytes, kept, timing
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, head: bytes, body: bytes) -> None:
+        writer.write(head)
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> tuple[int, dict[str, str]]:
+        while True:
+            raw = await reader.readuntil(b"\r\n\r\n")
+            lines = raw.decode("latin-1").split("\r\n")
+            version, status, *_ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if line:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+            headers[":version"] = version
+            # Skip interim responses such as "100 Continue".
+            if not 100 <= int(status) < 200:
+                return int(status), headers
+
+    async def _read_body(
+        self, reader: asyncio.StreamReader, method: str, status: int, headers: dict[str, str]
+    ) -> tuple[int, bytes, bool]:
+        """Consume the response body; return (bytes read, body kept on error, connection reusable)."""
+        reusable = headers[":version"] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        keep = status >= 300
+        kept = bytearray()
+        nbytes = 0
+
+        def consume(chunk: bytes) -> None:
+            nonlocal nbytes
+            nbytes += len(chunk)
+            if keep and len(kept) < 4096:
+                kept.extend(chunk)
+
+        if method == "HEAD" or status in {204, 304}:
+            return 0, b"", reusable
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+                if size == 0:
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                while size:
+                    chunk = await reader.read(min(size, self.read_chunk_size))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", size)
+                    consume(chunk)
+                    size -= len(chunk)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                chunk = await reader.read(min(remaining, self.read_chunk_size))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                consume(chunk)
+                remaining -= len(chunk)
+        else:
+            while chunk := await reader.read(self.read_chunk_size):
+                consume(chunk)
+            reusable = False
+        return nbytes, bytes(kept), reusable
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+
+async def _phase(
+    s3: AsyncS3,
+    op: str,
+    bucket: str,
+    size: int,
+    payload: bytes,
+    payload_hash: str,
+    keys: dict[tuple[int, int], str],
+    workers: int,
+    iterations: int,
+) -> tuple[float, list[SampleTuple]]:
+    samples: list[SampleTuple] = []
+
+    async def one(worker: int, iteration: int) -> None:
+        key = keys[worker, iteration]
+        path = f"/{bucket}/{key}"
+        async with s3.slots:
+            start = time.perf_counter()
+            if op == "put":
+                _, timing = await s3.request("PUT", path, payload, payload_hash)
+            elif op == "stat":
+                _, timing = await s3.request("HEAD", path)
+            else:
+                nbytes, timing = await s3.request("GET", path)
+                if nbytes != size:
+                    raise RuntimeError(f"GET {key} returned {nbytes} bytes, expected {size}")
+            seconds = time.perf_counter() - start
+        samples.append((op, size, worker, iteration, seconds, key, size if op != "stat" else 0, timing))
+
+    async def virtual_client(worker: int) -> None:
+        for iteration in range(1, iterations + 1):
+            await one(worker, iteration)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_client(worker) for worker in range(workers)))
+    return time.perf_counter() - start, samples
+
+
+async def _run(
+    client,
+    bucket: str,
+    size: int,
+    keys: dict[tuple[int, int], str],
+    workers: int,
+    iterations: int,
+    inflight: int,
+    report: Callable[[str, float, list[SampleTuple]], None],
+    barrier: Callable[[], None] | None,
+) -> int:
+    s3 = AsyncS3(client, inflight)
+    payload = os.urandom(size)
+    # Every PUT sends the same bytes, so the payload is hashed once per size.
+    started = time.thread_time()
+    payload_hash = "UNSIGNED-PAYLOAD" if client.payload_signing == "unsigned" else hashlib.sha256(payload).hexdigest()
+    client.signing.add(time.thread_time() - started, requests=0)
+    try:
+        await s3.pool.prewarm(min(workers, inflight))
+        for op in ("put", "stat", "get"):
+            if barrier is not None:
+                await asyncio.to_thread(barrier)
+            wall, samples = await _phase(s3, op, bucket, size, payload, payload_hash, keys, workers, iterations)
+            report(op, wall, samples)
+    finally:
+        await s3.close()
+    return s3.pool.opened
+
+
+def run_put_stat_get(
+    client,
+    bucket: str,
+    size: int,
+    keys: dict[tuple[int, int], str],
+    workers: int,
+    iterations: int,
+    inflight: int,
+    report: Callable[[str, float, list[SampleTuple]], None],
+    barrier: Callable[[], None] | None = None,
+) -> int:
+    """Run the PUT, HEAD and GET phases of one object size on a fresh event loop.
+
+    `report(op, wall_seconds, samples)` is called after each phase and
+    `barrier()`, if given, before it; the return value is the number of
+    connections opened.
+    """
+    return asyncio.run(_run(client, bucket, size, keys, workers, iterations, inflight, report, barrier))
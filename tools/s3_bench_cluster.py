@@ -0,0 +1,222 @@
+"""Coordinator/agent control protocol for distributed tools/s3_benchmark.py runs.
+
+One Python process cannot saturate a fast storage network because payload
+hashing and SigV4 signing hold the GIL, so a coordinator fans the benchmark
+out to agents: local processes it spawns itself, plus agents started by hand
+on other hosts with `tools/s3_benchmark.py agent COORDINATOR:PORT`.
+
+The protocol is newline-delimited JSON over one TCP connection per agent:
+
+    agent -> coordinator  {"type": "hello", "host": ..., "pid": ...}
+    coordinator -> agent  {"type": "config", "index": i, "agents": n, "env": {...}}
+    agent -> coordinator  {"type": "ready"}                  before every phase
+    coordinator -> agent  {"type": "go"} or {"type": "abort"}
+    agent -> coordinator  {"type": "result", ...} or {"type": "error", "message": ...}
+
+"go" is only sent once every agent is ready, so all agents start each phase
+within one network round trip of each other without relying on synchronised
+clocks. Credentials never cross the control connection: agents sign with the
+S3_BENCH_ENDPOINT/ACCESS_KEY/SECRET_KEY of their own environment.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+
+# Settings every agent takes from its own environment instead of the coordinator.
+LOCAL_SETTINGS = {
+    "S3_BENCH_ENDPOINT",
+    "S3_BENCH_ACCESS_KEY",
+    "S3_BENCH_SECRET_KEY",
+    "S3_BENCH_REGION",
+    "S3_BENCH_INSECURE",
+}
+# Settings that only make sense on the coordinator.
+COORDINATOR_SETTINGS = {
+    "S3_BENCH_PROCESSES",
+    "S3_BENCH_AGENTS",
+    "S3_BENCH_LISTEN",
+    "S3_BENCH_HISTOGRAM_FILE",
+    "S3_BENCH_RESULTS",
+    "S3_BENCH_LABEL",
+}
+
+
+class Channel:
+    def __init__(self, sock: socket.socket, peer: str) -> None:
+        self.sock = sock
+        self.peer = peer
+        self._file = sock.makefile("rwb")
+
+    def send(self, message: dict) -> None:
+        self._file.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._file.flush()
+
+    def recv(self) -> dict | None:
+        """Return the next message, or None once the peer has gone away."""
+        try:
+            line = self._file.readline()
+        except OSError:
+            return None
+        return json.loads(line) if line else None
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            self.sock.close()
+
+
+def parse_address(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        raise SystemExit(f"ERROR: expected HOST:PORT, got {value}")
+    return host.strip("[]"), int(port)
+
+
+def agent_environment(environ: dict[str, str]) -> dict[str, str]:
+    """The benchmark settings the coordinator ships to its agents."""
+    skip = LOCAL_SETTINGS | COORDINATOR_SETTINGS
+    return {name: value for name, value in environ.items() if name.startswith("S3_BENCH_") and name not in skip}
+
+
+class Coordinator:
+    def __init__(self, listen: str, processes: int, remote_agents: int, script: str) -> None:
+        self.processes = processes
+        self.expected = processes + remote_agents
+        self.script = script
+        self.children: list[subprocess.Popen] = []
+        self.channels: list[Channel] = []
+        self.hosts: list[str] = []
+        host, port = parse_address(listen)
+        self.listener = socket.create_server((host, port), backlog=max(self.expected, 16))
+        self.address = self.listener.getsockname()[:2]
+
+    def start(self) -> None:
+        """Spawn the local agents and wait until every agent has connected."""
+        host, port = self.address
+        if host in {"0.0.0.0", "::"}:
+            host = "127.0.0.1"
+        for _ in range(self.processes):
+            self.children.append(
+                subprocess.Popen(
+                    [sys.executable, self.script, "agent", f"{host}:{port}"],
+                    stdout=subprocess.DEVNULL,
+                )
+            )
+        remote = self.expected - self.processes
+        if remote:
+            print(
+                f"# waiting for {remote} remote agent(s) on {self.address[0]}:{self.address[1]}",
+                file=sys.stderr,
+            )
+
+        self.listener.settimeout(1.0)
+        while len(self.channels) < self.expected:
+            for child in self.children:
+                if child.poll() not in {None, 0}:
+                    raise SystemExit(f"ERROR: local agent exited with status {child.returncode} before connecting")
+            try:
+                sock, peer = self.listener.accept()
+            except TimeoutError:
+                continue
+            sock.settimeout(10.0)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            channel = Channel(sock, f"{peer[0]}:{peer[1]}")
+            try:
+                hello = channel.recv()
+            except ValueError:
+                hello = None
+            if hello is None or hello.get("type") != "hello":
+                channel.close()
+                continue
+            sock.settimeout(None)
+            self.channels.append(channel)
+            self.hosts.append(f"{hello.get('host')}/{hello.get('pid')}")
+        self.listener.close()
+
+    def configure(self, env_for: Callable[[int], dict[str, str]]) -> None:
+        for index, channel in enumerate(self.channels):
+            channel.send({"type": "config", "index": index, "agents": self.expected, "env": env_for(index)})
+
+    def run(self) -> list[dict]:
+        """Release phase barriers until every agent reported; return the results in agent order."""
+        while True:
+            messages = [channel.recv() for channel in self.channels]
+            kinds = {message["type"] if message else "error" for message in messages}
+            if kinds == {"ready"}:
+                for channel in self.channels:
+                    channel.send({"type": "go"})
+                continue
+            if kinds == {"result"}:
+                return messages
+            self.abort()
+            for host, message in zip(self.hosts, messages):
+                if message is None:
+                    raise SystemExit(f"ERROR: agent {host} disconnected")
+                if message["type"] == "error":
+                    raise SystemExit(f"ERROR: agent {host} failed: {message.get('message')}")
+            raise SystemExit(f"ERROR: agents are out of step ({', '.join(sorted(kinds))}); check their settings")
+
+    def abort(self) -> None:
+        for channel in self.channels:
+            try:
+                channel.send({"type": "abort"})
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        for channel in self.channels:
+            channel.close()
+        deadline = time.monotonic() + 60
+        for child in self.children:
+            try:
+                child.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                child.kill()
+
+
+class Agent:
+    def __init__(self, address: str) -> None:
+        host, port = parse_address(address)
+        sock = socket.create_connection((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.channel = Channel(sock, address)
+        self.channel.send({"type": "hello", "host": socket.gethostname(), "pid": os.getpid()})
+        config = self.channel.recv()
+        if config is None or config.get("type") != "config":
+            raise SystemExit(f"ERROR: coordinator {address} closed the connection before sending a config")
+        self.index = int(config["index"])
+        self.agents = int(config["agents"])
+        self.env = dict(config["env"])
+
+    def apply_environment(self) -> None:
+        """Replace this process's benchmark settings with the coordinator's, keeping local credentials."""
+        for name in list(os.environ):
+            if name.startswith("S3_BENCH_") and name not in LOCAL_SETTINGS:
+                del os.environ[name]
+        os.environ.update(self.env)
+
+    def barrier(self) -> None:
+        self.channel.send({"type": "ready"})
+        message = self.channel.recv()
+        if message is None or message.get("type") != "go":
+            raise RuntimeError("run aborted by the coordinator")
+
+    def send_result(self, result: dict) -> None:
+        self.channel.send({"type": "result", **result})
+
+    def send_error(self, message: str) -> None:
+        try:
+            self.channel.send({"type": "error", "message": message})
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self.channel.close()
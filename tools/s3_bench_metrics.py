@@ -0,0 +1,161 @@
+"""Prometheus/OpenMetrics export for the canary mode of tools/s3_benchmark.py.
+
+The canary probes the object store on an interval and accumulates one
+latency histogram per (endpoint, op, size). The histograms use fixed `le`
+buckets and only grow, so Grafana can use `rate()` and
+`histogram_quantile()` on them across many probe cycles. A restart resets
+them, which Prometheus treats as a counter reset.
+
+Metrics are exposed either as a node_exporter textfile-collector file or
+on a `/metrics` HTTP endpoint. The file uses the Prometheus text format,
+because that is the only format the textfile collector parses. The endpoint
+serves OpenMetrics to scrapers that ask for it and text format to the rest.
+"""
+
+from __future__ import annotations
+
+import http.server
+import os
+import threading
+import time
+
+# Upper bounds in seconds: from sub-millisecond HEADs to slow multi-MiB uploads.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{escape_label(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class CanaryMetrics:
+    """Thread-safe store of the canary's histograms, error counters and cycle gauges."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.histograms: dict[Labels, tuple[list[int], float]] = {}
+        self.errors: dict[Labels, int] = {}
+        self.cycles = 0
+        self.last_success = 0.0
+        self.last_duration = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint: str, op: str, size: int, seconds: float) -> None:
+        labels = (("endpoint", endpoint), ("op", op), ("size", str(size)))
+        with self.lock:
+            counts, total = self.histograms.get(labels, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+                    break
+            self.histograms[labels] = (counts, total + seconds)
+
+    def error(self, endpoint: str, op: str) -> None:
+        labels = (("endpoint", endpoint), ("op", op))
+        with self.lock:
+            self.errors[labels] = self.errors.get(labels, 0) + 1
+
+    def cycle_finished(self, duration: float, ok: bool) -> None:
+        with self.lock:
+            self.cycles += 1
+            self.last_duration = duration
+            if ok:
+                self.last_success = time.time()
+
+    def render(self, openmetrics: bool = False) -> str:
+        # OpenMetrics names a counter family without its `_total` suffix; the text format names it with it.
+        errors_family = "s3_bench_canary_errors" if openmetrics else "s3_bench_canary_errors_total"
+        cycles_family = "s3_bench_canary_cycles" if openmetrics else "s3_bench_canary_cycles_total"
+        lines = [
+            "# HELP s3_bench_canary_request_duration_seconds S3 canary request latency.",
+            "# TYPE s3_bench_canary_request_duration_seconds histogram",
+        ]
+        if openmetrics:
+            lines.append("# UNIT s3_bench_canary_request_duration_seconds seconds")
+        with self.lock:
+            for labels, (counts, total) in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = format_labels(labels, f'le="{format_bound(bound)}"')
+                    lines.append(f"s3_bench_canary_request_duration_seconds_bucket{le} {cumulative}")
+                lines.append(f"s3_bench_canary_request_duration_seconds_count{format_labels(labels)} {cumulative}")
+                lines.append(f"s3_bench_canary_request_duration_seconds_sum{format_labels(labels)} {total!r}")
+            lines += [
+                f"# HELP {errors_family} S3 canary requests that failed.",
+                f"# TYPE {errors_family} counter",
+            ]
+            lines += [
+                f"s3_bench_canary_errors_total{format_labels(labels)} {count}"
+                for labels, count in sorted(self.errors.items())
+            ]
+            lines += [
+                f"# HELP {cycles_family} Completed S3 canary probe cycles.",
+                f"# TYPE {cycles_family} counter",
+                f"s3_bench_canary_cycles_total {self.cycles}",
+                "# HELP s3_bench_canary_last_success_timestamp_seconds End of the last cycle without errors.",
+                "# TYPE s3_bench_canary_last_success_timestamp_seconds gauge",
+                f"s3_bench_canary_last_success_timestamp_seconds {self.last_success!r}",
+                "# HELP s3_bench_canary_cycle_duration_seconds Duration of the last probe cycle.",
+                "# TYPE s3_bench_canary_cycle_duration_seconds gauge",
+                f"s3_bench_canary_cycle_duration_seconds {self.last_duration!r}",
+            ]
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str, text: str) -> None:
+    """Replace `path` atomically so the textfile collector never reads a partial file."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.replace(temporary, path)
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    server: MetricsHTTPServer
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.server.metrics.render(openmetrics).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], metrics: CanaryMetrics) -> None:
+        super().__init__(address, MetricsHandler)
+        self.metrics = metrics
+
+
+def serve_metrics(address: tuple[str, int], metrics: CanaryMetrics) -> MetricsHTTPServer:
+    """Serve `/metrics` from a daemon thread; the caller shuts it down."""
+    server = MetricsHTTPServer(address, metrics)
+    threading.Thread(target=server.serve_forever, name="s3-bench-metrics", daemon=True).start()
+    return server
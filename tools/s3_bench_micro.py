@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for the client-side overhead of tools/s3_benchmark.py.
+
+Each case repeats one piece of client work until --seconds have passed and
+reports wall and thread-CPU time per operation. The request cases run against
+an in-process tools/s3_bench_server.py stand-in with no injected latency.
+The server runs on other threads, so `cpu_us` there is the client's own cost:
+signing, header building, http.client and buffer handling. Compare the
+output before and after a change to the client:
+
+    tools/s3_bench_micro.py > before.txt
+    tools/s3_bench_micro.py --filter sign > after.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import os
+import sys
+import time
+from collections.abc import Callable
+
+import s3_benchmark as bench
+from s3_bench_server import Credentials, StandInServer
+
+ACCESS_KEY = "micro-access"
+SECRET_KEY = "micro-secret"
+BUCKET = "micro"
+
+
+def measure(seconds: float, operation: Callable[[], object]) -> tuple[int, float, float]:
+    """Run `operation` for about `seconds` after a short warm-up; return (count, wall, thread CPU)."""
+    deadline = time.perf_counter() + min(seconds / 10, 0.2)
+    while time.perf_counter() < deadline:
+        operation()
+    count = 0
+    cpu_start, wall_start = time.thread_time(), time.perf_counter()
+    deadline = wall_start + seconds
+    while True:
+        operation()
+        count += 1
+        if count % 16 == 0 and time.perf_counter() >= deadline:
+            break
+    return count, time.perf_counter() - wall_start, time.thread_time() - cpu_start
+
+
+def cases(client: bench.S3Client, size: int) -> dict[str, Callable[[], object]]:
+    payload = os.urandom(size)
+    small = os.urandom(4096)
+    generated = bench.StreamingPayload(size, 1024 * 1024)
+    today = dt.datetime.now(dt.UTC).strftime("%Y%m%d")
+    query = {"list-type": "2", "prefix": "some/prefix/", "max-keys": "1000", "continuation-token": "k/0001"}
+    path = client.encode_path(f"/{BUCKET}/object-key.bin")
+    client.put_object(BUCKET, "small.bin", small)
+    client.put_object(BUCKET, "large.bin", payload)
+
+    def chunk_signed() -> None:
+        headers = client.sign("PUT", path, "", bench.STREAMING_PAYLOAD)
+        body = bench.ChunkSignedBody(
+            payload,
+            client.signing_chunk_size,
+            bench.signing_key(client.secret_key, today, client.region),
+            headers["X-Amz-Date"],
+            f"{today}/{client.region}/s3/aws4_request",
+            headers["Authorization"].rsplit("Signature=", 1)[1],
+            client.signing,
+        )
+        for _ in body:
+            pass
+
+    def generate() -> None:
+        for _ in generated.iter_range(0, size):
+            pass
+
+    def get_sink() -> None:
+        client.request("GET", f"/{BUCKET}/large.bin", sink=lambda view: None)
+
+    return {
+        "signing_key": lambda: bench.signing_key.__wrapped__(client.secret_key, today, client.region),
+        "sign_headers": lambda: client.sign("PUT", path, "", bench.EMPTY_SHA256),
+        "canonical_query": lambda: bench.canonical_query(query),
+        "sha256_payload": lambda: hashlib.sha256(payload).hexdigest(),
+        "chunk_signed_body": chunk_signed,
+        "streaming_payload": generate,
+        "request_head": lambda: client.stat_object(BUCKET, "small.bin"),
+        "request_put_4k": lambda: client.put_object(BUCKET, "put.bin", small),
+        "request_get_4k": lambda: client.get_object(BUCKET, "small.bin"),
+        "request_put_payload": lambda: client.put_object(BUCKET, "put.bin", payload),
+        "request_get_payload": lambda: client.get_object(BUCKET, "large.bin"),
+        "request_get_payload_sink": get_sink,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Client-overhead microbenchmarks for tools/s3_benchmark.py.")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per case (default: %(default)s)")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="payload size in bytes (default: 1 MiB)")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.seconds <= 0 or args.size <= 0:
+        raise SystemExit("ERROR: --seconds and --size must be > 0")
+    with StandInServer(credentials=Credentials(ACCESS_KEY, SECRET_KEY)) as server:
+        # S3Client reads its settings from the environment; point it at the stand-in only.
+        for name in [name for name in os.environ if name.startswith("S3_BENCH_")]:
+            del os.environ[name]
+        os.environ.update(
+            {"S3_BENCH_ENDPOINT": server.endpoint, "S3_BENCH_ACCESS_KEY": ACCESS_KEY, "S3_BENCH_SECRET_KEY": SECRET_KEY}
+        )
+        client = bench.S3Client()
+        try:
+            client.make_bucket(BUCKET)
+            selected = {name: case for name, case in cases(client, args.size).items() if args.filter in name}
+            print(f"# python={sys.version.split()[0]} size={args.size} seconds_per_case={args.seconds:g}")
+            print(f"{'case':<26} {'ops':>9} {'wall_us':>10} {'cpu_us':>10} {'ops_per_sec':>12}")
+            for name, case in selected.items():
+                count, wall, cpu = measure(args.seconds, case)
+                print(
+                    f"{name:<26} {count:>9} {wall / count * 1e6:>10.2f} {cpu / count * 1e6:>10.2f} "
+                    f"{count / wall:>12.1f}",
+                    flush=True,
+                )
+        finally:
+            client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
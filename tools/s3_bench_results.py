@@ -0,0 +1,267 @@
+"""Result store and baseline comparison for tools/s3_benchmark.py.
+
+A finished run is saved as one JSON record holding the non-secret
+S3_BENCH_* settings, per-phase throughput and the latency histograms. Records
+live either in a directory (one `<id>.json` per run) or in an SQLite file,
+chosen by the S3_BENCH_RESULTS path: `*.sqlite`/`*.db` selects SQLite.
+
+`compare` puts a run next to a baseline. For every (op, size) it runs a
+Mann-Whitney U test on the two latency histograms: rank-based, so it needs no
+normality assumption and works directly on bucket counts, with bucket ties
+handled by the usual tie correction. A row is a regression when the shift is
+significant and the median got slower by more than the threshold.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import math
+import os
+import sqlite3
+from typing import IO
+
+from s3_bench_histogram import PERCENTILES, LatencyHistogram
+
+# Also matches the per-endpoint S3_BENCH_<NAME>_ACCESS_KEY / _SECRET_KEY credentials.
+SECRET_SUFFIXES = ("_ACCESS_KEY", "_SECRET_KEY")
+
+
+def run_settings(environ: dict[str, str]) -> dict[str, str]:
+    return {
+        name: value
+        for name, value in sorted(environ.items())
+        if name.startswith("S3_BENCH_") and not name.endswith(SECRET_SUFFIXES)
+    }
+
+
+def build_record(
+    label: str | None,
+    settings: dict[str, str],
+    throughput: list[dict],
+    histograms: dict[tuple[str, int], LatencyHistogram],
+    extra: dict[str, dict],
+) -> dict:
+    created = dt.datetime.now(dt.UTC)
+    return {
+        "id": f"{created:%Y%m%dT%H%M%SZ}-{os.urandom(3).hex()}",
+        "created": created.isoformat(timespec="seconds"),
+        "label": label,
+        "endpoint": settings.get("S3_BENCH_ENDPOINT"),
+        "settings": settings,
+        "throughput": throughput,
+        "histograms": [
+            {"op": op, "size": size, "histogram": histogram.to_dict()}
+            for (op, size), histogram in sorted(histograms.items(), key=lambda item: (item[0][1], item[0][0]))
+        ],
+        **extra,
+    }
+
+
+class DirectoryStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def save(self, record: dict) -> str:
+        os.makedirs(self.path, exist_ok=True)
+        target = os.path.join(self.path, f"{record['id']}.json")
+        with open(target, "w", encoding="utf-8") as handle:
+            json.dump(record, handle, indent=2)
+            handle.write("\n")
+        return target
+
+    def records(self) -> list[dict]:
+        if not os.path.isdir(self.path):
+            return []
+        records = []
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.path, name), encoding="utf-8") as handle:
+                    records.append(json.load(handle))
+        return records
+
+
+class SqliteStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs "
+            "(id TEXT PRIMARY KEY, created TEXT NOT NULL, label TEXT, endpoint TEXT, record TEXT NOT NULL)"
+        )
+        return conn
+
+    def save(self, record: dict) -> str:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (id, created, label, endpoint, record) VALUES (?, ?, ?, ?, ?)",
+                (record["id"], record["created"], record["label"], record["endpoint"], json.dumps(record)),
+            )
+        conn.close()
+        return f"{self.path}#{record['id']}"
+
+    def records(self) -> list[dict]:
+        if not os.path.exists(self.path):
+            return []
+        conn = self._connect()
+        try:
+            return [json.loads(row[0]) for row in conn.execute("SELECT record FROM runs ORDER BY created, id")]
+        finally:
+            conn.close()
+
+
+def open_store(path: str) -> DirectoryStore | SqliteStore:
+    if path.endswith((".sqlite", ".sqlite3", ".db")):
+        return SqliteStore(path)
+    return DirectoryStore(path)
+
+
+def find_record(store: DirectoryStore | SqliteStore | None, ref: str) -> dict:
+    """Resolve a run id, a label (its latest run), `latest`, or a JSON file path.
+
+    A histogram file written by S3_BENCH_HISTOGRAM_FILE also works, without
+    throughput figures.
+    """
+    if os.path.isfile(ref) and not ref.endswith((".sqlite", ".sqlite3", ".db")):
+        with open(ref, encoding="utf-8") as handle:
+            record = json.load(handle)
+        record.setdefault("id", os.path.basename(ref))
+        record.setdefault("throughput", [])
+        return record
+    if store is None:
+        raise SystemExit(f"ERROR: {ref} is not a file; set S3_BENCH_RESULTS or --results to look up stored runs")
+    records = store.records()
+    if ref == "latest" and records:
+        return records[-1]
+    for record in records:
+        if record["id"] == ref:
+            return record
+    labelled = [record for record in records if record.get("label") == ref]
+    if labelled:
+        return labelled[-1]
+    raise SystemExit(f"ERROR: no stored run matches {ref}")
+
+
+def mann_whitney(current: LatencyHistogram, baseline: LatencyHistogram) -> tuple[float, float]:
+    """Two-sided Mann-Whitney U test on two histograms.
+
+    Returns the p-value (normal approximation with tie and continuity
+    correction) and P(current > baseline), counting ties as one half.
+    """
+    if current.bits != baseline.bits:
+        raise ValueError(f"cannot compare histograms with {current.bits} and {baseline.bits} bits")
+    n_current, n_baseline = current.count, baseline.count
+    total = n_current + n_baseline
+    if not n_current or not n_baseline:
+        return 1.0, 0.5
+    rank_sum = 0.0
+    ties = 0.0
+    seen = 0
+    for index in sorted(set(current.counts) | set(baseline.counts)):
+        in_current = current.counts.get(index, 0)
+        tied = in_current + baseline.counts.get(index, 0)
+        rank_sum += in_current * (seen + (tied + 1) / 2)
+        ties += tied**3 - tied
+        seen += tied
+    u_current = rank_sum - n_current * (n_current + 1) / 2
+    mean = n_current * n_baseline / 2
+    variance = n_current * n_baseline / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0, 0.5
+    z = (abs(u_current - mean) - 0.5) / math.sqrt(variance)
+    return math.erfc(max(z, 0.0) / math.sqrt(2)), u_current / (n_current * n_baseline)
+
+
+def _change(current: float, baseline: float) -> float:
+    return (current - baseline) / baseline * 100 if baseline > 0 else 0.0
+
+
+def compare_records(baseline: dict, current: dict, threshold: float, alpha: float, out: IO[str]) -> int:
+    """Print the comparison table and return the number of regressions.
+
+    Request-phase rows (`<op>.<phase>`) are shown for diagnosis but never
+    counted as regressions.
+    """
+    base_hist = {(r["op"], int(r["size"])): LatencyHistogram.from_dict(r["histogram"]) for r in baseline["histograms"]}
+    cur_hist = {(r["op"], int(r["size"])): LatencyHistogram.from_dict(r["histogram"]) for r in current["histograms"]}
+    base_rate = {(r["op"], int(r["size"])): r["ops_per_sec"] for r in baseline.get("throughput", [])}
+    cur_rate = {(r["op"], int(r["size"])): r["ops_per_sec"] for r in current.get("throughput", [])}
+    p50, p99 = PERCENTILES[0], PERCENTILES[2]
+
+    print(f"# baseline {baseline['id']} label={baseline.get('label')} endpoint={baseline.get('endpoint')}", file=out)
+    print(f"# current  {current['id']} label={current.get('label')} endpoint={current.get('endpoint')}", file=out)
+    print(f"# threshold={threshold:g}% alpha={alpha:g}", file=out)
+    print(
+        f"{'op':<22} {'size_bytes':>12} {'n_base':>7} {'n_cur':>7} {'p50_base':>9} {'p50_cur':>9} {'p50_%':>7} "
+        f"{'p99_base':>9} {'p99_cur':>9} {'p99_%':>7} {'ops/s_%':>8} {'p_value':>9}  verdict",
+        file=out,
+    )
+    regressions = 0
+    for key in sorted(set(base_hist) & set(cur_hist), key=lambda item: (item[1], item[0])):
+        op, size = key
+        before, after = base_hist[key], cur_hist[key]
+        p_value, slower = mann_whitney(after, before)
+        p50_change = _change(after.percentile(p50), before.percentile(p50))
+        p99_change = _change(after.percentile(p99), before.percentile(p99))
+        rate_change = f"{_change(cur_rate[key], base_rate[key]):>8.1f}" if key in base_rate and key in cur_rate else ""
+        if p_value >= alpha:
+            verdict = "same"
+        elif slower > 0.5:
+            verdict = "slower"
+            if p50_change > threshold and "." not in op:
+                verdict = "REGRESSION"
+                regressions += 1
+        else:
+            verdict = "faster"
+        print(
+            f"{op:<22} {size:>12} {before.count:>7} {after.count:>7} "
+            f"{before.percentile(p50) * 1000:>9.3f} {after.percentile(p50) * 1000:>9.3f} {p50_change:>7.1f} "
+            f"{before.percentile(p99) * 1000:>9.3f} {after.percentile(p99) * 1000:>9.3f} {p99_change:>7.1f} "
+            f"{rate_change:>8} {p_value:>9.2g}  {verdict}",
+            file=out,
+        )
+    missing = sorted(set(base_hist) ^ set(cur_hist), key=lambda item: (item[1], item[0]))
+    if missing:
+        print("# only in one run: " + ", ".join(f"{op}/{size}" for op, size in missing), file=out)
+    print(f"# regressions={regressions}", file=out)
+    return regressions
+
+
+def print_endpoint_comparison(
+    histograms: dict[tuple[str, int], LatencyHistogram], endpoints: list[str], out: IO[str]
+) -> None:
+    """Side-by-side latency of the `<op>@<endpoint>` histograms of an interleaved multi-endpoint run.
+
+    Every endpoint is tested against the first one with the same Mann-Whitney
+    U test `compare` uses.
+    """
+    p50, p99 = PERCENTILES[0], PERCENTILES[2]
+    reference = endpoints[0]
+    ops = sorted(
+        {(op.partition("@")[0], size) for op, size in histograms if "@" in op and "." not in op},
+        key=lambda item: (item[1], item[0]),
+    )
+    print(f"# endpoints (latency in ms, change and p_value against {reference})", file=out)
+    print(
+        f"{'op':<14} {'size_bytes':>12} {'endpoint':<12} {'count':>7} {'mean':>9} {'p50':>9} {'p99':>9} "
+        f"{'p50_%':>7} {'p_value':>9}",
+        file=out,
+    )
+    for op, size in ops:
+        base = histograms.get((f"{op}@{reference}", size))
+        for endpoint in endpoints:
+            histogram = histograms.get((f"{op}@{endpoint}", size))
+            if histogram is None or not histogram.count:
+                continue
+            change, p_value = "", ""
+            if endpoint != reference and base is not None and base.count:
+                change = f"{_change(histogram.percentile(p50), base.percentile(p50)):.1f}"
+                p_value = f"{mann_whitney(histogram, base)[0]:.2g}"
+            print(
+                f"{op:<14} {size:>12} {endpoint:<12} {histogram.count:>7} {histogram.mean * 1000:>9.3f} "
+                f"{histogram.percentile(p50) * 1000:>9.3f} {histogram.percentile(p99) * 1000:>9.3f} "
+                f"{change:>7} {p_value:>9}",
+                file=out,
+            )
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""S3-compatible stand-in server for offline runs of tools/s3_benchmark.py.
+
+It implements the subset of the S3 API the benchmark uses, path-style only:
+bucket HEAD/PUT/DELETE, object PUT/HEAD/GET (with Range)/DELETE, multipart
+uploads, ListObjectsV2 and DeleteObjects. Objects are kept in memory or, with
+--data-dir, in one file per object; in-progress multipart parts always stay in
+memory. With credentials configured, SigV4 header signatures, payload hashes
+and aws-chunked chunk signatures are verified, so client-side signing changes
+can be checked without a live MinIO.
+
+--latency-ms sets a minimum response time and --bandwidth-mib caps each
+connection's request and response body rate, to approximate a remote server:
+
+    tools/s3_bench_server.py --listen 127.0.0.1:9000 --latency-ms 2 --bandwidth-mib 100
+
+The server can also run inside another process, which is how
+tools/s3_bench_micro.py uses it:
+
+    with StandInServer() as server:
+        os.environ["S3_BENCH_ENDPOINT"] = server.endpoint
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import http.server
+import os
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from xml.sax.saxutils import escape as xml_escape
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+STREAMING_PAYLOAD = "STREAMING-AWS4-HMAC-SHA256-PAYLOAD"
+AUTHORIZATION = re.compile(
+    r"AWS4-HMAC-SHA256 Credential=(?P<access_key>[^/]+)/(?P<scope>(?P<date>\d{8})/(?P<region>[^/]+)/s3/aws4_request), "
+    r"SignedHeaders=(?P<signed>[^,]+), Signature=(?P<signature>[0-9a-f]{64})"
+)
+# Throttled bodies are written and read in pieces of this size.
+THROTTLE_CHUNK = 64 * 1024
+
+
+class S3Error(Exception):
+    def __init__(self, status: int, code: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class MemoryStore:
+    def __init__(self) -> None:
+        self.buckets: dict[str, dict[str, bytes]] = {}
+        self.lock = threading.Lock()
+
+    def create_bucket(self, bucket: str) -> None:
+        with self.lock:
+            self.buckets.setdefault(bucket, {})
+
+    def has_bucket(self, bucket: str) -> bool:
+        return bucket in self.buckets
+
+    def delete_bucket(self, bucket: str) -> None:
+        with self.lock:
+            if self._objects(bucket):
+                raise S3Error(409, "BucketNotEmpty", f"bucket {bucket} is not empty")
+            del self.buckets[bucket]
+
+    def _objects(self, bucket: str) -> dict[str, bytes]:
+        try:
+            return self.buckets[bucket]
+        except KeyError:
+            raise S3Error(404, "NoSuchBucket", f"bucket {bucket} does not exist") from None
+
+    def put(self, bucket: str, key: str, data: bytes) -> None:
+        self._objects(bucket)[key] = data
+
+    def get(self, bucket: str, key: str) -> bytes:
+        try:
+            return self._objects(bucket)[key]
+        except KeyError:
+            raise S3Error(404, "NoSuchKey", f"{bucket}/{key} does not exist") from None
+
+    def size(self, bucket: str, key: str) -> int:
+        return len(self.get(bucket, key))
+
+    def delete(self, bucket: str, key: str) -> None:
+        self._objects(bucket).pop(key, None)
+
+    def keys(self, bucket: str, prefix: str) -> list[tuple[str, int]]:
+        objects = self._objects(bucket)
+        return sorted((key, len(data)) for key, data in list(objects.items()) if key.startswith(prefix))
+
+
+class FileStore:
+    """One directory per bucket and one file per object, named by its percent-encoded key."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _bucket_dir(self, bucket: str) -> str:
+        path = os.path.join(self.root, urllib.parse.quote(bucket, safe=""))
+        if not os.path.isdir(path):
+            raise S3Error(404, "NoSuchBucket", f"bucket {bucket} does not exist")
+        return path
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self._bucket_dir(bucket), urllib.parse.quote(key, safe=""))
+
+    def create_bucket(self, bucket: str) -> None:
+        os.makedirs(os.path.join(self.root, urllib.parse.quote(bucket, safe="")), exist_ok=True)
+
+    def has_bucket(self, bucket: str) -> bool:
+        return os.path.isdir(os.path.join(self.root, urllib.parse.quote(bucket, safe="")))
+
+    def delete_bucket(self, bucket: str) -> None:
+        path = self._bucket_dir(bucket)
+        if os.listdir(path):
+            raise S3Error(409, "BucketNotEmpty", f"bucket {bucket} is not empty")
+        os.rmdir(path)
+
+    def put(self, bucket: str, key: str, data: bytes) -> None:
+        path = self._path(bucket, key)
+        # Write and rename so a concurrent GET never sees a partial object.
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, "wb") as handle:
+            handle.write(data)
+        os.replace(temporary, path)
+
+    def get(self, bucket: str, key: str) -> bytes:
+        try:
+            with open(self._path(bucket, key), "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            raise S3Error(404, "NoSuchKey", f"{bucket}/{key} does not exist") from None
+
+    def size(self, bucket: str, key: str) -> int:
+        try:
+            return os.path.getsize(self._path(bucket, key))
+        except FileNotFoundError:
+            raise S3Error(404, "NoSuchKey", f"{bucket}/{key} does not exist") from None
+
+    def delete(self, bucket: str, key: str) -> None:
+        try:
+            os.unlink(self._path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self, bucket: str, prefix: str) -> list[tuple[str, int]]:
+        path = self._bucket_dir(bucket)
+        found = []
+        for entry in os.scandir(path):
+            if entry.name.endswith(".tmp"):
+                continue
+            key = urllib.parse.unquote(entry.name)
+            if key.startswith(prefix):
+                found.append((key, entry.stat().st_size))
+        return sorted(found)
+
+
+@dataclass(frozen=True)
+class Credentials:
+    access_key: str
+    secret_key: str
+
+
+def signing_key(secret_key: str, date_stamp: str, region: str) -> bytes:
+    key = ("AWS4" + secret_key).encode("utf-8")
+    for part in (date_stamp, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    return key
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: StandInHTTPServer
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - stdlib signature
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_HEAD(self) -> None:
+        self._dispatch()
+
+    def do_GET(self) -> None:
+        self._dispatch()
+
+    def do_PUT(self) -> None:
+        self._dispatch()
+
+    def do_POST(self) -> None:
+        self._dispatch()
+
+    def do_DELETE(self) -> None:
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        started = time.monotonic()
+        try:
+            split = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(split.query, keep_blank_values=True))
+            bucket, _, key = urllib.parse.unquote(split.path).lstrip("/").partition("/")
+            raw = self._read_body()
+            body = self._authenticate(split, raw)
+            status, headers, payload = self._handle(bucket, key, query, body)
+        except S3Error as exc:
+            status, headers = exc.status, {"Content-Type": "application/xml"}
+            payload = (
+                f"<Error><Code>{exc.code}</Code><Message>{xml_escape(str(exc))}</Message>"
+                f"<Resource>{xml_escape(self.path)}</Resource></Error>"
+            ).encode("utf-8")
+        remaining = self.server.latency - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        self._respond(status, headers, payload)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            data = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0], 16)
+                if size == 0:
+                    while self.rfile.readline() not in {b"\r\n", b"\n", b""}:
+                        pass
+                    return bytes(data)
+                data += self._read_exact(size)
+                self.rfile.readline()
+        return self._read_exact(int(self.headers.get("Content-Length") or 0))
+
+    def _read_exact(self, size: int) -> bytes:
+        data = bytearray()
+        started = time.monotonic()
+        while len(data) < size:
+            chunk = self.rfile.read(min(THROTTLE_CHUNK, size - len(data)))
+            if not chunk:
+                raise ConnectionError("client closed the connection mid-body")
+            data += chunk
+            self._throttle(len(data), started)
+        return bytes(data)
+
+    def _throttle(self, nbytes: int, started: float) -> None:
+        if self.server.bandwidth:
+            ahead = nbytes / self.server.bandwidth - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _respond(self, status: int, headers: dict[str, str], payload: bytes) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if "Content-Length" not in headers:
+            self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command == "HEAD" or not payload:
+            return
+        view = memoryview(payload)
+        started = time.monotonic()
+        for start in range(0, len(view), THROTTLE_CHUNK if self.server.bandwidth else len(view)):
+            end = start + (THROTTLE_CHUNK if self.server.bandwidth else len(view))
+            self.wfile.write(view[start:end])
+            self._throttle(min(end, len(view)), started)
+
+    def _authenticate(self, split: urllib.parse.SplitResult, raw: bytes) -> bytes:
+        """Verify the SigV4 request (when credentials are set) and return the decoded body."""
+        payload_hash = self.headers.get("x-amz-content-sha256", "")
+        credentials = self.server.credentials
+        if credentials is None:
+            return decode_aws_chunked(raw, None) if payload_hash == STREAMING_PAYLOAD else raw
+
+        match = AUTHORIZATION.fullmatch(self.headers.get("Authorization", ""))
+        if match is None:
+            raise S3Error(403, "AccessDenied", "missing or malformed SigV4 Authorization header")
+        if match["access_key"] != credentials.access_key:
+            raise S3Error(403, "InvalidAccessKeyId", f"unknown access key {match['access_key']}")
+        signed = match["signed"].split(";")
+        canonical_headers = "".join(f"{name}:{(self.headers.get(name) or '').strip()}\n" for name in signed)
+        query = sorted(urllib.parse.parse_qsl(split.query, keep_blank_values=True))
+        canonical_query = "&".join(
+            f"{urllib.parse.quote(name, safe='-_.~')}={urllib.parse.quote(value, safe='-_.~')}"
+            for name, value in query
+        )
+        canonical_request = "\n".join(
+            [self.command, split.path, canonical_query, canonical_headers, match["signed"], payload_hash]
+        )
+        amz_date = self.headers.get("x-amz-date", "")
+        string_to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                match["scope"],
+                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+            ]
+        )
+        key = signing_key(credentials.secret_key, match["date"], match["region"])
+        expected = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, match["signature"]):
+            raise S3Error(403, "SignatureDoesNotMatch", "request signature does not match")
+
+        if payload_hash == UNSIGNED_PAYLOAD:
+            return raw
+        if payload_hash == STREAMING_PAYLOAD:
+            body = decode_aws_chunked(raw, (key, amz_date, match["scope"], match["signature"]))
+            if len(body) != int(self.headers.get("x-amz-decoded-content-length") or -1):
+                raise S3Error(400, "IncompleteBody", "decoded length does not match x-amz-decoded-content-length")
+            return body
+        if hashlib.sha256(raw).hexdigest() != payload_hash:
+            raise S3Error(400, "XAmzContentSHA256Mismatch", "payload hash does not match x-amz-content-sha256")
+        return raw
+
+    def _handle(self, bucket: str, key: str, query: dict[str, str], body: bytes) -> tuple[int, dict[str, str], bytes]:
+        store = self.server.store
+        method = self.command
+        if not bucket:
+            raise S3Error(400, "InvalidRequest", "path-style bucket name required")
+        if not key:
+            if method == "HEAD":
+                if not store.has_bucket(bucket):
+                    raise S3Error(404, "NoSuchBucket", f"bucket {bucket} does not exist")
+                return 200, {}, b""
+            if method == "PUT":
+                store.create_bucket(bucket)
+                return 200, {}, b""
+            if method == "DELETE":
+                store.delete_bucket(bucket)
+                return 204, {}, b""
+            if method == "GET" and query.get("list-type") == "2":
+                return self._list(bucket, query)
+            if method == "POST" and "delete" in query:
+                return self._delete_objects(bucket, body)
+            raise S3Error(501, "NotImplemented", f"{method} on a bucket is not supported")
+
+        uploads = self.server.uploads
+        if method == "PUT" and "uploadId" in query:
+            parts = uploads.get(query["uploadId"])
+            if parts is None:
+                raise S3Error(404, "NoSuchUpload", f"upload {query['uploadId']} does not exist")
+            parts[int(query["partNumber"])] = body
+            return 200, {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}, b""  # noqa: S324
+        if method == "PUT":
+            store.put(bucket, key, body)
+            return 200, {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}, b""  # noqa: S324
+        if method == "POST" and "uploads" in query:
+            if not store.has_bucket(bucket):
+                raise S3Error(404, "NoSuchBucket", f"bucket {bucket} does not exist")
+            upload_id = uuid.uuid4().hex
+            uploads[upload_id] = {}
+            result = f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            return 200, {"Content-Type": "application/xml"}, result.encode("utf-8")
+        if method == "POST" and "uploadId" in query:
+            parts = uploads.pop(query["uploadId"], None)
+            if parts is None:
+                raise S3Error(404, "NoSuchUpload", f"upload {query['uploadId']} does not exist")
+            store.put(bucket, key, b"".join(parts[number] for number in sorted(parts)))
+            result = f"<CompleteMultipartUploadResult><Key>{xml_escape(key)}</Key></CompleteMultipartUploadResult>"
+            return 200, {"Content-Type": "application/xml"}, result.encode("utf-8")
+        if method == "DELETE":
+            if "uploadId" in query:
+                uploads.pop(query["uploadId"], None)
+            else:
+                store.delete(bucket, key)
+            return 204, {}, b""
+        if method == "HEAD":
+            return 200, {"Content-Length": str(store.size(bucket, key))}, b""
+        if method == "GET":
+            return self._get(store.get(bucket, key))
+        raise S3Error(501, "NotImplemented", f"{method} on an object is not supported")
+
+    def _get(self, data: bytes) -> tuple[int, dict[str, str], bytes]:
+        header = self.headers.get("Range")
+        if not header:
+            return 200, {}, data
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", header.strip())
+        if match is None or int(match[1]) >= len(data):
+            raise S3Error(416, "InvalidRange", f"cannot satisfy {header} for {len(data)} bytes")
+        start = int(match[1])
+        end = min(int(match[2]) if match[2] else len(data) - 1, len(data) - 1)
+        return 206, {"Content-Range": f"bytes {start}-{end}/{len(data)}"}, data[start : end + 1]
+
+    def _list(self, bucket: str, query: dict[str, str]) -> tuple[int, dict[str, str], bytes]:
+        keys = self.server.store.keys(bucket, query.get("prefix", ""))
+        token = query.get("continuation-token")
+        if token:
+            keys = [(key, size) for key, size in keys if key > token]
+        max_keys = int(query.get("max-keys", "1000"))
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = "".join(
+            f"<Contents><Key>{xml_escape(key)}</Key><Size>{size}</Size></Contents>" for key, size in page
+        )
+        next_token = f"<NextContinuationToken>{xml_escape(page[-1][0])}</NextContinuationToken>" if truncated else ""
+        result = (
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{xml_escape(bucket)}</Name><KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{next_token}{contents}</ListBucketResult>"
+        )
+        return 200, {"Content-Type": "application/xml"}, result.encode("utf-8")
+
+    def _delete_objects(self, bucket: str, body: bytes) -> tuple[int, dict[str, str], bytes]:
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError as exc:
+            raise S3Error(400, "MalformedXML", str(exc)) from None
+        quiet = any(element.tag.endswith("Quiet") and element.text == "true" for element in root.iter())
+        keys = [element.text or "" for element in root.iter() if element.tag.endswith("Key")]
+        for key in keys:
+            self.server.store.delete(bucket, key)
+        deleted = "" if quiet else "".join(f"<Deleted><Key>{xml_escape(key)}</Key></Deleted>" for key in keys)
+        result = f'<DeleteResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">{deleted}</DeleteResult>'
+        return 200, {"Content-Type": "application/xml"}, result.encode("utf-8")
+
+
+def decode_aws_chunked(raw: bytes, signing: tuple[bytes, str, str, str] | None) -> bytes:
+    """Strip aws-chunked framing, checking the chained chunk signatures when `signing` is given.
+
+    `signing` is (signing key, x-amz-date, credential scope, request signature).
+    """
+    data = bytearray()
+    position = 0
+    previous = signing[3] if signing else ""
+    while True:
+        end = raw.find(b"\r\n", position)
+        if end < 0:
+            raise S3Error(400, "IncompleteBody", "truncated aws-chunked body")
+        size_hex, _, signature = raw[position:end].decode("ascii").partition(";chunk-signature=")
+        size = int(size_hex, 16)
+        chunk = raw[end + 2 : end + 2 + size]
+        if len(chunk) != size or raw[end + 2 + size : end + 4 + size] != b"\r\n":
+            raise S3Error(400, "IncompleteBody", "truncated aws-chunked body")
+        position = end + 4 + size
+        if signing is not None:
+            key, amz_date, scope, _ = signing
+            string_to_sign = "\n".join(
+                [
+                    "AWS4-HMAC-SHA256-PAYLOAD",
+                    amz_date,
+                    scope,
+                    previous,
+                    EMPTY_SHA256,
+                    hashlib.sha256(chunk).hexdigest(),
+                ]
+            )
+            previous = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(previous, signature):
+                raise S3Error(403, "SignatureDoesNotMatch", "chunk signature does not match")
+        data += chunk
+        if size == 0:
+            return bytes(data)
+
+
+class StandInHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        store: MemoryStore | FileStore,
+        credentials: Credentials | None,
+        latency: float,
+        bandwidth: float,
+        verbose: bool,
+    ) -> None:
+        super().__init__(address, StandInHandler)
+        self.store = store
+        self.credentials = credentials
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.verbose = verbose
+        self.uploads: dict[str, dict[int, bytes]] = {}
+
+
+class StandInServer:
+    """Run the stand-in server on a background thread, e.g. inside a benchmark or a test.
+
+    `latency` is in seconds, `bandwidth` in bytes/second per connection (0 = unlimited).
+    """
+
+    def __init__(
+        self,
+        listen: tuple[str, int] = ("127.0.0.1", 0),
+        data_dir: str | None = None,
+        credentials: Credentials | None = None,
+        latency: float = 0.0,
+        bandwidth: float = 0.0,
+        verbose: bool = False,
+    ) -> None:
+        store = FileStore(data_dir) if data_dir else MemoryStore()
+        self.httpd = StandInHTTPServer(listen, store, credentials, latency, bandwidth, verbose)
+        self.thread: threading.Thread | None = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> StandInServer:
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="s3-stand-in", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self) -> None:
+        if self.thread is not None:
+            self.httpd.shutdown()
+            self.thread.join()
+        self.httpd.server_close()
+
+    def __enter__(self) -> StandInServer:
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="S3-compatible stand-in server for tools/s3_benchmark.py.")
+    parser.add_argument("--listen", default="127.0.0.1:9000", help="HOST:PORT to listen on (default: %(default)s)")
+    parser.add_argument("--data-dir", help="keep objects in this directory instead of memory")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="minimum time per response in milliseconds")
+    parser.add_argument("--bandwidth-mib", type=float, default=0.0, help="per-connection body rate cap in MiB/s")
+    parser.add_argument(
+        "--access-key",
+        default=os.environ.get("S3_BENCH_ACCESS_KEY"),
+        help="verify SigV4 signatures for this access key (default: S3_BENCH_ACCESS_KEY)",
+    )
+    parser.add_argument(
+        "--secret-key", default=os.environ.get("S3_BENCH_SECRET_KEY"), help="default: S3_BENCH_SECRET_KEY"
+    )
+    parser.add_argument("--verbose", action="store_true", help="log every request to stderr")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    host, _, port = args.listen.rpartition(":")
+    if not host or not port.isdigit():
+        raise SystemExit(f"ERROR: expected HOST:PORT, got {args.listen}")
+    if bool(args.access_key) != bool(args.secret_key):
+        raise SystemExit("ERROR: set both --access-key and --secret-key, or neither to accept unverified requests")
+    credentials = Credentials(args.access_key, args.secret_key) if args.access_key else None
+    server = StandInServer(
+        (host.strip("[]"), int(port)),
+        data_dir=args.data_dir,
+        credentials=credentials,
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_mib * 1024 * 1024,
+        verbose=args.verbose,
+    )
+    storage = args.data_dir or "memory"
+    verify = "on" if credentials else "off"
+    print(f"# S3 stand-in on {server.endpoint} storage={storage} signature_checks={verify}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
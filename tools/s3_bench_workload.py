@@ -0,0 +1,224 @@
+"""Declarative mixed-workload profiles for tools/s3_benchmark.py.
+
+A profile is a JSON (or, when PyYAML is installed, YAML) file describing the
+traffic shape to replay:
+
+    {
+      "duration": 60,
+      "concurrency": 16,
+      "key_space": 1000,
+      "prepopulate": 200,
+      "key_distribution": "zipf",
+      "mix": [
+        {"op": "get",  "weight": 55, "sizes": {"4096": 70, "1048576": 30}},
+        {"op": "stat", "weight": 30, "sizes": {"4096": 1}},
+        {"op": "put",  "weight": 14, "sizes": {"16384": 1}, "read_after_write": 0.5},
+        {"op": "put",  "weight": 1,  "sizes": {"268435456": 1}}
+      ]
+    }
+
+Keys are partitioned by object size, so every key always holds an object of
+the same size and reads can be verified while other workers overwrite it.
+Prepopulation only writes sizes that a stat, get or delete entry reads; sizes
+used by put entries alone start empty.
+"""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import json
+import random
+import threading
+from dataclasses import dataclass, field
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - YAML profiles are optional
+    yaml = None
+
+OPERATIONS = {"put", "stat", "get", "delete"}
+
+
+@dataclass(frozen=True)
+class MixEntry:
+    op: str
+    weight: float
+    sizes: list[tuple[int, float]]
+    read_after_write: float = 0.0
+
+
+@dataclass
+class WorkloadProfile:
+    mix: list[MixEntry]
+    key_space: int = 100
+    prepopulate: int | None = None
+    key_distribution: str = "uniform"
+    zipf_exponent: float = 1.0
+    duration: float | None = None
+    operations: int | None = None
+    rate: float | None = None
+    rate_end: float | None = None
+    arrivals: str = "uniform"
+    concurrency: int = 1
+    _cum_weights: list[float] = field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        self._cum_weights = list(itertools.accumulate(entry.weight for entry in self.mix))
+
+    @property
+    def sizes(self) -> list[int]:
+        return sorted({size for entry in self.mix for size, _ in entry.sizes})
+
+    @property
+    def read_sizes(self) -> list[int]:
+        """Sizes some non-put entry reads; only these need prepopulated objects."""
+        return sorted({size for entry in self.mix if entry.op != "put" for size, _ in entry.sizes})
+
+    @property
+    def prepopulate_count(self) -> int:
+        if self.prepopulate is not None:
+            return self.prepopulate
+        return self.key_space if any(entry.op != "put" for entry in self.mix) else 0
+
+    def pick(self, rng: random.Random) -> tuple[MixEntry, int]:
+        """Draw the next operation and its object size."""
+        entry = self.mix[bisect.bisect_left(self._cum_weights, rng.random() * self._cum_weights[-1])]
+        sizes = [size for size, _ in entry.sizes]
+        weights = [weight for _, weight in entry.sizes]
+        return entry, rng.choices(sizes, weights)[0]
+
+
+def _positive(data: dict, name: str, kind: type, default=None):
+    value = data.get(name, default)
+    if value is None:
+        return None
+    try:
+        value = kind(value)
+    except (TypeError, ValueError) as exc:
+        raise SystemExit(f"ERROR: workload profile field '{name}' must be a number, got {value!r}") from exc
+    if value <= 0:
+        raise SystemExit(f"ERROR: workload profile field '{name}' must be > 0, got {value}")
+    return value
+
+
+def parse_profile(data: dict) -> WorkloadProfile:
+    if not isinstance(data, dict) or not isinstance(data.get("mix"), list) or not data["mix"]:
+        raise SystemExit("ERROR: workload profile needs a non-empty 'mix' list")
+
+    mix = []
+    for raw in data["mix"]:
+        op = raw.get("op")
+        if op not in OPERATIONS:
+            raise SystemExit(f"ERROR: workload mix op must be one of {sorted(OPERATIONS)}, got {op!r}")
+        sizes = raw.get("sizes")
+        if not isinstance(sizes, dict) or not sizes:
+            raise SystemExit(f"ERROR: workload mix entry for '{op}' needs a 'sizes' mapping of size: weight")
+        read_after_write = float(raw.get("read_after_write", 0.0))
+        if not 0.0 <= read_after_write <= 1.0:
+            raise SystemExit("ERROR: workload 'read_after_write' must be between 0 and 1")
+        mix.append(
+            MixEntry(
+                op=op,
+                weight=_positive(raw, "weight", float, 1.0),
+                sizes=[(int(size), float(weight)) for size, weight in sizes.items()],
+                read_after_write=read_after_write,
+            )
+        )
+
+    key_distribution = data.get("key_distribution", "uniform")
+    if key_distribution not in {"uniform", "zipf"}:
+        raise SystemExit(f"ERROR: workload 'key_distribution' must be 'uniform' or 'zipf', got {key_distribution}")
+    arrivals = data.get("arrivals", "uniform")
+    if arrivals not in {"uniform", "poisson"}:
+        raise SystemExit(f"ERROR: workload 'arrivals' must be 'uniform' or 'poisson', got {arrivals}")
+
+    prepopulate = data.get("prepopulate")
+    if prepopulate is not None:
+        try:
+            prepopulate = int(prepopulate)
+        except (TypeError, ValueError) as exc:
+            raise SystemExit(f"ERROR: workload 'prepopulate' must be a number, got {prepopulate!r}") from exc
+
+    profile = WorkloadProfile(
+        mix=mix,
+        key_space=_positive(data, "key_space", int, 100),
+        prepopulate=prepopulate,
+        key_distribution=key_distribution,
+        zipf_exponent=_positive(data, "zipf_exponent", float, 1.0),
+        duration=_positive(data, "duration", float),
+        operations=_positive(data, "operations", int),
+        rate=_positive(data, "rate", float),
+        rate_end=_positive(data, "rate_end", float),
+        arrivals=arrivals,
+        concurrency=_positive(data, "concurrency", int, 1),
+    )
+    if profile.duration is None and profile.operations is None:
+        raise SystemExit("ERROR: workload profile needs 'duration' (seconds) or 'operations' (count)")
+    if profile.rate is not None and profile.duration is None:
+        raise SystemExit("ERROR: workload profile 'rate' requires 'duration'")
+    if profile.prepopulate is not None and not 0 <= profile.prepopulate <= profile.key_space:
+        raise SystemExit("ERROR: workload 'prepopulate' must be between 0 and 'key_space'")
+    return profile
+
+
+def load_profile(path: str) -> WorkloadProfile:
+    with open(path, encoding="utf-8") as handle:
+        if path.endswith((".yml", ".yaml")):
+            if yaml is None:
+                raise SystemExit("ERROR: PyYAML is required for YAML workload profiles; use JSON instead")
+            data = yaml.safe_load(handle)
+        else:
+            data = json.load(handle)
+    return parse_profile(data)
+
+
+class KeySpace:
+    """Keys of one object size, tracking which of them currently exist."""
+
+    def __init__(self, prefix: str, size: int, count: int, distribution: str, exponent: float) -> None:
+        self.prefix = prefix
+        self.size = size
+        self.count = count
+        self._cum_weights = None
+        if distribution == "zipf":
+            self._cum_weights = list(itertools.accumulate(1.0 / (rank**exponent) for rank in range(1, count + 1)))
+        self._written: set[int] = set()
+        self._written_list: list[int] = []
+        self._lock = threading.Lock()
+
+    def key(self, index: int) -> str:
+        return f"{self.prefix}/wl-{self.size}-{index}.bin"
+
+    def _draw(self, rng: random.Random, population: int) -> int:
+        if self._cum_weights is None:
+            return rng.randrange(population)
+        limit = self._cum_weights[population - 1]
+        return bisect.bisect_left(self._cum_weights, rng.random() * limit, hi=population - 1)
+
+    def pick_any(self, rng: random.Random) -> int:
+        return self._draw(rng, self.count)
+
+    def pick_written(self, rng: random.Random) -> int | None:
+        """Pick an existing key; with zipf the hottest keys are the first written."""
+        with self._lock:
+            if not self._written_list:
+                return None
+            return self._written_list[self._draw(rng, len(self._written_list))]
+
+    def mark_written(self, index: int) -> None:
+        with self._lock:
+            if index not in self._written:
+                self._written.add(index)
+                self._written_list.append(index)
+
+    def mark_deleted(self, index: int) -> bool:
+        with self._lock:
+            if index not in self._written:
+                return False
+            self._written.discard(index)
+            self._written_list.remove(index)
+            return True
+
+    def all_keys(self) -> list[str]:
+        return [self.key(index) for index in range(self.count)]
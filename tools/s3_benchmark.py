@@ -7,17 +7,47 @@ The wrapper supplies credentials through environment variables loaded from SOPS.
 
 from __future__ import annotations
 
+import base64
 import csv
+import dataclasses
 import datetime as dt
+import functools
 import hashlib
 import hmac
+import http.client
+import itertools
+import json
+import math
+import mmap
 import os
+import random
+import socket
 import ssl
+import struct
 import sys
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
+import xml.etree.ElementTree as ET
+from argparse import ArgumentParser
+from xml.sax.saxutils import escape as xml_escape
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+from s3_bench_async import run_put_stat_get
+from s3_bench_cluster import Agent, Coordinator, agent_environment, parse_address
+from s3_bench_histogram import LatencyHistogram, dump_histograms, load_histograms, merge_into, print_latency_table
+from s3_bench_metrics import CanaryMetrics, serve_metrics, write_textfile
+from s3_bench_results import (
+    build_record,
+    compare_records,
+    find_record,
+    open_store,
+    print_endpoint_comparison,
+    run_settings,
+)
+from s3_bench_workload import KeySpace, WorkloadProfile, load_profile
 
 
 def getenv_required(name: str) -> str:
@@ -34,54 +64,592 @@ def split_sizes(value: str) -> list[int]:
         raise SystemExit(f"ERROR: invalid S3_BENCH_SIZES value: {value}") from exc
 
 
+def getenv_int(name: str, default: int, minimum: int = 1) -> int:
+    raw = os.environ.get(name, str(default))
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise SystemExit(f"ERROR: invalid {name} value: {raw}") from exc
+    if value < minimum:
+        raise SystemExit(f"ERROR: {name} must be >= {minimum}, got {value}")
+    return value
+
+
+def getenv_float(name: str, default: float | None = None) -> float | None:
+    raw = os.environ.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        return float(raw)
+    except ValueError as exc:
+        raise SystemExit(f"ERROR: invalid {name} value: {raw}") from exc
+
+
+@functools.lru_cache(maxsize=16)
 def signing_key(secret_key: str, date_stamp: str, region: str) -> bytes:
+    """Derive the SigV4 key; it only changes with the date, so it is cached."""
     key = ("AWS4" + secret_key).encode("utf-8")
     for part in (date_stamp, region, "s3", "aws4_request"):
         key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
     return key
 
 
-class S3Client:
+# Errors that mean a kept-alive connection was closed by the server while idle.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+# Called before every timed phase; blocks until all agents of a distributed run are ready.
+Barrier = Callable[[], None]
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by every worker of one client.
+
+    In "warm" mode connections are returned to an idle stack after each
+    response and reused by the next request. In "cold" mode every request
+    opens a fresh connection and closes it afterwards, which reproduces the
+    TCP/TLS setup cost of one-shot clients.
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        netloc: str,
+        timeout: float,
+        context: ssl.SSLContext | None,
+        keep_alive: bool = True,
+    ) -> None:
+        if scheme not in {"http", "https"}:
+            raise SystemExit(f"ERROR: unsupported endpoint scheme: {scheme}")
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self.context = context
+        self.tls_context = (context or ssl.create_default_context()) if scheme == "https" else None
+        self.keep_alive = keep_alive
+        self.opened = 0
+        self.replaced = 0
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self, phases: dict[str, float] | None = None) -> http.client.HTTPConnection:
+        """Open a connection, timing DNS lookup, TCP connect and TLS handshake separately into `phases`."""
+        with self._lock:
+            self.opened += 1
+        # The socket is connected here step by step, so never let http.client reconnect on its own.
+        conn = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+        conn.auto_open = 0
+        phases = {} if phases is None else phases
+
+        started = time.perf_counter()
+        addresses = socket.getaddrinfo(conn.host, conn.port, type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        phases["dns"] = resolved - started
+        error: OSError | None = None
+        for family, kind, proto, _, address in addresses:
+            sock = socket.socket(family, kind, proto)
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect(address)
+                break
+            except OSError as exc:
+                sock.close()
+                error = exc
+        else:
+            raise error or OSError(f"could not resolve {conn.host}")
+        # Like other S3 clients, do not let Nagle hold back small request bodies.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connected = time.perf_counter()
+        phases["connect"] = connected - resolved
+
+        if self.scheme == "https":
+            try:
+                sock = self.tls_context.wrap_socket(sock, server_hostname=conn.host)
+            except BaseException:
+                sock.close()
+                raise
+            phases["tls"] = time.perf_counter() - connected
+        conn.sock = sock
+        return conn
+
+    def acquire(self, phases: dict[str, float] | None = None) -> tuple[http.client.HTTPConnection, bool]:
+        """Return a connection and whether it was reused from the idle stack."""
+        if self.keep_alive:
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop(), True
+        return self._connect(phases), False
+
+    def replace(
+        self, conn: http.client.HTTPConnection, phases: dict[str, float] | None = None
+    ) -> http.client.HTTPConnection:
+        """Close a stale reused connection and return a freshly opened one in its place."""
+        conn.close()
+        with self._lock:
+            self.replaced += 1
+        return self._connect(phases)
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool = True) -> None:
+        if self.keep_alive and reusable:
+            with self._lock:
+                self._idle.append(conn)
+            return
+        conn.close()
+
+    def prewarm(self, count: int) -> None:
+        """Open `count` idle connections so the first timed requests are warm."""
+        if not self.keep_alive:
+            return
+        with self._lock:
+            missing = count - len(self._idle)
+        for _ in range(missing):
+            self.release(self._connect())
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class StreamingPayload:
+    """Deterministic object body generated chunk by chunk.
+
+    Every chunk is a copy of one shared random block stamped with its chunk
+    index and a per-payload tag, so a multi-GiB object never exists in memory
+    and chunks are not identical. SHA-256 digests of ranges are computed once
+    and cached, because SigV4 needs the payload hash before the body is sent.
+    """
+
+    def __init__(self, size: int, chunk_size: int) -> None:
+        self.size = size
+        self.chunk_size = chunk_size
+        self.block = os.urandom(chunk_size)
+        self.tag = int.from_bytes(os.urandom(8), "big")
+        self._digests: dict[tuple[int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def range(self, start: int, end: int) -> PayloadRange:
+        return PayloadRange(self, start, end)
+
+    def iter_range(self, start: int, end: int) -> Iterator[memoryview]:
+        """Yield [start, end) as views into one reused buffer.
+
+        A yielded view is only valid until the next one is requested.
+        """
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        for index in range(start // self.chunk_size, (end - 1) // self.chunk_size + 1):
+            chunk_start = index * self.chunk_size
+            buffer[:] = self.block
+            struct.pack_into(">QQ", buffer, 0, index, self.tag)
+            yield view[max(start, chunk_start) - chunk_start : min(end, chunk_start + self.chunk_size) - chunk_start]
+
+    def digest(self, start: int, end: int) -> str:
+        with self._lock:
+            cached = self._digests.get((start, end))
+            if cached is None:
+                hasher = hashlib.sha256()
+                for chunk in self.iter_range(start, end):
+                    hasher.update(chunk)
+                cached = self._digests[start, end] = hasher.hexdigest()
+        return cached
+
+
+class PayloadRange:
+    """A byte range of a StreamingPayload that can be sent as a request body."""
+
+    def __init__(self, payload: StreamingPayload, start: int, end: int) -> None:
+        self.payload = payload
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return self.payload.iter_range(self.start, self.end)
+
+    def sha256_hex(self) -> str:
+        return self.payload.digest(self.start, self.end)
+
+
+class HashCache:
+    """SHA-256 digests of file payload ranges, kept in a JSON file across runs.
+
+    Entries are keyed by device, inode, mtime and size, so a file that was
+    rewritten or replaced is hashed again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: dict[str, dict[str, str]] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as handle:
+                loaded = json.load(handle)
+            if isinstance(loaded, dict):
+                self.entries = loaded
+        except (OSError, ValueError):
+            pass
+
+    def get(self, file_key: str, start: int, end: int) -> str | None:
+        with self._lock:
+            return self.entries.get(file_key, {}).get(f"{start}-{end}")
+
+    def put(self, file_key: str, start: int, end: int, digest: str) -> None:
+        with self._lock:
+            self.entries.setdefault(file_key, {})[f"{start}-{end}"] = digest
+            self.dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                json.dump(self.entries, handle)
+            os.replace(temporary, self.path)
+            self.dirty = False
+
+
+class FilePayload(StreamingPayload):
+    """A real file as the object body, memory-mapped and sent as memoryview slices of the mapping.
+
+    The file is never read into the Python heap: request bodies, chunk
+    signing and GET verification all work on views of the mapping, and its
+    digests come from the HashCache when the file is unchanged.
+    """
+
+    def __init__(self, path: str, chunk_size: int, cache: HashCache) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cache = cache
+        with open(path, "rb") as handle:
+            stat = os.fstat(handle.fileno())
+            self.size = stat.st_size
+            self.mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.mapping, "madvise"):
+            self.mapping.madvise(mmap.MADV_SEQUENTIAL)
+        self.view = memoryview(self.mapping)
+        self.file_key = f"{stat.st_dev}:{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+        self._digests: dict[tuple[int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def iter_range(self, start: int, end: int) -> Iterator[memoryview]:
+        for offset in range(start, end, self.chunk_size):
+            yield self.view[offset : min(end, offset + self.chunk_size)]
+
+    def digest(self, start: int, end: int) -> str:
+        with self._lock:
+            cached = self._digests.get((start, end)) or self.cache.get(self.file_key, start, end)
+            if cached is None:
+                cached = hashlib.sha256(self.view[start:end]).hexdigest()
+                self.cache.put(self.file_key, start, end, cached)
+            self._digests[start, end] = cached
+        return cached
+
+
+def load_file_payloads(chunk_size: int) -> list[FilePayload]:
+    """Map the files of S3_BENCH_PAYLOAD_DIR (not recursive) or those listed in S3_BENCH_PAYLOAD_LIST, in order.
+
+    Returns an empty list when neither is set.
+    """
+    directory = os.environ.get("S3_BENCH_PAYLOAD_DIR")
+    list_file = os.environ.get("S3_BENCH_PAYLOAD_LIST")
+    if directory and list_file:
+        raise SystemExit("ERROR: set only one of S3_BENCH_PAYLOAD_DIR and S3_BENCH_PAYLOAD_LIST")
+    if not directory and not list_file:
+        return []
+    if directory:
+        if not os.path.isdir(directory):
+            raise SystemExit(f"ERROR: S3_BENCH_PAYLOAD_DIR is not a directory: {directory}")
+        paths = sorted(entry.path for entry in os.scandir(directory) if entry.is_file())
+    else:
+        with open(list_file, encoding="utf-8") as handle:
+            paths = [line.strip() for line in handle if line.strip() and not line.lstrip().startswith("#")]
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    cache = HashCache(os.environ.get("S3_BENCH_HASH_CACHE", os.path.join(cache_dir, "s3-bench-hashes.json")))
+    payloads = []
+    for path in paths:
+        if not os.path.isfile(path):
+            raise SystemExit(f"ERROR: payload file does not exist: {path}")
+        if os.path.getsize(path) == 0:
+            print(f"WARN: skipping empty payload file {path}", file=sys.stderr)
+            continue
+        payloads.append(FilePayload(path, chunk_size, cache))
+    if not payloads:
+        raise SystemExit("ERROR: no non-empty payload files found")
+    return payloads
+
+
+class StreamVerifier:
+    """Count and hash a streamed GET body and compare it with the payload sent."""
+
+    def __init__(self, expected: PayloadRange, label: str) -> None:
+        self.expected = expected
+        self.label = label
+        self.nbytes = 0
+        self.hasher = hashlib.sha256()
+
+    def __call__(self, chunk: memoryview) -> None:
+        self.nbytes += len(chunk)
+        self.hasher.update(chunk)
+
+    def check(self) -> None:
+        if self.nbytes != len(self.expected):
+            raise RuntimeError(f"GET {self.label} returned {self.nbytes} bytes, expected {len(self.expected)}")
+        if self.hasher.hexdigest() != self.expected.sha256_hex():
+            raise RuntimeError(f"GET {self.label} returned data that does not match the uploaded payload")
+
+
+class SigningStats:
+    """Client CPU time spent hashing payloads and computing signatures, across threads."""
+
     def __init__(self) -> None:
-        endpoint = getenv_required("S3_BENCH_ENDPOINT").rstrip("/")
+        self.requests = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, requests: int = 1) -> None:
+        with self._lock:
+            self.requests += requests
+            self.seconds += seconds
+
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+STREAMING_PAYLOAD = "STREAMING-AWS4-HMAC-SHA256-PAYLOAD"
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+PAYLOAD_SIGNING_MODES = {"full", "unsigned", "streaming"}
+
+
+class ChunkSignedBody:
+    """A request body re-encoded as aws-chunked with a signature per chunk.
+
+    Each chunk's signature chains the previous one, starting from the request
+    signature, so the payload is hashed while it is sent instead of in an
+    extra pass before the request. Iterating again (a retry on a stale
+    connection) produces the same bytes.
+    """
+
+    def __init__(
+        self,
+        body: bytes | memoryview | PayloadRange,
+        chunk_size: int,
+        key: bytes,
+        amz_date: str,
+        scope: str,
+        seed_signature: str,
+        stats: SigningStats,
+    ) -> None:
+        self.body = body
+        self.chunk_size = chunk_size
+        self.key = key
+        self.amz_date = amz_date
+        self.scope = scope
+        self.seed_signature = seed_signature
+        self.stats = stats
+
+    @staticmethod
+    def encoded_length(size: int, chunk_size: int) -> int:
+        def framed(length: int) -> int:
+            return len(f"{length:x}") + len(";chunk-signature=") + 64 + 2 + length + 2
+
+        full, rest = divmod(size, chunk_size)
+        return full * framed(chunk_size) + (framed(rest) if rest else 0) + framed(0)
+
+    def __len__(self) -> int:
+        return self.encoded_length(len(self.body), self.chunk_size)
+
+    def _chunks(self) -> Iterator[memoryview]:
+        """Yield the body in pieces of exactly `chunk_size` bytes (the last one may be shorter)."""
+        source = iter(self.body) if isinstance(self.body, PayloadRange) else [memoryview(self.body)]
+        pending = bytearray()
+        for piece in source:
+            piece = memoryview(piece)
+            if pending:
+                take = min(len(piece), self.chunk_size - len(pending))
+                pending += piece[:take]
+                piece = piece[take:]
+                if len(pending) < self.chunk_size:
+                    continue
+                yield memoryview(pending)
+                pending = bytearray()
+            while len(piece) >= self.chunk_size:
+                yield piece[: self.chunk_size]
+                piece = piece[self.chunk_size :]
+            pending += piece
+        if pending:
+            yield memoryview(pending)
+
+    def __iter__(self) -> Iterator[bytes | memoryview]:
+        previous = self.seed_signature
+        prefix = f"AWS4-HMAC-SHA256-PAYLOAD\n{self.amz_date}\n{self.scope}\n"
+        cpu_seconds = 0.0
+        for chunk in itertools.chain(self._chunks(), [memoryview(b"")]):
+            started = time.thread_time()
+            string_to_sign = f"{prefix}{previous}\n{EMPTY_SHA256}\n{hashlib.sha256(chunk).hexdigest()}"
+            previous = hmac.new(self.key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+            cpu_seconds += time.thread_time() - started
+            yield f"{len(chunk):x};chunk-signature={previous}\r\n".encode("ascii")
+            if chunk:
+                yield chunk
+            yield b"\r\n"
+        self.stats.add(cpu_seconds, requests=0)
+
+
+Body = bytes | memoryview | PayloadRange
+
+
+@dataclass(frozen=True)
+class S3Response:
+    status: int
+    headers: http.client.HTTPMessage
+    body: bytes
+
+
+TIMING_PHASES = ("dns", "connect", "tls", "send", "ttfb", "transfer")
+
+
+@dataclass(frozen=True)
+class RequestTiming:
+    """Where the time of one request went, in seconds.
+
+    `dns`, `connect` and `tls` are None when the request reused a kept-alive
+    connection (and `tls` also for plain HTTP). `ttfb` runs from the end of
+    the send to the response headers, `transfer` covers the response body.
+    """
+
+    dns: float | None
+    connect: float | None
+    tls: float | None
+    send: float
+    ttfb: float
+    transfer: float
+
+
+def canonical_query(query: dict[str, str] | None) -> str:
+    if not query:
+        return ""
+    return "&".join(
+        f"{urllib.parse.quote(name, safe='-_.~')}={urllib.parse.quote(value, safe='-_.~')}"
+        for name, value in sorted(query.items())
+    )
+
+
+# DeleteObjects accepts at most this many keys per request.
+DELETE_BATCH_SIZE = 1000
+
+
+def xml_elements(root: ET.Element, tag: str) -> list[ET.Element]:
+    """Return all elements named `tag` below `root`, ignoring XML namespaces."""
+    return [element for element in root.iter() if element.tag.rsplit("}", 1)[-1] == tag]
+
+
+def xml_text(body: bytes | ET.Element, tag: str) -> str | None:
+    """Return the text of the first element named `tag`, ignoring XML namespaces."""
+    root = ET.fromstring(body) if isinstance(body, bytes) else body
+    elements = xml_elements(root, tag)
+    return elements[0].text if elements else None
+
+
+@dataclass(frozen=True)
+class ListPage:
+    keys: list[str]
+    next_token: str | None
+
+
+def endpoint_setting(name: str | None, setting: str) -> str:
+    """The environment variable for `setting` of a named endpoint, e.g. S3_BENCH_RUSTFS_ENDPOINT.
+
+    Only the endpoint URL itself is mandatory per name; the other settings fall
+    back to the unnamed S3_BENCH_* value when the named one is unset.
+    """
+    if name is None:
+        return f"S3_BENCH_{setting}"
+    named = f"S3_BENCH_{name.upper().replace('-', '_')}_{setting}"
+    return named if setting == "ENDPOINT" or named in os.environ else f"S3_BENCH_{setting}"
+
+
+class S3Client:
+    def __init__(self, name: str | None = None) -> None:
+        self.name = name
+        endpoint_var = endpoint_setting(name, "ENDPOINT")
+        endpoint = getenv_required(endpoint_var).rstrip("/")
         parsed = urllib.parse.urlsplit(endpoint)
         if not parsed.scheme or not parsed.netloc:
-            raise SystemExit(f"ERROR: invalid S3_BENCH_ENDPOINT: {endpoint}")
+            raise SystemExit(f"ERROR: invalid {endpoint_var}: {endpoint}")
 
         self.scheme = parsed.scheme
         self.netloc = parsed.netloc
         self.base_path = parsed.path.rstrip("/")
-        self.access_key = getenv_required("S3_BENCH_ACCESS_KEY")
-        self.secret_key = getenv_required("S3_BENCH_SECRET_KEY")
-        self.region = os.environ.get("S3_BENCH_REGION", "us-east-1")
+        self.access_key = getenv_required(endpoint_setting(name, "ACCESS_KEY"))
+        self.secret_key = getenv_required(endpoint_setting(name, "SECRET_KEY"))
+        self.region = os.environ.get(endpoint_setting(name, "REGION"), "us-east-1")
         self.timeout = float(os.environ.get("S3_BENCH_TIMEOUT", "120"))
 
         self.context = None
-        if os.environ.get("S3_BENCH_INSECURE") == "1":
+        if os.environ.get(endpoint_setting(name, "INSECURE")) == "1":
             self.context = ssl._create_unverified_context()  # noqa: S323
 
-    def request(self, method: str, path: str, body: bytes = b"") -> bytes:
-        request_path = f"{self.base_path}{path}"
-        encoded_path = urllib.parse.quote(request_path, safe="/-_.~")
-        url = urllib.parse.urlunsplit((self.scheme, self.netloc, encoded_path, "", ""))
+        connection_mode = os.environ.get("S3_BENCH_CONNECTION_MODE", "warm")
+        if connection_mode not in {"warm", "cold"}:
+            raise SystemExit(f"ERROR: S3_BENCH_CONNECTION_MODE must be 'warm' or 'cold', got {connection_mode}")
+        self.pool = ConnectionPool(
+            self.scheme, self.netloc, self.timeout, self.context, keep_alive=connection_mode == "warm"
+        )
+        self.read_chunk_size = getenv_int("S3_BENCH_CHUNK_SIZE", 1024 * 1024)
+        self._local = threading.local()
+
+        # How PUT bodies are covered by the signature: "full" hashes the body before sending,
+        # "unsigned" sends UNSIGNED-PAYLOAD and "streaming" signs aws-chunked chunks on the fly.
+        self.payload_signing = os.environ.get("S3_BENCH_PAYLOAD_SIGNING", "full")
+        if self.payload_signing not in PAYLOAD_SIGNING_MODES:
+            raise SystemExit(
+                f"ERROR: S3_BENCH_PAYLOAD_SIGNING must be one of {sorted(PAYLOAD_SIGNING_MODES)}, "
+                f"got {self.payload_signing}"
+            )
+        self.signing_chunk_size = getenv_int("S3_BENCH_SIGNING_CHUNK_SIZE", 64 * 1024)
+        if self.signing_chunk_size < 8192:
+            raise SystemExit("ERROR: S3_BENCH_SIGNING_CHUNK_SIZE must be at least 8192 bytes")
+        self.signing = SigningStats()
+
+    def encode_path(self, path: str) -> str:
+        return urllib.parse.quote(f"{self.base_path}{path}", safe="/-_.~")
 
+    def sign(
+        self,
+        method: str,
+        encoded_path: str,
+        query_string: str,
+        payload_hash: str,
+        extra: dict[str, str] | None = None,
+    ) -> dict[str, str]:
+        """Return the Host, X-Amz-* and SigV4 Authorization headers for one request.
+
+        `extra` headers are signed as well and included in the result.
+        """
         now = dt.datetime.now(dt.UTC)
         amz_date = now.strftime("%Y%m%dT%H%M%SZ")
         date_stamp = now.strftime("%Y%m%d")
-        payload_hash = hashlib.sha256(body).hexdigest()
 
-        headers = {
+        signed = {
             "host": self.netloc,
             "x-amz-content-sha256": payload_hash,
             "x-amz-date": amz_date,
+            **{name.lower(): value for name, value in (extra or {}).items()},
         }
-        signed_headers = ";".join(sorted(headers))
-        canonical_headers = "".join(f"{name}:{headers[name]}\n" for name in sorted(headers))
+        signed_headers = ";".join(sorted(signed))
+        canonical_headers = "".join(f"{name}:{signed[name]}\n" for name in sorted(signed))
         canonical_request = "\n".join(
             [
                 method,
                 encoded_path,
-                "",
+                query_string,
                 canonical_headers,
                 signed_headers,
                 payload_hash,
@@ -103,7 +671,9 @@ class S3Client:
             hashlib.sha256,
         ).hexdigest()
 
-        request_headers = {
+        return {
+            **(extra or {}),
+            "Host": self.netloc,
             "Authorization": (
                 "AWS4-HMAC-SHA256 "
                 f"Credential={self.access_key}/{scope}, "
@@ -114,14 +684,131 @@ class S3Client:
             "X-Amz-Date": amz_date,
         }
 
-        data = body if method in {"PUT", "POST"} else None
-        request = urllib.request.Request(url, data=data, headers=request_headers, method=method)
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Body = b"",
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        sink: Callable[[memoryview], None] | None = None,
+    ) -> S3Response:
+        """Send a signed request.
+
+        With `sink`, a successful response body is streamed into it through a
+        reused per-thread buffer instead of being returned.
+        """
+        encoded_path = self.encode_path(path)
+        query_string = canonical_query(query)
+        started = time.thread_time()
+        mode = self.payload_signing if method == "PUT" and len(body) else "full"
+        if mode == "streaming":
+            request_headers = {
+                **(headers or {}),
+                **self.sign(
+                    method,
+                    encoded_path,
+                    query_string,
+                    STREAMING_PAYLOAD,
+                    {"Content-Encoding": "aws-chunked", "X-Amz-Decoded-Content-Length": str(len(body))},
+                ),
+            }
+            amz_date = request_headers["X-Amz-Date"]
+            body = ChunkSignedBody(
+                body,
+                self.signing_chunk_size,
+                signing_key(self.secret_key, amz_date[:8], self.region),
+                amz_date,
+                f"{amz_date[:8]}/{self.region}/s3/aws4_request",
+                request_headers["Authorization"].rsplit("Signature=", 1)[1],
+                self.signing,
+            )
+        else:
+            if mode == "unsigned":
+                payload_hash = UNSIGNED_PAYLOAD
+            elif isinstance(body, PayloadRange):
+                payload_hash = body.sha256_hex()
+            else:
+                payload_hash = hashlib.sha256(body).hexdigest()
+            request_headers = {
+                **(headers or {}),
+                **self.sign(method, encoded_path, query_string, payload_hash),
+            }
+        self.signing.add(time.thread_time() - started)
+
+        if method in {"PUT", "POST"}:
+            request_headers["Content-Length"] = str(len(body))
+        if not self.pool.keep_alive:
+            request_headers["Connection"] = "close"
+
+        target = f"{encoded_path}?{query_string}" if query_string else encoded_path
+        response = self._send(method, target, body if method in {"PUT", "POST"} else None, request_headers, sink)
+        if response.status >= 300:
+            detail = response.body[:300].decode("utf-8", errors="replace")
+            raise RuntimeError(f"{method} {path} failed: HTTP {response.status} {detail}")
+        return response
+
+    def _send(
+        self,
+        method: str,
+        target: str,
+        data: Body | ChunkSignedBody | None,
+        headers: dict[str, str],
+        sink: Callable[[memoryview], None] | None = None,
+    ) -> S3Response:
+        phases: dict[str, float] = {}
+        conn, reused = self.pool.acquire(phases)
         try:
-            with urllib.request.urlopen(request, timeout=self.timeout, context=self.context) as response:
-                return response.read()
-        except urllib.error.HTTPError as exc:
-            detail = exc.read(300).decode("utf-8", errors="replace")
-            raise RuntimeError(f"{method} {path} failed: HTTP {exc.code} {detail}") from exc
+            try:
+                started = time.perf_counter()
+                conn.request(method, target, body=data, headers=headers)
+                sent = time.perf_counter()
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection; retry once on a fresh one.
+                conn, reused = self.pool.replace(conn, phases), False
+                started = time.perf_counter()
+                conn.request(method, target, body=data, headers=headers)
+                sent = time.perf_counter()
+                response = conn.getresponse()
+            first_byte = time.perf_counter()
+            if sink is not None and response.status < 300:
+                self._drain(response, sink)
+                payload = b""
+            else:
+                payload = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        self._local.timing = RequestTiming(
+            phases.get("dns"),
+            phases.get("connect"),
+            phases.get("tls"),
+            sent - started,
+            first_byte - sent,
+            time.perf_counter() - first_byte,
+        )
+        self.pool.release(conn, reusable=not response.will_close)
+        return S3Response(response.status, response.headers, payload)
+
+    def last_timing(self) -> RequestTiming | None:
+        """Phase timing of the most recent request sent by the calling thread."""
+        return getattr(self._local, "timing", None)
+
+    def _drain(self, response: http.client.HTTPResponse, sink: Callable[[memoryview], None]) -> None:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = memoryview(bytearray(self.read_chunk_size))
+        while True:
+            count = response.readinto(buffer)
+            if not count:
+                return
+            sink(buffer[:count])
+
+    def close(self) -> None:
+        self.pool.close()
 
     def bucket_exists(self, bucket: str) -> bool:
         try:
@@ -138,18 +825,205 @@ class S3Client:
     def remove_bucket(self, bucket: str) -> None:
         self.request("DELETE", f"/{bucket}")
 
-    def put_object(self, bucket: str, key: str, payload: bytes) -> None:
-        self.request("PUT", f"/{bucket}/{key}", payload)
+    def put_object(self, bucket: str, key: str, payload: bytes | StreamingPayload) -> None:
+        if isinstance(payload, StreamingPayload):
+            self.request("PUT", f"/{bucket}/{key}", payload.range(0, payload.size))
+        else:
+            self.request("PUT", f"/{bucket}/{key}", payload)
 
     def stat_object(self, bucket: str, key: str) -> None:
         self.request("HEAD", f"/{bucket}/{key}")
 
     def get_object(self, bucket: str, key: str) -> bytes:
-        return self.request("GET", f"/{bucket}/{key}")
+        return self.request("GET", f"/{bucket}/{key}").body
+
+    def get_object_verified(self, bucket: str, key: str, expected: StreamingPayload) -> int:
+        """Stream an object through a fixed buffer and check it against `expected`."""
+        verifier = StreamVerifier(expected.range(0, expected.size), key)
+        self.request("GET", f"/{bucket}/{key}", sink=verifier)
+        verifier.check()
+        return verifier.nbytes
+
+    def get_object_range(
+        self, bucket: str, key: str, start: int, end: int, sink: Callable[[memoryview], None] | None = None
+    ) -> bytes:
+        """GET bytes `start`..`end` (inclusive) of an object."""
+        response = self.request("GET", f"/{bucket}/{key}", headers={"Range": f"bytes={start}-{end}"}, sink=sink)
+        if response.status != 206:
+            raise RuntimeError(f"GET {key} range {start}-{end} returned HTTP {response.status}, expected 206")
+        return response.body
 
     def delete_object(self, bucket: str, key: str) -> None:
         self.request("DELETE", f"/{bucket}/{key}")
 
+    def create_multipart_upload(self, bucket: str, key: str) -> str:
+        response = self.request("POST", f"/{bucket}/{key}", query={"uploads": ""})
+        upload_id = xml_text(response.body, "UploadId")
+        if not upload_id:
+            raise RuntimeError(f"CreateMultipartUpload {key} returned no UploadId")
+        return upload_id
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, payload: Body) -> str:
+        response = self.request(
+            "PUT",
+            f"/{bucket}/{key}",
+            payload,
+            query={"partNumber": str(part_number), "uploadId": upload_id},
+        )
+        etag = response.headers.get("ETag")
+        if not etag:
+            raise RuntimeError(f"UploadPart {key} part {part_number} returned no ETag")
+        return etag
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, etags: list[str]) -> None:
+        parts = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in enumerate(etags, start=1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode("utf-8")
+        response = self.request("POST", f"/{bucket}/{key}", body, query={"uploadId": upload_id})
+        # S3 may report a failed completion as HTTP 200 with an <Error> document.
+        if xml_text(response.body, "Code"):
+            detail = response.body[:300].decode("utf-8", errors="replace")
+            raise RuntimeError(f"CompleteMultipartUpload {key} failed: {detail}")
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        self.request("DELETE", f"/{bucket}/{key}", query={"uploadId": upload_id})
+
+    def list_objects_v2(
+        self, bucket: str, prefix: str = "", max_keys: int = 1000, continuation_token: str | None = None
+    ) -> ListPage:
+        query = {"list-type": "2", "prefix": prefix, "max-keys": str(max_keys)}
+        if continuation_token:
+            query["continuation-token"] = continuation_token
+        root = ET.fromstring(self.request("GET", f"/{bucket}", query=query).body)
+        keys = [xml_text(contents, "Key") for contents in xml_elements(root, "Contents")]
+        truncated = (xml_text(root, "IsTruncated") or "false").lower() == "true"
+        next_token = xml_text(root, "NextContinuationToken") if truncated else None
+        if truncated and not next_token:
+            raise RuntimeError(f"ListObjectsV2 {bucket}/{prefix} is truncated but has no continuation token")
+        return ListPage(keys, next_token)
+
+    def delete_objects(self, bucket: str, keys: list[str]) -> dict[str, str]:
+        """Delete up to DELETE_BATCH_SIZE keys in one request; return {key: error} for failures."""
+        if len(keys) > DELETE_BATCH_SIZE:
+            raise ValueError(f"DeleteObjects takes at most {DELETE_BATCH_SIZE} keys, got {len(keys)}")
+        objects = "".join(f"<Object><Key>{xml_escape(key)}</Key></Object>" for key in keys)
+        body = f"<Delete><Quiet>true</Quiet>{objects}</Delete>".encode("utf-8")
+        # DeleteObjects requires an integrity header on the request body.
+        checksum = base64.b64encode(hashlib.md5(body).digest()).decode("ascii")  # noqa: S324
+        response = self.request("POST", f"/{bucket}", body, query={"delete": ""}, headers={"Content-MD5": checksum})
+        root = ET.fromstring(response.body) if response.body else None
+        if root is None:
+            return {}
+        return {
+            xml_text(error, "Key") or "": f"{xml_text(error, 'Code')}: {xml_text(error, 'Message')}"
+            for error in xml_elements(root, "Error")
+        }
+
+
+def delete_keys(client: S3Client, bucket: str, keys: list[str]) -> None:
+    """Best-effort cleanup with DeleteObjects, falling back to one DELETE per key."""
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start : start + DELETE_BATCH_SIZE]
+        try:
+            failed = client.delete_objects(bucket, batch)
+        except Exception as exc:  # pragma: no cover - cleanup best effort
+            print(f"WARN: DeleteObjects failed ({exc}); deleting {len(batch)} keys one by one", file=sys.stderr)
+            failed = {}
+            for key in batch:
+                try:
+                    client.delete_object(bucket, key)
+                except Exception as key_exc:
+                    failed[key] = str(key_exc)
+        for key, error in failed.items():
+            print(f"WARN: failed to delete {bucket}/{key}: {error}", file=sys.stderr)
+
+
+@dataclass(frozen=True)
+class PartTiming:
+    part_number: int
+    nbytes: int
+    seconds: float
+    timing: RequestTiming | None = None
+
+
+class MultipartTransfer:
+    """Parallel multipart uploads and ranged-GET downloads of one object.
+
+    Every call uses up to `concurrency` threads for its parts, on top of the
+    benchmark's own worker threads.
+    """
+
+    def __init__(self, client: S3Client, part_size: int, concurrency: int) -> None:
+        self.client = client
+        self.part_size = part_size
+        self.concurrency = concurrency
+
+    def ranges(self, size: int) -> list[tuple[int, int]]:
+        return [(offset, min(offset + self.part_size, size)) for offset in range(0, size, self.part_size)]
+
+    def _executor(self, parts: int) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=min(self.concurrency, parts), thread_name_prefix="s3-part")
+
+    def upload(self, bucket: str, key: str, payload: bytes | StreamingPayload) -> list[PartTiming]:
+        ranges = self.ranges(len(payload))
+        if isinstance(payload, StreamingPayload):
+            part_body = payload.range
+        else:
+            view = memoryview(payload)
+            part_body = lambda start, end: view[start:end]  # noqa: E731
+        upload_id = self.client.create_multipart_upload(bucket, key)
+
+        def send(part_number: int, start: int, end: int) -> tuple[str, PartTiming]:
+            seconds, etag = measure(
+                lambda: self.client.upload_part(bucket, key, upload_id, part_number, part_body(start, end))
+            )
+            return etag, PartTiming(part_number, end - start, seconds, self.client.last_timing())
+
+        try:
+            with self._executor(len(ranges)) as pool:
+                futures = [pool.submit(send, number, start, end) for number, (start, end) in enumerate(ranges, start=1)]
+                results = [future.result() for future in futures]
+            self.client.complete_multipart_upload(bucket, key, upload_id, [etag for etag, _ in results])
+        except BaseException:
+            try:
+                self.client.abort_multipart_upload(bucket, key, upload_id)
+            except Exception as exc:  # pragma: no cover - cleanup best effort
+                print(f"WARN: failed to abort multipart upload {key}: {exc}", file=sys.stderr)
+            raise
+        return [timing for _, timing in results]
+
+    def download(
+        self, bucket: str, key: str, size: int, expected: StreamingPayload | None = None
+    ) -> tuple[bytearray | None, list[PartTiming]]:
+        """Fetch an object as concurrent ranged GETs.
+
+        Without `expected` the parts are assembled into one buffer. With it,
+        each part is streamed, verified against the payload and discarded, and
+        no buffer is returned.
+        """
+        ranges = self.ranges(size)
+        buffer = None if expected is not None else bytearray(size)
+        view = memoryview(buffer) if buffer is not None else None
+
+        def fetch(part_number: int, start: int, end: int) -> PartTiming:
+            if expected is not None:
+                verifier = StreamVerifier(expected.range(start, end), f"{key} range {start}-{end - 1}")
+                seconds, _ = measure(lambda: self.client.get_object_range(bucket, key, start, end - 1, sink=verifier))
+                verifier.check()
+                return PartTiming(part_number, end - start, seconds, self.client.last_timing())
+            seconds, chunk = measure(lambda: self.client.get_object_range(bucket, key, start, end - 1))
+            if len(chunk) != end - start:
+                raise RuntimeError(f"GET {key} range {start}-{end - 1} returned {len(chunk)} bytes")
+            view[start:end] = chunk
+            return PartTiming(part_number, end - start, seconds, self.client.last_timing())
+
+        with self._executor(len(ranges)) as pool:
+            futures = [pool.submit(fetch, number, start, end) for number, (start, end) in enumerate(ranges, start=1)]
+            timings = [future.result() for future in futures]
+        return buffer, timings
+
 
 def mib_per_sec(size: int, seconds: float) -> str:
     if seconds <= 0:
@@ -163,63 +1037,1335 @@ def measure(callable_obj) -> tuple[float, object]:
     return time.perf_counter() - start, result
 
 
+@dataclass(frozen=True)
+class Sample:
+    op: str
+    size: int
+    worker: int
+    iteration: int
+    seconds: float
+    key: str
+    nbytes: int
+    timing: RequestTiming | None = None
+
+
+@dataclass(frozen=True)
+class PhaseResult:
+    """All samples of one (op, size) phase plus the wall time across workers."""
+
+    op: str
+    size: int
+    workers: int
+    wall_seconds: float
+    samples: list[Sample]
+
+
+def part_samples(op: str, size: int, worker: int, iteration: int, key: str, parts: list[PartTiming]) -> list[Sample]:
+    return [
+        Sample(op, size, worker, iteration, part.seconds, f"{key}#{part.part_number}", part.nbytes, part.timing)
+        for part in parts
+    ]
+
+
+def object_key(prefix: str, size: int, worker: int, iteration: int, workers: int) -> str:
+    # Single-worker runs keep the historical key layout.
+    if workers == 1:
+        return f"{prefix}/{size}-{iteration}.bin"
+    return f"{prefix}/{size}-w{worker}-{iteration}.bin"
+
+
+class ObjectOps:
+    """Timed PUT/HEAD/GET of one object size, returning benchmark samples.
+
+    Each call returns the samples of its multipart parts (if any) followed by
+    the sample of the whole operation. Single-request operations carry the
+    phase timing of their request.
+    """
+
+    def __init__(
+        self,
+        client: S3Client,
+        transfer: MultipartTransfer,
+        bucket: str,
+        size: int,
+        payload: bytes | StreamingPayload,
+        multipart: bool,
+        range_size: int = 0,
+        range_pattern: str = "random",
+    ) -> None:
+        self.client = client
+        self.transfer = transfer
+        self.bucket = bucket
+        self.size = size
+        self.payload = payload
+        self.multipart = multipart
+        self.streaming = isinstance(payload, StreamingPayload)
+        self.range_size = min(range_size, size)
+        self.range_pattern = range_pattern
+
+    def run(self, op: str, worker: int, iteration: int, key: str) -> list[Sample]:
+        return getattr(self, op)(worker, iteration, key)
+
+    def put(self, worker: int, iteration: int, key: str) -> list[Sample]:
+        samples = []
+        timing = None
+        if self.multipart:
+            seconds, parts = measure(lambda: self.transfer.upload(self.bucket, key, self.payload))
+            samples.extend(part_samples("put_part", self.size, worker, iteration, key, parts))
+        else:
+            seconds, _ = measure(lambda: self.client.put_object(self.bucket, key, self.payload))
+            timing = self.client.last_timing()
+        samples.append(Sample("put", self.size, worker, iteration, seconds, key, self.size, timing))
+        return samples
+
+    def stat(self, worker: int, iteration: int, key: str) -> list[Sample]:
+        seconds, _ = measure(lambda: self.client.stat_object(self.bucket, key))
+        return [Sample("stat", self.size, worker, iteration, seconds, key, 0, self.client.last_timing())]
+
+    def get(self, worker: int, iteration: int, key: str) -> list[Sample]:
+        samples = []
+        timing = None
+        if self.multipart:
+            expected = self.payload if self.streaming else None
+            seconds, (downloaded, parts) = measure(
+                lambda: self.transfer.download(self.bucket, key, self.size, expected)
+            )
+            samples.extend(part_samples("get_part", self.size, worker, iteration, key, parts))
+        elif self.streaming:
+            seconds, _ = measure(lambda: self.client.get_object_verified(self.bucket, key, self.payload))
+            timing = self.client.last_timing()
+        else:
+            seconds, downloaded = measure(lambda: self.client.get_object(self.bucket, key))
+            timing = self.client.last_timing()
+        if not self.streaming and len(downloaded) != self.size:
+            raise RuntimeError(f"GET {key} returned {len(downloaded)} bytes, expected {self.size}")
+        samples.append(Sample("get", self.size, worker, iteration, seconds, key, self.size, timing))
+        return samples
+
+    def get_range(self, worker: int, iteration: int, key: str) -> list[Sample]:
+        """GET `range_size` bytes at a random offset, or at consecutive offsets per iteration."""
+        if not self.range_size:
+            raise RuntimeError("get_range needs S3_BENCH_RANGE_SIZE")
+        if self.range_pattern == "sequential":
+            # Walk the object in consecutive whole ranges, wrapping around at the end.
+            start = (iteration - 1) % (self.size // self.range_size) * self.range_size
+        else:
+            start = random.randrange(self.size - self.range_size + 1)
+        end = start + self.range_size - 1
+        received = 0
+
+        def count(chunk: memoryview) -> None:
+            nonlocal received
+            received += len(chunk)
+
+        if self.streaming:
+            # Only count the bytes: verifying would hash the payload once per random offset.
+            seconds, _ = measure(lambda: self.client.get_object_range(self.bucket, key, start, end, sink=count))
+        else:
+            seconds, chunk = measure(lambda: self.client.get_object_range(self.bucket, key, start, end))
+            if memoryview(self.payload)[start : end + 1] != chunk:
+                raise RuntimeError(f"GET {key} range {start}-{end} does not match the uploaded payload")
+            received = len(chunk)
+        if received != self.range_size:
+            raise RuntimeError(f"GET {key} range {start}-{end} returned {received} bytes, expected {self.range_size}")
+        return [
+            Sample(
+                "get_range",
+                self.size,
+                worker,
+                iteration,
+                seconds,
+                f"{key}#{start}-{end}",
+                self.range_size,
+                self.client.last_timing(),
+            )
+        ]
+
+    def delete(self, worker: int, iteration: int, key: str) -> list[Sample]:
+        seconds, _ = measure(lambda: self.client.delete_object(self.bucket, key))
+        return [Sample("delete", self.size, worker, iteration, seconds, key, 0, self.client.last_timing())]
+
+
+class ArrivalSchedule:
+    """Intended send times for an open-loop run, shared by all workers.
+
+    The arrival rate ramps linearly from `rate` to `rate_end` over `duration`
+    seconds (constant when they are equal). Arrivals are evenly spaced, or
+    exponentially spaced when `poisson` is set.
+    """
+
+    def __init__(self, rate: float, rate_end: float, duration: float, poisson: bool = False) -> None:
+        if rate < 0 or rate_end < 0 or rate + rate_end <= 0:
+            raise SystemExit("ERROR: S3_BENCH_RATE and S3_BENCH_RATE_END must be >= 0 and not both 0")
+        self.rate = rate
+        self.slope = (rate_end - rate) / duration
+        self.duration = duration
+        self.total = (rate + rate_end) / 2 * duration
+        self.poisson = poisson
+        self.scheduled = 0
+        self._arrivals = 0.0
+        self._lock = threading.Lock()
+
+    def offset(self, arrivals: float) -> float:
+        """Seconds from the start at which the cumulative arrival count reaches `arrivals`."""
+        if self.slope == 0:
+            return arrivals / self.rate
+        # On a ramp-down the cumulative count tops out at `total`; past it there is no real root.
+        radicand = self.rate * self.rate + 2 * self.slope * arrivals
+        if arrivals >= self.total or radicand < 0:
+            return self.duration
+        return (math.sqrt(radicand) - self.rate) / self.slope
+
+    def claim(self) -> tuple[int, float] | None:
+        """Return the next (index, offset) or None once the duration is over."""
+        with self._lock:
+            if self._arrivals >= self.total:
+                return None
+            step = random.expovariate(1.0) if self.poisson else 1.0
+            offset = self.offset(self._arrivals)
+            if offset >= self.duration:
+                return None
+            self._arrivals += step
+            self.scheduled += 1
+            return self.scheduled, offset
+
+    @property
+    def target_rate(self) -> float:
+        return self.scheduled / self.duration
+
+
+def run_open_loop(
+    executor: ThreadPoolExecutor,
+    ops: ObjectOps,
+    op: str,
+    keys: list[str],
+    workers: int,
+    schedule: ArrivalSchedule,
+    barrier: Barrier | None = None,
+) -> list[PhaseResult]:
+    """Issue `op` at the scheduled arrival times, independent of response times.
+
+    The `op` samples measure from the intended send time to completion, so a
+    request delayed because every worker was busy is charged for its wait
+    (coordinated-omission correction). `<op>_service` samples hold the plain
+    service time of the same requests.
+    """
+    if barrier is not None:
+        barrier()
+    start = time.perf_counter() + 0.05
+    lag_histograms: list[LatencyHistogram] = []
+
+    def task(worker: int) -> list[Sample]:
+        samples: list[Sample] = []
+        lags = LatencyHistogram()  # One per worker, so recording needs no lock
+        lag_histograms.append(lags)
+        while (arrival := schedule.claim()) is not None:
+            index, offset = arrival
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lags.record(max(0.0, time.perf_counter() - intended))
+            result = ops.run(op, worker, index, keys[index % len(keys)])
+            response_time = time.perf_counter() - intended
+            service = result.pop()
+            samples.extend(result)
+            samples.append(dataclasses.replace(service, op=f"{op}_service"))
+            samples.append(dataclasses.replace(service, seconds=response_time))
+        return samples
+
+    results = run_phase(executor, op, ops.size, workers, task)
+    completed = len(results[0].samples)
+    achieved = completed / results[0].wall_seconds if results[0].wall_seconds > 0 else 0.0
+    lag = LatencyHistogram()
+    for histogram in lag_histograms:
+        lag.merge(histogram)
+    print(
+        f"# open-loop op={op} size={ops.size} duration={schedule.duration:g}s "
+        f"target_rate={schedule.target_rate:.2f} achieved_rate={achieved:.2f} completed={completed} "
+        f"p99_start_lag_ms={lag.percentile(99) * 1000:.3f} max_start_lag_ms={lag.max * 1000:.3f}",
+        file=sys.stderr,
+    )
+    return results
+
+
+def run_metadata_phases(
+    executor: ThreadPoolExecutor,
+    client: S3Client,
+    bucket: str,
+    prefix: str,
+    count: int,
+    object_size: int,
+    page_size: int,
+    iterations: int,
+    workers: int,
+    objects: list[str],
+    barrier: Barrier | None = None,
+) -> list[PhaseResult]:
+    """Small-object metadata benchmark: PUT `count` objects, list them, bulk-delete them.
+
+    Each worker lists the whole prefix `iterations` times; every page is a
+    `list_page` sample and every complete listing a `list` sample. The
+    objects are then removed with DeleteObjects batches (`delete_bulk`).
+    """
+    list_prefix = f"{prefix}/list/"
+    keys = [f"{list_prefix}{index:09d}.bin" for index in range(count)]
+    objects.extend(keys)
+    payload = os.urandom(object_size)
+    results: list[PhaseResult] = []
+
+    def put_task(worker: int) -> list[Sample]:
+        samples = []
+        for index in range(worker, count, workers):
+            seconds, _ = measure(lambda: client.put_object(bucket, keys[index], payload))
+            samples.append(
+                Sample("put", object_size, worker, index, seconds, keys[index], object_size, client.last_timing())
+            )
+        return samples
+
+    def list_task(worker: int) -> list[Sample]:
+        samples = []
+        for iteration in range(1, iterations + 1):
+            listed, token, page_number = 0, None, 0
+            listing_start = time.perf_counter()
+            while True:
+                page_number += 1
+                seconds, page = measure(lambda: client.list_objects_v2(bucket, list_prefix, page_size, token))
+                listed += len(page.keys)
+                samples.append(
+                    Sample(
+                        "list_page",
+                        object_size,
+                        worker,
+                        iteration,
+                        seconds,
+                        f"{list_prefix}#{page_number}",
+                        0,
+                        client.last_timing(),
+                    )
+                )
+                token = page.next_token
+                if token is None:
+                    break
+            seconds = time.perf_counter() - listing_start
+            if listed != count:
+                raise RuntimeError(f"LIST {list_prefix} returned {listed} keys, expected {count}")
+            samples.append(Sample("list", object_size, worker, iteration, seconds, list_prefix, 0))
+        return samples
+
+    batches = [keys[start : start + DELETE_BATCH_SIZE] for start in range(0, count, DELETE_BATCH_SIZE)]
+
+    def delete_task(worker: int) -> list[Sample]:
+        samples = []
+        for number in range(worker, len(batches), workers):
+            batch = batches[number]
+            seconds, failed = measure(lambda: client.delete_objects(bucket, batch))
+            if failed:
+                key, error = next(iter(failed.items()))
+                raise RuntimeError(f"DeleteObjects failed for {len(failed)} keys, first {key}: {error}")
+            samples.append(
+                Sample(
+                    "delete_bulk", object_size, worker, number + 1, seconds, f"{batch[0]}..", 0, client.last_timing()
+                )
+            )
+        return samples
+
+    results.extend(run_phase(executor, "put", object_size, workers, put_task, barrier))
+    results.extend(run_phase(executor, "list", object_size, workers, list_task, barrier))
+    deleted = run_phase(executor, "delete_bulk", object_size, workers, delete_task, barrier)
+    results.extend(deleted)
+    removed = set(keys)
+    objects[:] = [key for key in objects if key not in removed]
+
+    wall_seconds = deleted[0].wall_seconds
+    rate = count / wall_seconds if wall_seconds > 0 else float("inf")
+    print(
+        f"# metadata objects={count} page_size={page_size} pages_per_listing={math.ceil(count / page_size)} "
+        f"bulk_delete_objects_per_sec={rate:.2f}",
+        file=sys.stderr,
+    )
+    return results
+
+
+def group_samples(
+    op: str | None, size: int | None, workers: int, wall_seconds: float, samples: list[Sample]
+) -> list[PhaseResult]:
+    """Split one phase's samples into results per (op, size), all sharing the phase wall time.
+
+    The group for `op`/`size` comes first and exists even when empty.
+    Sub-operations (multipart parts) and mixed workloads produce the others.
+    """
+    groups: dict[tuple[str, int], list[Sample]] = {}
+    if op is not None and size is not None:
+        groups[op, size] = []
+    for sample in samples:
+        groups.setdefault((sample.op, sample.size), []).append(sample)
+    order = sorted(groups, key=lambda group: (group[1], group[0] != op, group[0]))
+    return [PhaseResult(name, size, workers, wall_seconds, groups[name, size]) for name, size in order]
+
+
+def run_phase(
+    executor: ThreadPoolExecutor,
+    op: str | None,
+    size: int | None,
+    workers: int,
+    task,
+    barrier: Barrier | None = None,
+) -> list[PhaseResult]:
+    """Run `task(worker)` on every worker and wait for all of them.
+
+    Phases act as barriers: every worker finishes its PUTs before any worker
+    starts HEAD, so the wall time is the aggregate time for that operation.
+    In a distributed run `barrier` additionally holds the phase back until
+    every agent is ready to start it.
+    """
+    if barrier is not None:
+        barrier()
+    start = time.perf_counter()
+    futures = [executor.submit(task, worker) for worker in range(workers)]
+    samples: list[Sample] = []
+    for future in futures:
+        samples.extend(future.result())
+    return group_samples(op, size, workers, time.perf_counter() - start, samples)
+
+
+def run_workload(
+    executor: ThreadPoolExecutor,
+    client: S3Client,
+    transfer: MultipartTransfer,
+    bucket: str,
+    prefix: str,
+    profile: WorkloadProfile,
+    workers: int,
+    streaming: bool,
+    multipart_threshold: int,
+    objects: list[str],
+    barrier: Barrier | None = None,
+) -> list[PhaseResult]:
+    """Replay a mixed workload profile and return its samples by (op, size).
+
+    GET/HEAD of a key deleted by another worker in the meantime is counted as
+    a miss instead of failing the run. With a profile `rate` the run is
+    open-loop and latencies are corrected for coordinated omission as in
+    run_open_loop().
+    """
+    spaces = {
+        size: KeySpace(prefix, size, profile.key_space, profile.key_distribution, profile.zipf_exponent)
+        for size in profile.sizes
+    }
+    ops_by_size = {
+        size: ObjectOps(
+            client,
+            transfer,
+            bucket,
+            size,
+            StreamingPayload(size, client.read_chunk_size) if streaming else os.urandom(size),
+            multipart=0 < multipart_threshold <= size,
+        )
+        for size in profile.sizes
+    }
+    schedule = None
+    if profile.rate is not None:
+        schedule = ArrivalSchedule(
+            profile.rate, profile.rate_end or profile.rate, profile.duration, poisson=profile.arrivals == "poisson"
+        )
+    counter = itertools.count(1)
+    misses = 0
+    misses_lock = threading.Lock()
+
+    def prepopulate(size: int, index: int) -> None:
+        ops_by_size[size].put(0, 0, spaces[size].key(index))
+        spaces[size].mark_written(index)
+
+    try:
+        futures = [
+            executor.submit(prepopulate, size, index)
+            for size in profile.read_sizes
+            for index in range(profile.prepopulate_count)
+        ]
+        for future in futures:
+            future.result()
+
+        if barrier is not None:
+            barrier()
+        start = time.perf_counter() + 0.05
+        deadline = start + profile.duration if profile.duration is not None else math.inf
+
+        def next_arrival() -> tuple[int, float] | None:
+            if schedule is not None:
+                arrival = schedule.claim()
+                if arrival is None:
+                    return None
+                index, offset = arrival
+                intended = start + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                return index, intended
+            index = next(counter)
+            if profile.operations is not None and index > profile.operations:
+                return None
+            now = time.perf_counter()
+            if now < start:
+                time.sleep(start - now)
+            elif now >= deadline:
+                return None
+            return index, time.perf_counter()
+
+        def task(worker: int) -> list[Sample]:
+            nonlocal misses
+            rng = random.Random()
+            samples: list[Sample] = []
+            while (arrival := next_arrival()) is not None:
+                iteration, intended = arrival
+                entry, size = profile.pick(rng)
+                space, ops = spaces[size], ops_by_size[size]
+                if entry.op == "put":
+                    index = space.pick_any(rng)
+                else:
+                    index = space.pick_written(rng)
+                    if index is None or (entry.op == "delete" and not space.mark_deleted(index)):
+                        with misses_lock:
+                            misses += 1
+                        continue
+                key = space.key(index)
+                try:
+                    result = ops.run(entry.op, worker, iteration, key)
+                except RuntimeError as exc:
+                    if entry.op == "put" or "HTTP 404" not in str(exc):
+                        raise
+                    with misses_lock:
+                        misses += 1
+                    continue
+                if schedule is not None:
+                    service = result.pop()
+                    result.append(dataclasses.replace(service, op=f"{entry.op}_service"))
+                    result.append(dataclasses.replace(service, seconds=time.perf_counter() - intended))
+                if entry.op == "put":
+                    space.mark_written(index)
+                    if entry.read_after_write and rng.random() < entry.read_after_write:
+                        follow_up = ops.get(worker, iteration, key)
+                        result.append(dataclasses.replace(follow_up.pop(), op="get_after_put"))
+                samples.extend(result)
+            return samples
+
+        results = run_phase(executor, None, None, workers, task)
+    finally:
+        # Every key that may exist is cleaned up, including after a failed run.
+        for space in spaces.values():
+            objects.extend(space.all_keys())
+
+    total = sum(len(phase.samples) for phase in results if not phase.op.endswith(("_part", "_service")))
+    wall_seconds = results[0].wall_seconds if results else 0.0
+    achieved = total / wall_seconds if wall_seconds > 0 else 0.0
+    target = f" target_rate={schedule.target_rate:.2f}" if schedule is not None else ""
+    print(
+        f"# workload ops={total} misses={misses} seconds={wall_seconds:.3f}{target} achieved_rate={achieved:.2f}",
+        file=sys.stderr,
+    )
+    return results
+
+
+def print_summary(phases: list[PhaseResult]) -> None:
+    out = sys.stderr
+    print("# aggregate", file=out)
+    print(
+        f"{'op':<18} {'size_bytes':>12} {'workers':>7} {'ops':>6} "
+        f"{'seconds':>10} {'ops_per_sec':>12} {'mib_per_sec':>12}",
+        file=out,
+    )
+    for phase in phases:
+        ops = len(phase.samples)
+        total_bytes = sum(sample.nbytes for sample in phase.samples)
+        ops_per_sec = ops / phase.wall_seconds if phase.wall_seconds > 0 else float("inf")
+        throughput = mib_per_sec(total_bytes, phase.wall_seconds) if total_bytes else ""
+        print(
+            f"{phase.op:<18} {phase.size:>12} {phase.workers:>7} {ops:>6} "
+            f"{phase.wall_seconds:>10.6f} {ops_per_sec:>12.2f} {throughput:>12}",
+            file=out,
+        )
+
+    if all(phase.workers == 1 for phase in phases):
+        return
+
+    print("# per-worker", file=out)
+    print(
+        f"{'op':<18} {'size_bytes':>12} {'worker':>7} {'ops':>6} "
+        f"{'busy_sec':>10} {'ops_per_sec':>12} {'mib_per_sec':>12}",
+        file=out,
+    )
+    for phase in phases:
+        for worker in range(phase.workers):
+            samples = [sample for sample in phase.samples if sample.worker == worker]
+            if not samples:
+                continue
+            busy = sum(sample.seconds for sample in samples)
+            total_bytes = sum(sample.nbytes for sample in samples)
+            ops_per_sec = len(samples) / busy if busy > 0 else float("inf")
+            throughput = mib_per_sec(total_bytes, busy) if total_bytes else ""
+            print(
+                f"{phase.op:<18} {phase.size:>12} {worker:>7} {len(samples):>6} "
+                f"{busy:>10.6f} {ops_per_sec:>12.2f} {throughput:>12}",
+                file=out,
+            )
+
+
+def phase_histograms(phases: list[PhaseResult]) -> dict[tuple[str, int], LatencyHistogram]:
+    """Histograms per (op, size), plus `<op>.<phase>` ones for the request phases of single-request samples.
+
+    DNS, connect and TLS are only recorded for requests that opened a new
+    connection, so their counts are the number of connections opened.
+    """
+    histograms: dict[tuple[str, int], LatencyHistogram] = {}
+    for phase in phases:
+        histogram = histograms.setdefault((phase.op, phase.size), LatencyHistogram())
+        for sample in phase.samples:
+            histogram.record(sample.seconds)
+            # `<op>_service` samples share their timing with the corrected `<op>` sample.
+            if sample.timing is None or sample.op.endswith("_service"):
+                continue
+            for name in TIMING_PHASES:
+                value = getattr(sample.timing, name)
+                if value is not None:
+                    histograms.setdefault((f"{sample.op}.{name}", sample.size), LatencyHistogram()).record(value)
+    return histograms
+
+
+def merge_main(paths: list[str]) -> int:
+    """Merge histogram files from several runs, print the summary and the merged JSON."""
+    if not paths:
+        print("Usage: tools/s3_benchmark.py merge HISTOGRAM.json [HISTOGRAM.json ...]", file=sys.stderr)
+        return 2
+    merged: dict[tuple[str, int], LatencyHistogram] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as handle:
+            merge_into(merged, load_histograms(handle))
+    print_latency_table(merged, sys.stderr)
+    dump_histograms(merged, sys.stdout)
+    return 0
+
+
+def compare_main(args: list[str]) -> int:
+    """Compare a stored run with a baseline; exit 1 when a significant regression exceeds the threshold."""
+    parser = ArgumentParser(prog="tools/s3_benchmark.py compare", description=compare_main.__doc__)
+    parser.add_argument("baseline", help="run id, label (latest run with it), 'latest' or a record/histogram file")
+    parser.add_argument("current", nargs="?", default="latest", help="run to check (default: latest)")
+    parser.add_argument("--results", default=os.environ.get("S3_BENCH_RESULTS"), help="result directory or .sqlite")
+    parser.add_argument("--threshold", type=float, default=10.0, help="median slowdown in percent (default: 10)")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level (default: 0.01)")
+    parsed = parser.parse_args(args)
+    store = open_store(parsed.results) if parsed.results else None
+    baseline = find_record(store, parsed.baseline)
+    current = find_record(store, parsed.current)
+    if baseline["id"] == current["id"]:
+        raise SystemExit(f"ERROR: baseline and current are the same run ({current['id']})")
+    regressions = compare_records(baseline, current, parsed.threshold, parsed.alpha, sys.stdout)
+    return 1 if regressions else 0
+
+
+class ConsoleReport:
+    """Write samples as CSV to stdout while phases finish and the summary tables to stderr at the end."""
+
+    def __init__(
+        self,
+        histogram_file: str | None,
+        results: str | None = None,
+        label: str | None = None,
+        endpoints: list[str] | None = None,
+    ) -> None:
+        self.histogram_file = histogram_file
+        self.results = results
+        self.label = label
+        self.endpoints = endpoints or []
+        self.phases: list[PhaseResult] = []
+        self.histograms: dict[tuple[str, int], LatencyHistogram] = {}
+        self.connections: dict[str, object] = {}
+        self.signing: dict[str, object] = {}
+        self.writer = csv.writer(sys.stdout)
+        self.header_written = False
+
+    def write_header(self) -> None:
+        # Written lazily so configuration errors do not leave a stray header on stdout.
+        if not self.header_written:
+            self.writer.writerow(
+                ["op", "size_bytes", "iteration", "seconds", "mib_per_sec", "object", "worker"]
+                + [f"{phase}_seconds" for phase in TIMING_PHASES]
+            )
+            self.header_written = True
+
+    def phase(self, results: list[PhaseResult]) -> None:
+        self.write_header()
+        self.phases.extend(results)
+        for phase in results:
+            for sample in phase.samples:
+                throughput = mib_per_sec(sample.nbytes, sample.seconds) if sample.nbytes else ""
+                phases = [getattr(sample.timing, phase) if sample.timing else None for phase in TIMING_PHASES]
+                self.writer.writerow(
+                    [
+                        sample.op,
+                        sample.size,
+                        sample.iteration,
+                        f"{sample.seconds:.6f}",
+                        throughput,
+                        sample.key,
+                        sample.worker,
+                    ]
+                    + ["" if value is None else f"{value:.6f}" for value in phases]
+                )
+
+    def finish(self, connections: dict[str, object], signing: dict[str, object]) -> None:
+        self.write_header()
+        sys.stdout.flush()
+        self.connections = connections
+        self.signing = signing
+        if not self.phases:
+            return
+        print_summary(self.phases)
+        self.histograms = histograms = phase_histograms(self.phases)
+        print_latency_table(histograms, sys.stderr)
+        if len(self.endpoints) > 1:
+            print_endpoint_comparison(histograms, self.endpoints, sys.stderr)
+        if self.histogram_file:
+            with open(self.histogram_file, "w", encoding="utf-8") as handle:
+                dump_histograms(histograms, handle)
+        print("# connections: " + " ".join(f"{name}={value}" for name, value in connections.items()), file=sys.stderr)
+        requests, seconds = int(signing["requests"]), float(signing["cpu_seconds"])
+        per_request = seconds / requests * 1_000_000 if requests else 0.0
+        print(
+            f"# signing: mode={signing['mode']} requests={requests} cpu_seconds={seconds:.6f} "
+            f"cpu_us_per_request={per_request:.1f}",
+            file=sys.stderr,
+        )
+
+    def save(self) -> None:
+        """Store the finished run in the S3_BENCH_RESULTS store; only called for runs that completed."""
+        if not self.results or not self.phases:
+            return
+        throughput = []
+        for phase in self.phases:
+            total_bytes = sum(sample.nbytes for sample in phase.samples)
+            throughput.append(
+                {
+                    "op": phase.op,
+                    "size": phase.size,
+                    "workers": phase.workers,
+                    "ops": len(phase.samples),
+                    "bytes": total_bytes,
+                    "wall_seconds": phase.wall_seconds,
+                    "ops_per_sec": len(phase.samples) / phase.wall_seconds if phase.wall_seconds > 0 else 0.0,
+                }
+            )
+        record = build_record(
+            self.label,
+            run_settings(dict(os.environ)),
+            throughput,
+            self.histograms,
+            {"connections": self.connections, "signing": self.signing},
+        )
+        location = open_store(self.results).save(record)
+        print(f"# saved run {record['id']} to {location}", file=sys.stderr)
+
+
+class AgentReport:
+    """Keep the results of an agent for the coordinator, grouped by the phase step that produced them."""
+
+    def __init__(self) -> None:
+        self.steps: list[list[PhaseResult]] = []
+        self.connections: dict[str, object] = {}
+        self.signing: dict[str, object] = {}
+
+    def phase(self, results: list[PhaseResult]) -> None:
+        self.steps.append(results)
+
+    def finish(self, connections: dict[str, object], signing: dict[str, object]) -> None:
+        self.connections = connections
+        self.signing = signing
+
+    def to_dict(self) -> dict:
+        return {
+            "steps": [
+                [
+                    {
+                        "op": phase.op,
+                        "size": phase.size,
+                        "workers": phase.workers,
+                        "wall_seconds": phase.wall_seconds,
+                        "samples": [dataclasses.astuple(sample) for sample in phase.samples],
+                    }
+                    for phase in step
+                ]
+                for step in self.steps
+            ],
+            "connections": self.connections,
+            "signing": self.signing,
+        }
+
+
+def merge_agent_steps(agent_steps: list[list[list[dict]]]) -> list[list[PhaseResult]]:
+    """Combine the results every agent reported for the same phase step.
+
+    Samples are pooled with worker numbers made unique across agents. All
+    agents started the step together, so its wall time is the slowest
+    agent's and aggregate throughput is total work over that time.
+    """
+    if len({len(steps) for steps in agent_steps}) != 1:
+        raise SystemExit("ERROR: agents ran a different number of phases; check their settings")
+    merged_steps = []
+    for step in zip(*agent_steps):
+        merged: dict[tuple[str, int], PhaseResult] = {}
+        offset = 0
+        for phases in step:
+            for phase in phases:
+                samples = [
+                    Sample(*values[:7], RequestTiming(*values[7]) if values[7] else None) for values in phase["samples"]
+                ]
+                samples = [dataclasses.replace(sample, worker=sample.worker + offset) for sample in samples]
+                key = (phase["op"], phase["size"])
+                previous = merged.get(key)
+                if previous is None:
+                    merged[key] = PhaseResult(key[0], key[1], 0, phase["wall_seconds"], samples)
+                else:
+                    previous.samples.extend(samples)
+                    merged[key] = dataclasses.replace(
+                        previous, wall_seconds=max(previous.wall_seconds, phase["wall_seconds"])
+                    )
+            offset += phases[0]["workers"] if phases else 0
+        merged_steps.append([dataclasses.replace(phase, workers=offset) for phase in merged.values()])
+    return merged_steps
+
+
+def agent_main(address: str) -> int:
+    """Run as one agent of a distributed benchmark: settings come from the coordinator at `address`."""
+    agent = Agent(address)
+    try:
+        agent.apply_environment()
+        report = AgentReport()
+        try:
+            run_benchmark(report, agent.barrier)
+        except (Exception, SystemExit) as exc:
+            agent.send_error(str(exc) or type(exc).__name__)
+            raise
+        agent.send_result(report.to_dict())
+    finally:
+        agent.close()
+    return 0
+
+
+def coordinate_main(report: ConsoleReport, processes: int, remote_agents: int) -> int:
+    """Fan the benchmark out to `processes` local agent processes plus `remote_agents` agents on other hosts.
+
+    Every agent uses its own key prefix; open-loop rates are split evenly
+    between the agents so S3_BENCH_RATE stays the total target rate.
+    """
+    client = S3Client()
+    bucket = os.environ.get("S3_BENCH_BUCKET", "platform-iac-s3-bench")
+    prefix = os.environ.get("S3_BENCH_PREFIX", f"{dt.datetime.now(dt.UTC):%Y%m%dT%H%M%SZ}-{os.getpid()}")
+    keep = os.environ.get("S3_BENCH_KEEP") == "1"
+    agents = processes + remote_agents
+
+    shipped = agent_environment(dict(os.environ))
+    shipped["S3_BENCH_BUCKET"] = bucket
+    for name in ("S3_BENCH_RATE", "S3_BENCH_RATE_END"):
+        value = getenv_float(name)
+        if value is not None:
+            shipped[name] = repr(value / agents)
+
+    coordinator = Coordinator(
+        os.environ.get("S3_BENCH_LISTEN", "127.0.0.1:0"), processes, remote_agents, os.path.abspath(__file__)
+    )
+    created_bucket = False
+    try:
+        # Create the bucket once up front so the agents do not race to create it.
+        if not client.bucket_exists(bucket):
+            client.make_bucket(bucket)
+            created_bucket = True
+        coordinator.start()
+        coordinator.configure(lambda index: {**shipped, "S3_BENCH_PREFIX": f"{prefix}/a{index}"})
+        results = coordinator.run()
+    finally:
+        coordinator.close()
+        if created_bucket and not keep:
+            try:
+                client.remove_bucket(bucket)
+            except Exception as exc:  # pragma: no cover - cleanup best effort
+                print(f"WARN: failed to delete bucket {bucket}: {exc}", file=sys.stderr)
+        client.close()
+
+    for step in merge_agent_steps([result["steps"] for result in results]):
+        report.phase(step)
+    connections = dict(results[0]["connections"])
+    connections["opened"] = sum(int(result["connections"].get("opened", 0)) for result in results)
+    connections["agents"] = agents
+    signing = {
+        "mode": results[0]["signing"]["mode"],
+        "requests": sum(int(result["signing"]["requests"]) for result in results),
+        "cpu_seconds": sum(float(result["signing"]["cpu_seconds"]) for result in results),
+    }
+    report.finish(connections, signing)
+    report.save()
+    return 0
+
+
+def run_endpoints(report: ConsoleReport, names: list[str]) -> None:
+    """Run the closed-loop PUT/HEAD/GET phases against several named endpoints at once.
+
+    Every worker iteration sends the phase's operation once to each endpoint,
+    in a freshly shuffled order, so network and time-of-day drift hits all of
+    them alike. Samples are reported as `<op>@<name>`.
+    """
+    clients = [S3Client(name) for name in names]
+    bucket = os.environ.get("S3_BENCH_BUCKET", "platform-iac-s3-bench")
+    prefix = os.environ.get("S3_BENCH_PREFIX", f"{dt.datetime.now(dt.UTC):%Y%m%dT%H%M%SZ}-{os.getpid()}")
+    sizes = split_sizes(os.environ.get("S3_BENCH_SIZES", "4096 1048576 67108864"))
+    iterations = getenv_int("S3_BENCH_ITERATIONS", 3)
+    workers = getenv_int("S3_BENCH_CONCURRENCY", 1)
+    keep = os.environ.get("S3_BENCH_KEEP") == "1"
+    streaming = os.environ.get("S3_BENCH_STREAMING") == "1"
+    multipart_threshold = getenv_int("S3_BENCH_MULTIPART_THRESHOLD", 0, minimum=0)
+    range_size = getenv_int("S3_BENCH_RANGE_SIZE", 0, minimum=0)
+    range_pattern = os.environ.get("S3_BENCH_RANGE_PATTERN", "random")
+    if range_pattern not in {"random", "sequential"}:
+        raise SystemExit(f"ERROR: S3_BENCH_RANGE_PATTERN must be 'random' or 'sequential', got {range_pattern}")
+    operations = ("put", "stat", "get", "get_range") if range_size else ("put", "stat", "get")
+    unsupported = [
+        name
+        for name in ("S3_BENCH_DURATION", "S3_BENCH_PROFILE", "S3_BENCH_LIST_OBJECTS")
+        if os.environ.get(name) not in {None, "", "0"}
+    ]
+    if unsupported or os.environ.get("S3_BENCH_ENGINE", "threads") != "threads":
+        raise SystemExit(
+            "ERROR: S3_BENCH_ENDPOINTS supports the closed-loop PUT/HEAD/GET phases with the threads engine only; "
+            f"unset {', '.join(unsupported or ['S3_BENCH_ENGINE'])}"
+        )
+    file_payloads = load_file_payloads(clients[0].read_chunk_size)
+    if file_payloads:
+        sizes = [payload.size for payload in file_payloads]
+    part_size = getenv_int("S3_BENCH_PART_SIZE", 8 * 1024 * 1024)
+    part_concurrency = getenv_int("S3_BENCH_PART_CONCURRENCY", 4)
+    transfers = [MultipartTransfer(client, part_size=part_size, concurrency=part_concurrency) for client in clients]
+
+    created_buckets: list[S3Client] = []
+    objects: dict[str, list[str]] = {name: [] for name in names}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-bench")
+    try:
+        for client in clients:
+            if not client.bucket_exists(bucket):
+                client.make_bucket(bucket)
+                created_buckets.append(client)
+            client.pool.prewarm(workers)
+
+        for index, size in enumerate(sizes):
+            if file_payloads:
+                payload = file_payloads[index]
+            else:
+                payload = StreamingPayload(size, clients[0].read_chunk_size) if streaming else os.urandom(size)
+            targets = [
+                (
+                    name,
+                    ObjectOps(
+                        client,
+                        transfer,
+                        bucket,
+                        size,
+                        payload,
+                        multipart=0 < multipart_threshold <= size,
+                        range_size=range_size,
+                        range_pattern=range_pattern,
+                    ),
+                )
+                for name, client, transfer in zip(names, clients, transfers)
+            ]
+            keys = {
+                (worker, iteration): object_key(prefix, size, worker, iteration, workers)
+                for worker in range(workers)
+                for iteration in range(1, iterations + 1)
+            }
+            for name in names:
+                objects[name].extend(keys.values())
+
+            for op in operations:
+
+                def task(worker: int, op: str = op) -> list[Sample]:
+                    rng = random.Random()
+                    order = list(targets)
+                    samples = []
+                    for iteration in range(1, iterations + 1):
+                        rng.shuffle(order)
+                        for name, ops in order:
+                            samples.extend(
+                                dataclasses.replace(sample, op=f"{sample.op}@{name}")
+                                for sample in ops.run(op, worker, iteration, keys[worker, iteration])
+                            )
+                    return samples
+
+                report.phase(run_phase(executor, None, size, workers, task))
+    finally:
+        executor.shutdown(wait=True)
+        if file_payloads:
+            file_payloads[0].cache.save()
+        report.finish(
+            {
+                "mode": "warm" if clients[0].pool.keep_alive else "cold",
+                "engine": "threads",
+                "endpoints": len(clients),
+                "opened": sum(client.pool.opened for client in clients),
+            },
+            {
+                "mode": clients[0].payload_signing,
+                "requests": sum(client.signing.requests for client in clients),
+                "cpu_seconds": sum(client.signing.seconds for client in clients),
+            },
+        )
+        for name, client in zip(names, clients):
+            if not keep:
+                delete_keys(client, bucket, objects[name])
+                if client in created_buckets:
+                    try:
+                        client.remove_bucket(bucket)
+                    except Exception as exc:  # pragma: no cover - cleanup best effort
+                        print(f"WARN: failed to delete bucket {bucket} on {name}: {exc}", file=sys.stderr)
+            client.close()
+
+
+def canary_main() -> int:
+    """Probe every endpoint with a small PUT/HEAD/GET/DELETE per size on an interval and export the latencies.
+
+    Failed requests are counted, not fatal, so an outage shows up on the
+    dashboard instead of stopping the canary.
+    """
+    metrics_file = os.environ.get("S3_BENCH_METRICS_FILE")
+    metrics_listen = os.environ.get("S3_BENCH_METRICS_LISTEN")
+    if not metrics_file and not metrics_listen:
+        raise SystemExit("ERROR: canary mode needs S3_BENCH_METRICS_FILE and/or S3_BENCH_METRICS_LISTEN")
+    interval = getenv_float("S3_BENCH_CANARY_INTERVAL", 60.0)
+    if interval <= 0:
+        raise SystemExit("ERROR: S3_BENCH_CANARY_INTERVAL must be > 0")
+    cycles = getenv_int("S3_BENCH_CANARY_CYCLES", 0, minimum=0)
+    sizes = split_sizes(os.environ.get("S3_BENCH_SIZES", "4096 1048576"))
+    bucket = os.environ.get("S3_BENCH_BUCKET", "platform-iac-s3-bench")
+    prefix = os.environ.get("S3_BENCH_PREFIX", f"canary/{socket.gethostname()}")
+    names = os.environ.get("S3_BENCH_ENDPOINTS", "").split()
+    clients = [S3Client(name) for name in names] if names else [S3Client()]
+    payloads = {size: os.urandom(size) for size in sizes}
+
+    metrics = CanaryMetrics()
+    server = serve_metrics(parse_address(metrics_listen), metrics) if metrics_listen else None
+    cycle = 0
+    next_start = time.monotonic()
+    try:
+        while not cycles or cycle < cycles:
+            started = time.perf_counter()
+            failures = 0
+            for client in clients:
+                endpoint = client.name or client.netloc
+                try:
+                    if not client.bucket_exists(bucket):
+                        client.make_bucket(bucket)
+                except Exception as exc:
+                    metrics.error(endpoint, "bucket")
+                    failures += 1
+                    print(f"WARN: canary bucket check on {endpoint} failed: {exc}", file=sys.stderr)
+                    continue
+                for size, payload in payloads.items():
+                    key = f"{prefix}/{size}.bin"
+                    steps: list[tuple[str, Callable[[], object]]] = [
+                        ("put", lambda: client.put_object(bucket, key, payload)),
+                        ("stat", lambda: client.stat_object(bucket, key)),
+                        ("get", lambda: client.get_object(bucket, key)),
+                        ("delete", lambda: client.delete_object(bucket, key)),
+                    ]
+                    for op, step in steps:
+                        try:
+                            seconds, body = measure(step)
+                            if op == "get" and body != payload:
+                                raise RuntimeError(f"GET {key} returned {len(body)} bytes that differ from the upload")
+                        except Exception as exc:
+                            metrics.error(endpoint, op)
+                            failures += 1
+                            print(f"WARN: canary {op} {endpoint} {bucket}/{key} failed: {exc}", file=sys.stderr)
+                            # Later steps depend on this one.
+                            break
+                        metrics.observe(endpoint, op, size, seconds)
+            cycle += 1
+            duration = time.perf_counter() - started
+            metrics.cycle_finished(duration, ok=not failures)
+            if metrics_file:
+                write_textfile(metrics_file, metrics.render())
+            print(f"# canary cycle={cycle} failures={failures} seconds={duration:.3f}", file=sys.stderr)
+            if cycles and cycle >= cycles:
+                break
+            # Keep a fixed schedule; a cycle that overran skips the slots it missed.
+            next_start += interval
+            now = time.monotonic()
+            if next_start < now:
+                next_start += math.ceil((now - next_start) / interval) * interval
+            time.sleep(next_start - now)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        for client in clients:
+            client.close()
+    return 0
+
+
 def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        return merge_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        return compare_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "canary":
+        return canary_main()
     if len(sys.argv) > 1 and sys.argv[1] in {"-h", "--help"}:
         print(
             "Usage: S3_BENCH_ENDPOINT=... S3_BENCH_ACCESS_KEY=... "
-            "S3_BENCH_SECRET_KEY=... tools/s3_benchmark.py",
+            "S3_BENCH_SECRET_KEY=... [S3_BENCH_CONCURRENCY=N] "
+            "[S3_BENCH_CONNECTION_MODE=warm|cold] [S3_BENCH_MULTIPART_THRESHOLD=bytes] "
+            "[S3_BENCH_PART_SIZE=bytes] [S3_BENCH_PART_CONCURRENCY=N] [S3_BENCH_STREAMING=1] "
+            "[S3_BENCH_PAYLOAD_DIR=dir|S3_BENCH_PAYLOAD_LIST=file [S3_BENCH_HASH_CACHE=path]] "
+            "[S3_BENCH_HISTOGRAM_FILE=path] [S3_BENCH_RESULTS=dir|file.sqlite [S3_BENCH_LABEL=name]] "
+            "[S3_BENCH_DURATION=sec S3_BENCH_RATE=req/s [S3_BENCH_RATE_END=req/s] "
+            "[S3_BENCH_OPERATION=put|stat|get|get_range] [S3_BENCH_KEYS=N] [S3_BENCH_ARRIVALS=uniform|poisson]] "
+            "[S3_BENCH_PROFILE=workload.json] [S3_BENCH_LIST_OBJECTS=N [S3_BENCH_LIST_PAGE_SIZE=N]] "
+            "[S3_BENCH_ENGINE=threads|async [S3_BENCH_INFLIGHT=N]] "
+            "[S3_BENCH_RANGE_SIZE=bytes [S3_BENCH_RANGE_PATTERN=random|sequential]] "
+            "[S3_BENCH_PAYLOAD_SIGNING=full|unsigned|streaming [S3_BENCH_SIGNING_CHUNK_SIZE=bytes]] "
+            "[S3_BENCH_PROCESSES=N] [S3_BENCH_AGENTS=N S3_BENCH_LISTEN=host:port] "
+            "[S3_BENCH_ENDPOINTS='a b' S3_BENCH_<NAME>_ENDPOINT=... [S3_BENCH_<NAME>_ACCESS_KEY=...] ...] "
+            "tools/s3_benchmark.py\n"
+            "       tools/s3_benchmark.py merge HISTOGRAM.json [HISTOGRAM.json ...]\n"
+            "       tools/s3_benchmark.py compare [--threshold PCT] [--alpha P] BASELINE [CURRENT]\n"
+            "       S3_BENCH_METRICS_FILE=path.prom|S3_BENCH_METRICS_LISTEN=host:port [S3_BENCH_CANARY_INTERVAL=sec] "
+            "[S3_BENCH_CANARY_CYCLES=N] tools/s3_benchmark.py canary\n"
+            "       tools/s3_benchmark.py agent COORDINATOR_HOST:PORT",
             file=sys.stderr,
         )
         return 0
+    if len(sys.argv) > 2 and sys.argv[1] == "agent":
+        return agent_main(sys.argv[2])
+    processes = getenv_int("S3_BENCH_PROCESSES", 1, minimum=0)
+    remote_agents = getenv_int("S3_BENCH_AGENTS", 0, minimum=0)
+    endpoints = os.environ.get("S3_BENCH_ENDPOINTS", "").split()
+    report = ConsoleReport(
+        os.environ.get("S3_BENCH_HISTOGRAM_FILE"),
+        os.environ.get("S3_BENCH_RESULTS"),
+        os.environ.get("S3_BENCH_LABEL"),
+        endpoints,
+    )
+    if endpoints:
+        valid = all(name.replace("-", "_").isidentifier() for name in endpoints)
+        if len(set(endpoints)) != len(endpoints) or not valid:
+            raise SystemExit(f"ERROR: S3_BENCH_ENDPOINTS must be distinct names like 'minio rustfs', got {endpoints}")
+        if processes > 1 or remote_agents:
+            raise SystemExit("ERROR: S3_BENCH_ENDPOINTS cannot be combined with S3_BENCH_PROCESSES or S3_BENCH_AGENTS")
+        run_endpoints(report, endpoints)
+        report.save()
+        return 0
+    if processes > 1 or remote_agents:
+        return coordinate_main(report, processes, remote_agents)
+    run_benchmark(report)
+    report.save()
+    return 0
+
 
+def run_benchmark(report: ConsoleReport | AgentReport, barrier: Barrier | None = None) -> None:
+    """Run the benchmark configured by the S3_BENCH_* environment, passing results to `report`."""
     client = S3Client()
     bucket = os.environ.get("S3_BENCH_BUCKET", "platform-iac-s3-bench")
     prefix = os.environ.get("S3_BENCH_PREFIX", f"{dt.datetime.now(dt.UTC):%Y%m%dT%H%M%SZ}-{os.getpid()}")
     sizes = split_sizes(os.environ.get("S3_BENCH_SIZES", "4096 1048576 67108864"))
-    iterations = int(os.environ.get("S3_BENCH_ITERATIONS", "3"))
+    iterations = getenv_int("S3_BENCH_ITERATIONS", 3)
+    workers = getenv_int("S3_BENCH_CONCURRENCY", 1)
     keep = os.environ.get("S3_BENCH_KEEP") == "1"
+    streaming = os.environ.get("S3_BENCH_STREAMING") == "1"
+    # Number of small objects for the LIST / bulk-delete metadata benchmark; 0 skips it.
+    list_objects = getenv_int("S3_BENCH_LIST_OBJECTS", 0, minimum=0)
+    list_page_size = getenv_int("S3_BENCH_LIST_PAGE_SIZE", 1000)
+    if list_page_size > 1000:
+        raise SystemExit("ERROR: S3_BENCH_LIST_PAGE_SIZE must be <= 1000")
+    profile_path = os.environ.get("S3_BENCH_PROFILE")
+    profile = load_profile(profile_path) if profile_path else None
+    if profile is not None:
+        workers = getenv_int("S3_BENCH_CONCURRENCY", profile.concurrency)
+    # Real files as payloads replace the generated ones; each file is one phase sized by the file.
+    file_payloads = load_file_payloads(client.read_chunk_size)
+    if file_payloads:
+        if profile is not None:
+            raise SystemExit("ERROR: S3_BENCH_PAYLOAD_DIR/LIST cannot be combined with S3_BENCH_PROFILE")
+        sizes = [payload.size for payload in file_payloads]
+    # A range size adds a ranged-GET phase (get_range) after GET; 0 disables it.
+    range_size = getenv_int("S3_BENCH_RANGE_SIZE", 0, minimum=0)
+    range_pattern = os.environ.get("S3_BENCH_RANGE_PATTERN", "random")
+    if range_pattern not in {"random", "sequential"}:
+        raise SystemExit(f"ERROR: S3_BENCH_RANGE_PATTERN must be 'random' or 'sequential', got {range_pattern}")
+    operations = ("put", "stat", "get", "get_range") if range_size else ("put", "stat", "get")
+    # Setting a duration switches from closed-loop iterations to an open-loop run at a target rate.
+    duration = getenv_float("S3_BENCH_DURATION")
+    if duration is not None:
+        if duration <= 0:
+            raise SystemExit("ERROR: S3_BENCH_DURATION must be > 0")
+        rate = getenv_float("S3_BENCH_RATE")
+        if rate is None:
+            raise SystemExit("ERROR: S3_BENCH_RATE is required with S3_BENCH_DURATION")
+        rate_end = getenv_float("S3_BENCH_RATE_END", rate)
+        open_loop_op = os.environ.get("S3_BENCH_OPERATION", "get")
+        if open_loop_op not in operations:
+            raise SystemExit(
+                f"ERROR: S3_BENCH_OPERATION must be one of {', '.join(operations)}, got {open_loop_op} "
+                "(get_range needs S3_BENCH_RANGE_SIZE)"
+            )
+        open_loop_keys = getenv_int("S3_BENCH_KEYS", 16)
+        arrivals = os.environ.get("S3_BENCH_ARRIVALS", "uniform")
+        if arrivals not in {"uniform", "poisson"}:
+            raise SystemExit(f"ERROR: S3_BENCH_ARRIVALS must be 'uniform' or 'poisson', got {arrivals}")
+    # Objects at or above the threshold use multipart upload and ranged GETs; 0 disables it.
+    multipart_threshold = getenv_int("S3_BENCH_MULTIPART_THRESHOLD", 0, minimum=0)
+    # The async engine runs S3_BENCH_CONCURRENCY virtual clients as coroutines, at most
+    # S3_BENCH_INFLIGHT requests at a time, for the closed-loop PUT/HEAD/GET phases only.
+    engine = os.environ.get("S3_BENCH_ENGINE", "threads")
+    if engine not in {"threads", "async"}:
+        raise SystemExit(f"ERROR: S3_BENCH_ENGINE must be 'threads' or 'async', got {engine}")
+    if engine == "async" and (
+        streaming or multipart_threshold or duration or profile or list_objects or range_size or file_payloads
+    ):
+        raise SystemExit(
+            "ERROR: S3_BENCH_ENGINE=async supports plain PUT/HEAD/GET phases only; unset S3_BENCH_STREAMING, "
+            "S3_BENCH_MULTIPART_THRESHOLD, S3_BENCH_DURATION, S3_BENCH_PROFILE, S3_BENCH_LIST_OBJECTS, "
+            "S3_BENCH_RANGE_SIZE and S3_BENCH_PAYLOAD_DIR/LIST"
+        )
+    if engine == "async" and client.payload_signing == "streaming":
+        raise SystemExit("ERROR: S3_BENCH_ENGINE=async supports S3_BENCH_PAYLOAD_SIGNING=full or unsigned only")
+    inflight = getenv_int("S3_BENCH_INFLIGHT", workers)
+    transfer = MultipartTransfer(
+        client,
+        part_size=getenv_int("S3_BENCH_PART_SIZE", 8 * 1024 * 1024),
+        concurrency=getenv_int("S3_BENCH_PART_CONCURRENCY", 4),
+    )
 
     created_bucket = False
     objects: list[str] = []
-    writer = csv.writer(sys.stdout)
-    writer.writerow(["op", "size_bytes", "iteration", "seconds", "mib_per_sec", "object"])
 
+    def report_async(op: str, wall_seconds: float, samples: list[tuple]) -> None:
+        converted = [Sample(*sample[:7], RequestTiming(*sample[7])) for sample in samples]
+        report.phase(group_samples(op, size, workers, wall_seconds, converted))
+
+    async_opened = 0
+    executor = ThreadPoolExecutor(
+        max_workers=workers if engine == "threads" else 1, thread_name_prefix="s3-bench"
+    )
     try:
         if not client.bucket_exists(bucket):
             client.make_bucket(bucket)
             created_bucket = True
+        if engine == "threads":
+            client.pool.prewarm(workers)
+
+        if profile is not None:
+            results = run_workload(
+                executor,
+                client,
+                transfer,
+                bucket,
+                prefix,
+                profile,
+                workers,
+                streaming,
+                multipart_threshold,
+                objects,
+                barrier,
+            )
+            report.phase(results)
+            sizes = []
+
+        for index, size in enumerate(sizes):
+            if file_payloads:
+                payload = file_payloads[index]
+            else:
+                payload = StreamingPayload(size, client.read_chunk_size) if streaming else os.urandom(size)
+            ops = ObjectOps(
+                client,
+                transfer,
+                bucket,
+                size,
+                payload,
+                multipart=0 < multipart_threshold <= size,
+                range_size=range_size,
+                range_pattern=range_pattern,
+            )
+
+            if duration is not None:
+                keys = [f"{prefix}/{size}-k{index}.bin" for index in range(open_loop_keys)]
+                objects.extend(keys)
+                if open_loop_op != "put":
+                    # Populate the key space untimed so reads have something to hit.
+                    for key in keys:
+                        client.put_object(bucket, key, payload)
+                schedule = ArrivalSchedule(rate, rate_end, duration, poisson=arrivals == "poisson")
+                report.phase(run_open_loop(executor, ops, open_loop_op, keys, workers, schedule, barrier))
+                continue
 
-        for size in sizes:
-            payload = os.urandom(size)
-            for iteration in range(1, iterations + 1):
-                key = f"{prefix}/{size}-{iteration}.bin"
-                objects.append(key)
+            keys = {
+                (worker, iteration): object_key(prefix, size, worker, iteration, workers)
+                for worker in range(workers)
+                for iteration in range(1, iterations + 1)
+            }
+            objects.extend(keys.values())
 
-                seconds, _ = measure(lambda: client.put_object(bucket, key, payload))
-                writer.writerow(["put", size, iteration, f"{seconds:.6f}", mib_per_sec(size, seconds), key])
+            if engine == "async":
+                async_opened += run_put_stat_get(
+                    client, bucket, size, keys, workers, iterations, inflight, report_async, barrier
+                )
+                continue
 
-                seconds, _ = measure(lambda: client.stat_object(bucket, key))
-                writer.writerow(["stat", size, iteration, f"{seconds:.6f}", "", key])
+            for op in operations:
 
-                seconds, downloaded = measure(lambda: client.get_object(bucket, key))
-                if len(downloaded) != size:
-                    raise RuntimeError(f"GET {key} returned {len(downloaded)} bytes, expected {size}")
-                writer.writerow(["get", size, iteration, f"{seconds:.6f}", mib_per_sec(size, seconds), key])
+                def task(worker: int, op: str = op) -> list[Sample]:
+                    samples = []
+                    for iteration in range(1, iterations + 1):
+                        samples.extend(ops.run(op, worker, iteration, keys[worker, iteration]))
+                    return samples
+
+                report.phase(run_phase(executor, op, size, workers, task, barrier))
+
+        if list_objects:
+            report.phase(
+                run_metadata_phases(
+                    executor,
+                    client,
+                    bucket,
+                    prefix,
+                    list_objects,
+                    getenv_int("S3_BENCH_LIST_OBJECT_SIZE", 0, minimum=0),
+                    list_page_size,
+                    iterations,
+                    workers,
+                    objects,
+                    barrier,
+                )
+            )
     finally:
-        sys.stdout.flush()
+        executor.shutdown(wait=True)
+        if file_payloads:
+            file_payloads[0].cache.save()
+        mode = "warm" if client.pool.keep_alive else "cold"
+        report.finish(
+            {"mode": mode, "engine": engine, "opened": client.pool.opened + async_opened},
+            {
+                "mode": client.payload_signing,
+                "requests": client.signing.requests,
+                "cpu_seconds": client.signing.seconds,
+            },
+        )
         if not keep:
-            for key in reversed(objects):
-                try:
-                    client.delete_object(bucket, key)
-                except Exception as exc:  # pragma: no cover - cleanup best effort
-                    print(f"WARN: failed to delete {bucket}/{key}: {exc}", file=sys.stderr)
+            delete_keys(client, bucket, objects)
             if created_bucket:
                 try:
                     client.remove_bucket(bucket)
                 except Exception as exc:  # pragma: no cover - cleanup best effort
                     print(f"WARN: failed to delete bucket {bucket}: {exc}", file=sys.stderr)
-
-    return 0
+        client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+"""
+Unit tests for add_pihole_dns.py against a fake Pi-hole v6 API.
+
+FakePihole replaces the client's requests.Session, so the tests exercise the
+real PiholeClient request, retry and re-login code without a network.
+
+Run with: python -m pytest tools/tests
+"""
+
+import argparse
+import io
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("yaml")
+
+import add_pihole_dns  # noqa: E402
+from add_pihole_dns import PiholeClient, apply_hosts_bulk, build_hosts_config  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.text = json.dumps(body) if body is not None else ""
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakePihole:
+    """Keeps dns.hosts and answers like the Pi-hole v6 API.
+
+    normalise makes PATCH store entries lowercased, whitespace-collapsed and
+    deduplicated; lossy makes it drop the last entry. fail_puts lists
+    "<ip> <domain>" entries whose next PUT answers 500.
+    """
+
+    def __init__(self, hosts=(), normalise=False, lossy=False):
+        self.hosts = list(hosts)
+        self.normalise = normalise
+        self.lossy = lossy
+        self.fail_puts = set()
+        self.sid = "sid-0"
+        self.logins = 0
+        self.patches = 0
+        self.lock = threading.Lock()
+
+    def login(self):
+        with self.lock:
+            self.logins += 1
+            self.sid = f"sid-{self.logins}"
+            return FakeResponse(200, {"session": {"valid": True, "sid": self.sid, "csrf": "csrf"}})
+
+    def handle(self, method, path, sid, data):
+        with self.lock:
+            return self._handle(method, path, sid, data)
+
+    def _handle(self, method, path, sid, data):
+        if sid != self.sid:
+            return FakeResponse(401, {"error": {"key": "unauthorized", "message": "Unauthorized"}})
+        if method == "GET" and path == "/api/auth":
+            return FakeResponse(200, {"session": {"valid": True}})
+        if method == "GET" and path == "/api/config/dns/hosts":
+            return FakeResponse(200, {"config": {"dns": {"hosts": list(self.hosts)}}})
+        if method == "PATCH" and path == "/api/config":
+            self.patches += 1
+            hosts = json.loads(data)["config"]["dns"]["hosts"]
+            if self.normalise:
+                hosts = list(dict.fromkeys(" ".join(entry.lower().split()) for entry in hosts))
+            self.hosts = hosts[:-1] if self.lossy else hosts
+            return FakeResponse(200, {"config": {"dns": {"hosts": self.hosts}}})
+        if path.startswith("/api/config/dns/hosts/"):
+            entry = urllib.parse.unquote(path.rsplit("/", 1)[1])
+            if method == "PUT":
+                if entry in self.fail_puts:
+                    self.fail_puts.discard(entry)
+                    return FakeResponse(500, {"error": {"key": "internal", "message": "busy"}})
+                if entry in self.hosts:
+                    return FakeResponse(400, {"error": {"key": "bad_request", "message": "Item already present"}})
+                self.hosts.append(entry)
+                return FakeResponse(201, {"took": 0.001})
+            if method == "DELETE":
+                if entry not in self.hosts:
+                    return FakeResponse(404, {"error": {"key": "not_found", "message": "Item not found"}})
+                self.hosts.remove(entry)
+                return FakeResponse(204)
+        return FakeResponse(404, {"error": {"key": "not_found", "message": path}})
+
+
+class FakeCookies(dict):
+    def set(self, name, value):
+        self[name] = value
+
+
+class FakeSession:
+    """Replaces requests.Session: one per PiholeClient (and clone), all talking to the same FakePihole."""
+
+    def __init__(self, pihole):
+        self.pihole = pihole
+        self.headers = {}
+        self.cookies = FakeCookies()
+
+    def post(self, url, data=None, timeout=None):
+        return self.pihole.login()
+
+    def request(self, method, url, data=None, timeout=None):
+        return self.pihole.handle(method, urllib.parse.urlsplit(url).path, self.cookies.get("SID"), data)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pihole(monkeypatch):
+    pihole = FakePihole()
+    monkeypatch.setattr(add_pihole_dns.requests, "Session", lambda: FakeSession(pihole))
+    return pihole
+
+
+def client_for(pihole, hosts=()):
+    pihole.hosts = list(hosts)
+    client = PiholeClient("192.0.2.53")
+    assert client.login("password")
+    return client
+
+
+class TestBuildHostsConfig:
+    """Test the dns.hosts array computed for a bulk write."""
+
+    def test_add_replaces_managed_and_keeps_foreign(self):
+        current = ["10.0.0.1 vm1.lab.lan", "10.0.0.9 printer.home", "10.0.0.2 vm2.lab.lan alias.home"]
+        records = [{"domain": "vm1.lab.lan", "ip": "10.0.0.11"}, {"domain": "vm2.lab.lan", "ip": "10.0.0.2"}]
+        assert build_hosts_config(current, records, "add") == [
+            "10.0.0.9 printer.home",
+            "10.0.0.2 alias.home",
+            "10.0.0.11 vm1.lab.lan",
+            "10.0.0.2 vm2.lab.lan",
+        ]
+
+    def test_remove_keeps_foreign(self):
+        current = ["10.0.0.1 VM1.lab.lan", "10.0.0.9 printer.home"]
+        assert build_hosts_config(current, [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}], "unregister-dns") == [
+            "10.0.0.9 printer.home"
+        ]
+
+
+class TestApplyHostsBulk:
+    """Test the bulk PATCH path with its post-write verification."""
+
+    def test_add(self, pihole):
+        client = client_for(pihole, ["10.0.0.9 printer.home"])
+        assert apply_hosts_bulk(client, [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}], "add") is True
+        assert pihole.hosts == ["10.0.0.9 printer.home", "10.0.0.1 vm1.lab.lan"]
+
+    def test_remove_preserves_foreign_entries(self, pihole):
+        client = client_for(pihole, ["10.0.0.1 vm1.lab.lan", "10.0.0.9 printer.home", "10.0.0.8 nas.home"])
+        assert apply_hosts_bulk(client, [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}], "unregister-dns") is True
+        assert pihole.hosts == ["10.0.0.9 printer.home", "10.0.0.8 nas.home"]
+
+    def test_unchanged_config_is_not_written(self, pihole):
+        client = client_for(pihole, ["10.0.0.1 vm1.lab.lan"])
+        assert apply_hosts_bulk(client, [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}], "add") is True
+        assert pihole.patches == 0
+
+    def test_normalised_entries_verify(self, pihole):
+        pihole.normalise = True
+        client = client_for(pihole, ["10.0.0.9  Printer.home", "10.0.0.9  Printer.home"])
+        records = [{"domain": "VM1.lab.lan", "ip": "10.0.0.1"}, {"domain": "vm1.lab.lan", "ip": "10.0.0.1"}]
+        assert apply_hosts_bulk(client, records, "add") is True
+        assert pihole.patches == 1
+
+    def test_verification_failure(self, pihole):
+        pihole.lossy = True
+        client = client_for(pihole, ["10.0.0.9 printer.home"])
+        assert apply_hosts_bulk(client, [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}], "add") is False
+
+
+class TestConcurrentApply:
+    """Test per-record requests from cloned clients."""
+
+    def test_expired_session_is_replaced_once(self, pihole):
+        client = client_for(pihole)
+        pihole.sid = "expired"
+        records = [{"domain": f"vm{index}.lab.lan", "ip": f"10.0.0.{index}"} for index in range(12)]
+        assert add_pihole_dns.apply_records_concurrently(client, records, "add", workers=4, retries=0) == 0
+        assert pihole.logins == 2
+        assert len(pihole.hosts) == 12
+
+    def test_server_errors_are_retried(self, pihole):
+        client = client_for(pihole)
+        pihole.fail_puts = {"10.0.0.1 vm1.lab.lan"}
+        records = [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}]
+        assert add_pihole_dns.apply_records_concurrently(client, records, "add", workers=2, retries=1, backoff=0) == 0
+        assert pihole.hosts == ["10.0.0.1 vm1.lab.lan"]
+
+
+class TestPushSnapshotChanges:
+    """Test the watch loop's snapshot diff push and its retry after a partial failure."""
+
+    ARGS = argparse.Namespace(workers=2, retries=0, retry_backoff=0, debug=False)
+    PREVIOUS = [{"domain": "vm1.lab.lan", "ip": "10.0.0.1"}, {"domain": "old.lab.lan", "ip": "10.0.0.9"}]
+    LATEST = [{"domain": "vm1.lab.lan", "ip": "10.0.0.2"}, {"domain": "vm2.lab.lan", "ip": "10.0.0.3"}]
+
+    def test_retry_after_partial_failure(self, pihole):
+        client = client_for(pihole, ["10.0.0.1 vm1.lab.lan", "10.0.0.9 old.lab.lan", "10.0.0.7 printer.home"])
+        pihole.fail_puts = {"10.0.0.3 vm2.lab.lan"}
+        assert add_pihole_dns.push_snapshot_changes(client, self.PREVIOUS, self.LATEST, self.ARGS) == 1
+        assert sorted(pihole.hosts) == ["10.0.0.2 vm1.lab.lan", "10.0.0.7 printer.home"]
+
+        # Replaying the whole diff would fail on the PUT and DELETEs that already went through
+        retry = add_pihole_dns.push_snapshot_changes(client, self.PREVIOUS, self.LATEST, self.ARGS, check_live=True)
+        assert retry == 0
+        assert sorted(pihole.hosts) == ["10.0.0.2 vm1.lab.lan", "10.0.0.3 vm2.lab.lan", "10.0.0.7 printer.home"]
+
+    def test_watch_refuses_debug(self, monkeypatch):
+        # --debug only shows changes, so the watch would record snapshots it never applied
+        monkeypatch.setattr("sys.argv", ["add_pihole_dns.py", "--action", "watch", "--tf-dir", ".", "--debug"])
+        with pytest.raises(SystemExit) as excinfo:
+            add_pihole_dns.main()
+        assert excinfo.value.code == 2
+
+
+class TestInstanceOutput:
+    """Test the per-instance line prefixing stream wrapper."""
+
+    def test_prefixed_lines_and_stream_attributes(self):
+        stream = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        output = add_pihole_dns.InstanceOutput(stream)
+        output.set_prefix("10.0.0.53")
+        output.write("one\ntw")
+        output.write("o")
+        output.finish()
+        output.flush()
+        assert stream.buffer.getvalue() == b"[10.0.0.53] one\n[10.0.0.53] two\n"
+        assert output.encoding == "utf-8"
+        assert output.isatty() is False
+        with pytest.raises(io.UnsupportedOperation):
+            output.fileno()
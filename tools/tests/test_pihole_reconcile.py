@@ -0,0 +1,126 @@
+"""
+Unit tests for the zone trie, record index and changesets of pihole_reconcile.py.
+
+Run with: python -m pytest tools/tests
+"""
+
+import pytest
+
+from pihole_reconcile import UNMANAGED, Changeset, RecordIndex, ZoneTrie, compute_changeset
+
+OWNER = "test"
+
+
+def records(*pairs):
+    return [{"domain": domain, "ip": ip} for domain, ip in pairs]
+
+
+class TestZoneTrie:
+    """Test zone coverage on whole DNS labels."""
+
+    @pytest.mark.parametrize(
+        "domain, covered",
+        [
+            ("vm1.example.com", True),
+            ("a.b.example.com", True),
+            ("VM1.Example.COM.", True),
+            ("badexample.com", False),
+            ("vm1.badexample.com", False),
+            ("example.com.evil.org", False),
+            ("example.com", False),
+            ("com", False),
+        ],
+    )
+    def test_label_boundaries(self, domain, covered):
+        assert ZoneTrie(["example.com"]).covers(domain) is covered
+
+    def test_include_apex(self):
+        zones = ZoneTrie([".example.com"])
+        assert zones.covers("example.com", include_apex=True)
+        assert not zones.covers("badexample.com", include_apex=True)
+
+    def test_nested_zones(self):
+        zones = ZoneTrie(["lab.lan", "lan"])
+        assert zones.covers("vm1.lab.lan")
+        assert zones.covers("printer.lan")
+        assert not zones.covers("printer.mylan")
+
+
+class TestRecordIndex:
+    """Test multi-A indexing and ownership tags."""
+
+    def test_multi_a(self):
+        index = RecordIndex.from_records(records(("vm1.lab.lan", "10.0.0.1"), ("VM1.lab.lan", "10.0.0.2")), OWNER)
+        assert index.get("vm1.lab.lan") == {"10.0.0.1", "10.0.0.2"}
+        assert len(index) == 2
+
+    def test_zones_decide_ownership(self):
+        index = RecordIndex.from_records(
+            records(("vm1.lab.lan", "10.0.0.1"), ("printer.home", "10.0.0.9")), OWNER, ZoneTrie(["lab.lan"])
+        )
+        assert index.owner("vm1.lab.lan") == OWNER
+        assert index.owner("printer.home") is UNMANAGED
+
+    def test_claim(self):
+        index = RecordIndex.from_records(records(("proxy.home", "10.0.0.5")), OWNER, ZoneTrie(["lab.lan"]))
+        index.claim(["PROXY.home", "missing.home"], OWNER)
+        assert index.owner("proxy.home") == OWNER
+        assert "missing.home" not in index
+
+
+def changeset(current, desired, zones=("lab.lan",)):
+    current_index = RecordIndex.from_records(records(*current), OWNER, ZoneTrie(zones))
+    return compute_changeset(current_index, RecordIndex.from_records(records(*desired), OWNER), OWNER)
+
+
+class TestComputeChangeset:
+    """Test the minimal changeset between Pi-hole and the desired records."""
+
+    def test_in_sync(self):
+        changes = changeset([("vm1.lab.lan", "10.0.0.1")], [("vm1.lab.lan", "10.0.0.1")])
+        assert not changes
+        assert changes == Changeset()
+
+    def test_changed_ip_replaces_old_record(self):
+        changes = changeset([("vm1.lab.lan", "10.0.0.1")], [("vm1.lab.lan", "10.0.0.2")])
+        assert changes.records_to_put() == records(("vm1.lab.lan", "10.0.0.2"))
+        assert changes.records_to_remove() == records(("vm1.lab.lan", "10.0.0.1"))
+
+    def test_new_and_stale(self):
+        changes = changeset([("old.lab.lan", "10.0.0.3")], [("new.lab.lan", "10.0.0.4")])
+        assert changes.add == {"new.lab.lan": {"10.0.0.4"}}
+        assert changes.delete == {"old.lab.lan": {"10.0.0.3"}}
+        assert changes.records_to_remove() == records(("old.lab.lan", "10.0.0.3"))
+        assert changes.records_to_remove(include_stale=False) == []
+
+    def test_multi_a_only_changes_differing_ips(self):
+        changes = changeset(
+            [("vm1.lab.lan", "10.0.0.1"), ("vm1.lab.lan", "10.0.0.2")],
+            [("vm1.lab.lan", "10.0.0.2"), ("vm1.lab.lan", "10.0.0.3")],
+        )
+        assert changes.update == {"vm1.lab.lan": ({"10.0.0.1"}, {"10.0.0.3"})}
+        assert changes.records_to_put() == records(("vm1.lab.lan", "10.0.0.3"))
+        assert changes.records_to_remove() == records(("vm1.lab.lan", "10.0.0.1"))
+
+    def test_foreign_records_are_never_removed(self):
+        current = [("printer.home", "10.0.0.9"), ("nas.other.lan", "10.0.0.8"), ("shared.home", "10.0.0.7")]
+        changes = changeset(current, [("shared.home", "10.0.0.6")])
+        # Unmanaged names outside our zones are neither stale nor replaced; a desired one only gains its IP.
+        assert changes.delete == {}
+        assert changes.update == {"shared.home": (set(), {"10.0.0.6"})}
+        assert changes.records_to_remove() == []
+
+    def test_other_owner_is_not_updated(self):
+        current = RecordIndex()
+        current.add("vm1.lab.lan", "10.0.0.1", "someone-else")
+        current.add("gone.lab.lan", "10.0.0.2", "someone-else")
+        desired = RecordIndex.from_records(records(("vm1.lab.lan", "10.0.0.1")), OWNER)
+        assert not compute_changeset(current, desired, OWNER)
+
+    def test_claimed_domain_outside_zones_is_updated(self):
+        current = RecordIndex.from_records(records(("proxy.home", "10.0.0.5")), OWNER, ZoneTrie(["lab.lan"]))
+        desired = RecordIndex.from_records(records(("proxy.home", "10.0.0.6")), OWNER)
+        current.claim(desired.domains(), OWNER)
+        changes = compute_changeset(current, desired, OWNER)
+        assert changes.records_to_remove() == records(("proxy.home", "10.0.0.5"))
+        assert changes.records_to_put() == records(("proxy.home", "10.0.0.6"))
@@ -0,0 +1,93 @@
+"""
+Unit tests for merging and serialising s3_bench_histogram.LatencyHistogram.
+
+Run with: python -m pytest tools/tests
+"""
+
+import io
+import json
+import random
+
+import pytest
+
+from s3_bench_histogram import PERCENTILES, LatencyHistogram, dump_histograms, load_histograms, merge_into
+
+
+def samples(seed, count=5000, scale=0.02):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(0, 1) * scale for _ in range(count)]
+
+
+def histogram_of(values):
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+class TestMerge:
+    """Test that merged histograms match one histogram fed every sample."""
+
+    def test_merge_matches_single_histogram(self):
+        first, second = samples(1), samples(2, scale=0.2)
+        merged = histogram_of(first)
+        merged.merge(histogram_of(second))
+        combined = histogram_of(first + second)
+
+        assert merged.counts == combined.counts
+        assert merged.count == combined.count
+        assert merged.min == combined.min
+        assert merged.max == combined.max
+        assert merged.mean == pytest.approx(combined.mean)
+        assert merged.stddev == pytest.approx(combined.stddev)
+        for percent in PERCENTILES:
+            assert merged.percentile(percent) == combined.percentile(percent)
+
+    def test_merge_into_empty_target(self):
+        source = {("get", 4096): histogram_of(samples(3))}
+        target = {}
+        merge_into(target, source)
+        merge_into(target, source)
+        assert target[("get", 4096)].count == 2 * source[("get", 4096)].count
+        assert target[("get", 4096)] is not source[("get", 4096)]
+
+    def test_merge_rejects_other_precision(self):
+        with pytest.raises(ValueError):
+            LatencyHistogram(bits=8).merge(LatencyHistogram(bits=10))
+
+    def test_percentile_within_bucket_precision(self):
+        values = samples(4)
+        histogram = histogram_of(values)
+        exact = sorted(values)[len(values) // 2 - 1]
+        assert histogram.percentile(50) == pytest.approx(exact, rel=0.01)
+
+
+class TestSerialisation:
+    """Test to_dict/from_dict and the histogram file format."""
+
+    def test_round_trip(self):
+        histogram = histogram_of(samples(5))
+        restored = LatencyHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+        assert restored.counts == histogram.counts
+        assert restored.count == histogram.count
+        assert restored.min == histogram.min
+        assert restored.max == histogram.max
+        assert restored.total == pytest.approx(histogram.total)
+        for percent in PERCENTILES:
+            assert restored.percentile(percent) == histogram.percentile(percent)
+
+    def test_round_trip_empty(self):
+        restored = LatencyHistogram.from_dict(LatencyHistogram().to_dict())
+        assert restored.count == 0
+        restored.record(0.5)
+        assert restored.min == 0.5
+
+    def test_dump_and_load(self):
+        histograms = {("put", 1024): histogram_of(samples(6)), ("get", 1024): histogram_of(samples(7))}
+        handle = io.StringIO()
+        dump_histograms(histograms, handle)
+        handle.seek(0)
+        loaded = load_histograms(handle)
+        assert loaded.keys() == histograms.keys()
+        for key, histogram in histograms.items():
+            assert loaded[key].counts == histogram.counts
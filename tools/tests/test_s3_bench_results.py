@@ -0,0 +1,128 @@
+"""
+Unit tests for the result stores and the Mann-Whitney comparison of s3_bench_results.py.
+
+Run with: python -m pytest tools/tests
+"""
+
+import io
+import json
+import random
+
+import pytest
+
+from s3_bench_histogram import LatencyHistogram
+from s3_bench_results import DirectoryStore, SqliteStore, compare_records, find_record, mann_whitney
+
+
+def histogram_of(values):
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def micros(*values):
+    """Values below 256 us get one exact bucket each, so the histogram ranks are the textbook ranks."""
+    return histogram_of([value / 1_000_000 for value in values])
+
+
+class TestMannWhitney:
+    """Known-answer tests for mann_whitney()."""
+
+    def test_tied_ranks(self):
+        # Ranks: 1 -> 1, the three 2s share rank 3, 3 -> 5. U(current) = (1 + 3 + 3) - 3 * 4 / 2 = 1.
+        # Tie-corrected variance: 3 * 2 / 12 * (6 - (3**3 - 3) / (5 * 4)) = 2.4.
+        p_value, slower = mann_whitney(micros(1, 2, 2), micros(2, 3))
+        assert p_value == pytest.approx(0.332922, abs=1e-6)
+        assert slower == pytest.approx(1 / 6)
+
+    def test_identical_samples(self):
+        values = [random.Random(1).lognormvariate(0, 0.5) * 0.01 for _ in range(2000)]
+        p_value, slower = mann_whitney(histogram_of(values), histogram_of(values))
+        assert p_value == pytest.approx(1.0, abs=0.05)
+        assert slower == pytest.approx(0.5)
+
+    def test_all_values_in_one_bucket(self):
+        assert mann_whitney(micros(5, 5, 5), micros(5, 5)) == (1.0, 0.5)
+
+    def test_shifted_distribution(self):
+        rng = random.Random(2)
+        baseline = histogram_of([rng.gauss(0.010, 0.001) for _ in range(500)])
+        current = histogram_of([rng.gauss(0.012, 0.001) for _ in range(500)])
+        p_value, slower = mann_whitney(current, baseline)
+        assert p_value < 1e-10
+        assert slower > 0.9
+        assert mann_whitney(baseline, current)[1] < 0.1
+
+    def test_empty_histogram(self):
+        assert mann_whitney(LatencyHistogram(), micros(1, 2)) == (1.0, 0.5)
+
+
+def record(run_id, created, label, get_values):
+    return {
+        "id": run_id,
+        "created": created,
+        "label": label,
+        "endpoint": "http://127.0.0.1:9000",
+        "settings": {},
+        "throughput": [{"op": "get", "size": 4096, "ops_per_sec": 100.0}],
+        "histograms": [{"op": "get", "size": 4096, "histogram": histogram_of(get_values).to_dict()}],
+    }
+
+
+RECORDS = [
+    record("20260101T000000Z-aaaaaa", "2026-01-01T00:00:00+00:00", "nightly", [0.010] * 50),
+    record("20260102T000000Z-bbbbbb", "2026-01-02T00:00:00+00:00", "nightly", [0.020] * 50),
+    record("20260103T000000Z-cccccc", "2026-01-03T00:00:00+00:00", "manual", [0.010] * 50),
+]
+
+
+@pytest.fixture(params=["dir", "sqlite"])
+def store(request, tmp_path):
+    store = DirectoryStore(str(tmp_path / "runs")) if request.param == "dir" else SqliteStore(str(tmp_path / "runs.db"))
+    for run in RECORDS:
+        store.save(run)
+    return store
+
+
+class TestFindRecord:
+    """Test run lookup by id, label, 'latest' and file path in both stores."""
+
+    def test_by_id(self, store):
+        assert find_record(store, "20260102T000000Z-bbbbbb")["label"] == "nightly"
+
+    def test_label_resolves_to_latest_run(self, store):
+        assert find_record(store, "nightly")["id"] == "20260102T000000Z-bbbbbb"
+
+    def test_latest(self, store):
+        assert find_record(store, "latest")["id"] == "20260103T000000Z-cccccc"
+
+    def test_unknown_ref(self, store):
+        with pytest.raises(SystemExit):
+            find_record(store, "missing")
+
+    def test_file_path_without_store(self, tmp_path):
+        path = tmp_path / "histograms.json"
+        path.write_text(json.dumps({"histograms": RECORDS[0]["histograms"]}))
+        found = find_record(None, str(path))
+        assert found["id"] == "histograms.json"
+        assert found["throughput"] == []
+
+    def test_empty_store(self, tmp_path):
+        for empty in (DirectoryStore(str(tmp_path / "none")), SqliteStore(str(tmp_path / "none.db"))):
+            with pytest.raises(SystemExit):
+                find_record(empty, "latest")
+
+
+class TestCompareRecords:
+    """Test the regression verdicts of compare_records()."""
+
+    def test_regression_counted(self):
+        out = io.StringIO()
+        assert compare_records(RECORDS[0], RECORDS[1], threshold=5.0, alpha=0.01, out=out) == 1
+        assert "REGRESSION" in out.getvalue()
+
+    def test_same_run_is_not_a_regression(self):
+        out = io.StringIO()
+        assert compare_records(RECORDS[0], RECORDS[2], threshold=5.0, alpha=0.01, out=out) == 0
+        assert "same" in out.getvalue()
@@ -0,0 +1,155 @@
+"""
+End-to-end tests of S3Client against the in-process stand-in server.
+
+The server verifies SigV4 header signatures, payload hashes and aws-chunked
+chunk signatures, so these tests are the offline check of the client's
+signing code.
+
+Run with: python -m pytest tools/tests
+"""
+
+import os
+import socket
+
+import pytest
+
+from s3_bench_server import Credentials, StandInServer
+from s3_benchmark import MultipartTransfer, S3Client, StreamingPayload
+
+ACCESS_KEY = "test-access"
+SECRET_KEY = "test-secret"
+BUCKET = "bench"
+
+
+@pytest.fixture(scope="module")
+def server():
+    with StandInServer(credentials=Credentials(ACCESS_KEY, SECRET_KEY)) as server:
+        yield server
+
+
+@pytest.fixture
+def make_client(server, monkeypatch):
+    """Returns a factory for S3Clients pointed at the stand-in, with the given S3_BENCH_PAYLOAD_SIGNING."""
+    for name in [name for name in os.environ if name.startswith("S3_BENCH_")]:
+        monkeypatch.delenv(name)
+    clients = []
+
+    def make(payload_signing="full", secret_key=SECRET_KEY):
+        monkeypatch.setenv("S3_BENCH_ENDPOINT", server.endpoint)
+        monkeypatch.setenv("S3_BENCH_ACCESS_KEY", ACCESS_KEY)
+        monkeypatch.setenv("S3_BENCH_SECRET_KEY", secret_key)
+        monkeypatch.setenv("S3_BENCH_PAYLOAD_SIGNING", payload_signing)
+        monkeypatch.setenv("S3_BENCH_SIGNING_CHUNK_SIZE", "8192")
+        client = S3Client()
+        clients.append(client)
+        if secret_key == SECRET_KEY and not client.bucket_exists(BUCKET):
+            client.make_bucket(BUCKET)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+class TestPut:
+    """Test PUT with each payload signing mode."""
+
+    @pytest.mark.parametrize("payload_signing", ["full", "unsigned", "streaming"])
+    def test_put_and_get(self, make_client, payload_signing):
+        client = make_client(payload_signing)
+        body = os.urandom(50_000)  # Several 8 KiB signed chunks plus a partial one
+        client.put_object(BUCKET, f"put-{payload_signing}", body)
+        assert client.get_object(BUCKET, f"put-{payload_signing}") == body
+
+    @pytest.mark.parametrize("payload_signing", ["full", "streaming"])
+    def test_streaming_payload(self, make_client, payload_signing):
+        client = make_client(payload_signing)
+        payload = StreamingPayload(100_000, 16384)
+        client.put_object(BUCKET, f"stream-{payload_signing}", payload)
+        assert client.get_object_verified(BUCKET, f"stream-{payload_signing}", payload) == payload.size
+
+    @pytest.mark.parametrize("payload_signing", ["full", "unsigned", "streaming"])
+    def test_wrong_secret_is_rejected(self, make_client, payload_signing):
+        client = make_client(payload_signing, secret_key="wrong-secret")
+        with pytest.raises(RuntimeError, match="HTTP 403"):
+            client.put_object(BUCKET, "rejected", b"x" * 20_000)
+
+
+class TestRead:
+    """Test HEAD and ranged GET."""
+
+    def test_head(self, make_client):
+        client = make_client()
+        client.put_object(BUCKET, "head", b"abc")
+        client.stat_object(BUCKET, "head")
+        with pytest.raises(RuntimeError, match="HTTP 404"):
+            client.stat_object(BUCKET, "head-missing")
+
+    def test_ranged_get(self, make_client):
+        client = make_client()
+        body = bytes(range(256)) * 40
+        client.put_object(BUCKET, "range", body)
+        assert client.get_object_range(BUCKET, "range", 100, 1099) == body[100:1100]
+        assert client.get_object_range(BUCKET, "range", len(body) - 10, len(body) - 1) == body[-10:]
+
+
+class TestMultipart:
+    """Test multipart upload and ranged-GET download through MultipartTransfer."""
+
+    @pytest.mark.parametrize("payload_signing", ["full", "streaming"])
+    def test_upload_and_download(self, make_client, payload_signing):
+        client = make_client(payload_signing)
+        transfer = MultipartTransfer(client, part_size=64 * 1024, concurrency=3)
+        body = os.urandom(200_000)
+        timings = transfer.upload(BUCKET, f"multipart-{payload_signing}", body)
+        assert [timing.part_number for timing in timings] == [1, 2, 3, 4]
+        buffer, _ = transfer.download(BUCKET, f"multipart-{payload_signing}", len(body))
+        assert bytes(buffer) == body
+
+    def test_streaming_download_verifies(self, make_client):
+        client = make_client()
+        transfer = MultipartTransfer(client, part_size=32 * 1024, concurrency=2)
+        payload = StreamingPayload(100_000, 16384)
+        transfer.upload(BUCKET, "multipart-verified", payload)
+        buffer, timings = transfer.download(BUCKET, "multipart-verified", payload.size, expected=payload)
+        assert buffer is None
+        assert sum(timing.nbytes for timing in timings) == payload.size
+
+
+class TestMetadata:
+    """Test ListObjectsV2 pagination and DeleteObjects."""
+
+    def test_list_pagination_and_delete_objects(self, make_client):
+        client = make_client()
+        keys = [f"list/{index:03d}" for index in range(25)]
+        for key in keys:
+            client.put_object(BUCKET, key, b"x")
+        client.put_object(BUCKET, "other/000", b"x")
+
+        listed, token, pages = [], None, 0
+        while True:
+            page = client.list_objects_v2(BUCKET, prefix="list/", max_keys=10, continuation_token=token)
+            listed.extend(page.keys)
+            pages += 1
+            token = page.next_token
+            if token is None:
+                break
+        assert listed == keys
+        assert pages == 3
+
+        assert client.delete_objects(BUCKET, keys + ["list/missing"]) == {}
+        assert client.list_objects_v2(BUCKET, prefix="list/").keys == []
+        assert client.list_objects_v2(BUCKET, prefix="other/").keys == ["other/000"]
+
+
+class TestConnections:
+    """Test the stale keep-alive connection retry."""
+
+    def test_stale_connection_is_replaced(self, make_client):
+        client = make_client()
+        client.put_object(BUCKET, "stale", b"abc")
+        conn, _ = client.pool.acquire()
+        conn.sock.shutdown(socket.SHUT_RDWR)  # As if the server had closed the idle connection
+        client.pool.release(conn)
+        assert client.get_object(BUCKET, "stale") == b"abc"
+        assert client.pool.replaced == 1
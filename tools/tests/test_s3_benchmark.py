@@ -0,0 +1,79 @@
+"""
+Unit tests for the open-loop schedule and workload profiles of s3_benchmark.py.
+
+Run with: python -m pytest tools/tests
+"""
+
+import os
+
+import pytest
+
+from s3_bench_workload import load_profile, parse_profile
+from s3_benchmark import ArrivalSchedule
+
+PROFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "s3_bench_profiles")
+
+
+def drain(schedule):
+    offsets = []
+    while (arrival := schedule.claim()) is not None:
+        offsets.append(arrival[1])
+    return offsets
+
+
+class TestArrivalSchedule:
+    """Test arrival offsets for constant and ramped rates."""
+
+    def test_constant_rate(self):
+        offsets = drain(ArrivalSchedule(10, 10, 2.0))
+        assert len(offsets) == 20
+        assert offsets == sorted(offsets)
+        assert offsets[-1] < 2.0
+
+    def test_ramp_up(self):
+        offsets = drain(ArrivalSchedule(0, 100, 1.0))
+        assert len(offsets) == pytest.approx(50, abs=1)
+        assert offsets[-1] < 1.0
+
+    @pytest.mark.parametrize("rate_end", [1, 0])
+    @pytest.mark.parametrize("poisson", [False, True])
+    def test_ramp_down_stops_at_total(self, rate_end, poisson):
+        """A ramp-down used to raise 'math domain error' once the ramp's area was used up."""
+        schedule = ArrivalSchedule(100, rate_end, 1.0, poisson=poisson)
+        offsets = drain(schedule)
+        assert offsets == sorted(offsets)
+        assert all(0 <= offset < 1.0 for offset in offsets)
+        if not poisson:
+            assert len(offsets) == pytest.approx((100 + rate_end) / 2, abs=1)
+
+    def test_offset_past_total_is_duration(self):
+        schedule = ArrivalSchedule(100, 0, 1.0)
+        assert schedule.offset(schedule.total + 10) == 1.0
+
+
+class TestWorkloadProfile:
+    """Test which object sizes a profile prepopulates."""
+
+    def test_read_sizes_skip_put_only_sizes(self):
+        profile = parse_profile({
+            "operations": 10,
+            "mix": [
+                {"op": "get", "sizes": {"4096": 1, "1048576": 1}},
+                {"op": "stat", "sizes": {"4096": 1}},
+                {"op": "put", "sizes": {"16384": 1, "1048576": 1}},
+            ],
+        })
+        assert profile.sizes == [4096, 16384, 1048576]
+        assert profile.read_sizes == [4096, 1048576]
+
+    @pytest.mark.parametrize("value", ["50", 50.0])
+    def test_prepopulate_is_stored_as_int(self, value):
+        profile = parse_profile({"operations": 10, "key_space": 100, "prepopulate": value,
+                                 "mix": [{"op": "get", "sizes": {"4096": 1}}]})
+        assert profile.prepopulate_count == 50
+        assert isinstance(profile.prepopulate_count, int)
+
+    @pytest.mark.parametrize("name", sorted(os.listdir(PROFILES)))
+    def test_shipped_profiles_prepopulate_under_2_gib(self, name):
+        profile = load_profile(os.path.join(PROFILES, name))
+        assert profile.prepopulate_count * sum(profile.read_sizes) < 2 * 1024**3
@@ -0,0 +1,98 @@
+"""
+Unit tests for the OpenTofu outputs cache shared by tofu_inventory.py and add_pihole_dns.py.
+
+Run with: python -m pytest tools/tests
+"""
+
+import json
+import os
+
+import pytest
+
+import tofu_inventory
+import tofu_outputs
+
+INVENTORY = {"all": {"hosts": ["vm1"]}, "_meta": {"hostvars": {"vm1": {"ansible_host": "10.0.0.1"}}}}
+OUTPUTS = {"ansible_inventory_data": {"value": json.dumps(INVENTORY)}}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Points tofu_outputs at a temporary .cache and a component dir; `tofu output` must not run unless stubbed."""
+    component = tmp_path / "infra" / "dev" / "vm"
+    component.mkdir(parents=True)
+    monkeypatch.setattr(tofu_outputs, "CACHE_PATH", str(tmp_path / "tofu-outputs.json"))
+    monkeypatch.setattr(tofu_outputs, "SOURCE_PATH", str(tmp_path / "tofu-outputs.source"))
+    monkeypatch.setattr(tofu_outputs, "STATE_CHANGED_PATH", str(tmp_path / "tofu-state-changed"))
+    monkeypatch.setattr(tofu_outputs, "run_tofu_output", lambda tf_dir: pytest.fail("unexpected 'tofu output'"))
+    return component
+
+
+def write_cache(component=None, outputs=OUTPUTS):
+    with open(tofu_outputs.CACHE_PATH, "w") as handle:
+        json.dump(outputs, handle)
+    if component is not None:
+        with open(tofu_outputs.SOURCE_PATH, "w") as handle:
+            handle.write(f"{component}\n")
+
+
+def mark_state_changed():
+    """Touches the state-change stamp one second after the cache was written."""
+    open(tofu_outputs.STATE_CHANGED_PATH, "w").close()
+    stamp = os.stat(tofu_outputs.CACHE_PATH).st_mtime + 1
+    os.utime(tofu_outputs.STATE_CHANGED_PATH, (stamp, stamp))
+
+
+def inventory_json(capsys, *argv, monkeypatch):
+    monkeypatch.setattr("sys.argv", ["tofu_inventory.py", *argv])
+    tofu_inventory.get_inventory()
+    return json.loads(capsys.readouterr().out)
+
+
+class TestLoadOutputs:
+    """Test the freshness check and the 'tofu output' fallback."""
+
+    def test_fresh_cache_is_used(self, cache):
+        write_cache(cache)
+        assert tofu_outputs.cache_is_fresh(str(cache))
+        assert tofu_outputs.load_outputs(str(cache)) == OUTPUTS
+
+    def test_stale_cache_runs_tofu_output(self, cache, monkeypatch):
+        write_cache(cache)
+        mark_state_changed()
+        ran = []
+        monkeypatch.setattr(tofu_outputs, "run_tofu_output", lambda tf_dir: ran.append(tf_dir) or {})
+        assert tofu_outputs.load_outputs(str(cache)) == {}
+        assert ran == [str(cache)]
+
+    def test_cache_of_another_component_is_not_fresh(self, cache, tmp_path):
+        write_cache(tmp_path / "infra" / "dev" / "other")
+        assert not tofu_outputs.cache_is_fresh(str(cache))
+
+
+class TestTofuInventory:
+    """Test tofu_inventory.py with fresh, stale and pre-.source caches."""
+
+    def test_list_from_fresh_cache(self, cache, capsys, monkeypatch):
+        write_cache(cache)
+        assert inventory_json(capsys, "--list", monkeypatch=monkeypatch) == INVENTORY
+
+    def test_host(self, cache, capsys, monkeypatch):
+        write_cache(cache)
+        assert inventory_json(capsys, "--host", "vm1", monkeypatch=monkeypatch) == {"ansible_host": "10.0.0.1"}
+
+    def test_stale_cache_falls_back_to_tofu_output(self, cache, capsys, monkeypatch):
+        write_cache(cache, outputs={})
+        mark_state_changed()
+        monkeypatch.setattr(tofu_outputs, "run_tofu_output", lambda tf_dir: OUTPUTS)
+        assert inventory_json(capsys, "--list", monkeypatch=monkeypatch) == INVENTORY
+
+    def test_cache_without_source_is_read_as_is(self, cache, capsys, monkeypatch):
+        write_cache()
+        mark_state_changed()
+        assert inventory_json(capsys, "--list", monkeypatch=monkeypatch) == INVENTORY
+
+    def test_missing_cache(self, cache, monkeypatch):
+        monkeypatch.setattr("sys.argv", ["tofu_inventory.py", "--list"])
+        with pytest.raises(SystemExit):
+            tofu_inventory.get_inventory()
@@ -2,12 +2,13 @@
 # tools/tofu_inventory.py
 
 import json
+import subprocess
 import sys
-import os
 
-# Путь к файлу кэша, созданному iac-wrapper.sh
-CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'tofu-outputs.json')
-OUTPUT_KEY = 'ansible_inventory_data'
+# Кэш iac-wrapper.sh и его проверка на свежесть — общие с add_pihole_dns.py
+from tofu_outputs import (
+    CACHE_PATH, OUTPUT_KEY, cached_source, inventory_from_outputs, load_outputs, read_cached_outputs
+)
 
 def get_inventory():
     """
@@ -28,9 +29,11 @@ def get_inventory():
     # --- КОНЕЦ ИСПРАВЛЕНИЯ ---
 
     try:
-        # 1. Загрузка всего вывода OpenTofu
-        with open(CACHE_PATH, 'r') as f:
-            raw_outputs = json.load(f)
+        # 1. Загрузка всего вывода OpenTofu: из кэша, если он новее последнего apply/start/stop,
+        # иначе 'tofu output' в каталоге компонента, записанном в tofu-outputs.source.
+        # Кэш без .source (записанный до его появления) читается как есть, как раньше.
+        tf_dir = cached_source()
+        raw_outputs = load_outputs(tf_dir) if tf_dir is not None else read_cached_outputs()
 
         # 2. Получение значения ключа "ansible_inventory_data"
         # Service components (e.g. gitlab, minio) have no Tofu state — return empty inventory
@@ -39,10 +42,8 @@ def get_inventory():
             json.dump(empty, sys.stdout, indent=2)
             return
 
-        inventory_string = raw_outputs[OUTPUT_KEY]['value']
-
         # 3. Десериализация вложенной JSON-строки
-        final_inventory = json.loads(inventory_string)
+        final_inventory = inventory_from_outputs(raw_outputs) or {"_meta": {"hostvars": {}}}
 
         # 4. Вывод финального инвентаря
         if is_list_request: # <--- ИСПРАВЛЕНО
@@ -53,12 +54,18 @@ def get_inventory():
             hostvars = final_inventory.get('_meta', {}).get('hostvars', {})
             json.dump(hostvars.get(hostname, {}), sys.stdout, indent=2)
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
+        if e.filename == 'tofu':
+            print("Ошибка: кэш устарел, а 'tofu' не найден в PATH для 'tofu output'.", file=sys.stderr)
+            sys.exit(1)
         print(f"Ошибка: Файл кэша не найден по пути: {CACHE_PATH}. Выполните 'tofu apply'.", file=sys.stderr)
         sys.exit(1)
     except json.JSONDecodeError as e:
         print(f"Ошибка парсинга JSON в {CACHE_PATH}: {e}", file=sys.stderr)
         sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        print(f"Ошибка 'tofu output' в {tf_dir}: {e.stderr}", file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(f"Непредвиденная ошибка: {e}", file=sys.stderr)
         sys.exit(1)
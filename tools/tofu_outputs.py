@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# tools/tofu_outputs.py
+"""Shared loading of OpenTofu outputs and the Ansible inventory inside them.
+
+iac-wrapper.sh's tofu_cache_outputs writes `tofu output -json` to
+.cache/tofu-outputs.json and the Terraform directory it came from to
+.cache/tofu-outputs.source. After every apply, refresh and destroy it touches
+.cache/tofu-state-changed. The cache is fresh for a Terraform directory when
+it came from that directory and is newer than the stamp (and than a local
+terraform.tfstate, for components with local state). Running `tofu output`
+starts OpenTofu and downloads the remote state, so it is only the fallback.
+
+OutputsWatcher lets long-running consumers (add_pihole_dns.py --action
+watch) react when the cache is rewritten.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import subprocess
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache')
+CACHE_PATH = os.path.join(CACHE_DIR, 'tofu-outputs.json')
+SOURCE_PATH = os.path.join(CACHE_DIR, 'tofu-outputs.source')
+STATE_CHANGED_PATH = os.path.join(CACHE_DIR, 'tofu-state-changed')
+OUTPUT_KEY = 'ansible_inventory_data'
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def cached_source():
+    """Returns the Terraform directory the cache was last written for, or None."""
+    try:
+        with open(SOURCE_PATH, 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def cache_is_fresh(tf_dir):
+    """True if .cache/tofu-outputs.json was written for tf_dir after its last state change."""
+    cache_mtime = _mtime(CACHE_PATH)
+    if cache_mtime is None:
+        return False
+
+    source = cached_source()
+    if not source or os.path.realpath(source) != os.path.realpath(tf_dir):
+        return False
+
+    for stamp in (STATE_CHANGED_PATH, os.path.join(tf_dir, 'terraform.tfstate')):
+        stamp_mtime = _mtime(stamp)
+        if stamp_mtime is not None and stamp_mtime > cache_mtime:
+            return False
+    return True
+
+def read_cached_outputs():
+    """Returns the cached `tofu output -json` document.
+
+    Raises FileNotFoundError or json.JSONDecodeError like open()/json.load().
+    """
+    with open(CACHE_PATH, 'r') as f:
+        return json.load(f)
+
+def run_tofu_output(tf_dir):
+    """Runs `tofu output -json` in tf_dir and returns the parsed document.
+
+    Raises subprocess.CalledProcessError or json.JSONDecodeError.
+    """
+    result = subprocess.run(
+        ["tofu", "output", "-json"],
+        cwd=tf_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+        encoding='utf-8'
+    )
+    return json.loads(result.stdout)
+
+def load_outputs(tf_dir, debug=False):
+    """Returns the OpenTofu outputs of tf_dir, from the cache when it is fresh."""
+    if cache_is_fresh(tf_dir):
+        try:
+            outputs = read_cached_outputs()
+            if debug:
+                print(f"DEBUG: Using cached OpenTofu outputs from {os.path.realpath(CACHE_PATH)}")
+            return outputs
+        except (OSError, json.JSONDecodeError) as e:
+            if debug:
+                print(f"DEBUG: Ignoring unreadable OpenTofu outputs cache: {e}")
+    elif debug:
+        print(f"DEBUG: OpenTofu outputs cache is missing, stale or for another component; running 'tofu output'.")
+    return run_tofu_output(tf_dir)
+
+def inventory_from_outputs(outputs):
+    """Returns the Ansible inventory stored as a JSON string in the ansible_inventory_data output, or None."""
+    inventory_string = outputs.get(OUTPUT_KEY, {}).get('value')
+    if not inventory_string:
+        return None
+    return json.loads(inventory_string)
+
+# inotify(7) constants; IN_NONBLOCK and IN_CLOEXEC equal O_NONBLOCK and O_CLOEXEC
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+class OutputsWatcher:
+    """Waits for iac-wrapper.sh to rewrite .cache/tofu-outputs.json (or its .source file).
+
+    Uses inotify on the cache directory where available (Linux, through
+    ctypes), otherwise polls the files' mtime, size and inode every
+    poll_interval seconds. Both modes report a change only when the files'
+    signature actually differs from the last accepted one. The caller
+    calls accept() once it has read the new contents, so a file caught
+    mid-write keeps being reported (every poll_interval when polling, or on
+    the next write event) until it loads.
+    """
+
+    def __init__(self, poll_interval=5.0):
+        self.poll_interval = poll_interval
+        self.signature = self._signature()
+        self.pending = self.signature
+        self.fd = self._inotify_watch(os.path.realpath(CACHE_DIR))
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else f"polling every {self.poll_interval:g}s"
+
+    @staticmethod
+    def _signature():
+        signature = []
+        for path in (CACHE_PATH, SOURCE_PATH):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    @staticmethod
+    def _inotify_watch(directory):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def wait(self, timeout):
+        """Blocks for up to timeout seconds; returns True if the cache files changed since the last accept()."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.fd is not None:
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+                if not ready:
+                    return False
+                try:
+                    os.read(self.fd, 65536) # Drain the queued events; the signature decides
+                except BlockingIOError:
+                    pass
+            else:
+                time.sleep(min(self.poll_interval, remaining))
+            signature = self._signature()
+            if signature != self.signature:
+                self.pending = signature
+                return True
+
+    def accept(self):
+        """Marks the change last reported by wait() as handled."""
+        self.signature = self.pending
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None